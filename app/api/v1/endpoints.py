@@ -1,304 +1,596 @@
 # Import necessary libraries
-from fastapi import FastAPI, HTTPException
+# MLflow, pandas and NumPy are only needed by the feedback workers: they are imported
+# lazily (and warmed up in the background once the server is running) to keep the cold
+# start short. Check with `python -m app.utils.startup`.
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from langserve import add_routes
 from pydantic import BaseModel
-from typing import List, Optional
-from sklearn.metrics import confusion_matrix, classification_report, precision_score, recall_score, f1_score
-import pandas as pd
-import mlflow
-from mlflow.langchain.langchain_tracer import MlflowLangchainTracer
-from datetime import datetime
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import List, Literal, Optional, Tuple
 import os
-import difflib
+import json
 import sentry_sdk
 from sentry_sdk import capture_exception
+from sentry_sdk.integrations.fastapi import FastApiIntegration
+from sentry_sdk.integrations.openai import OpenAIIntegration
+from sentry_sdk.integrations.starlette import StarletteIntegration
 
 
 # Core schemas and services
 from app.schemas.metadata import MetadataSchemaCIOOS
-from app.schemas.feedback import FeedbackItem, UserFeedback_EOV, POSSIBLE_EOVS, KeywordFeedbackItem, MetadataFeedbackItem, MetadataFeedback
-from app.services.metadata_transform import transform_metadata_to_full
-from app.core.chain_setup_eov import model_eov, chain_eov
-from app.core.chain_setup_metadata import chain_MetadataSchemaCIOOS
+from app.schemas.eov import EOVWithCitations
+from app.schemas.extraction import DocumentInput, ExtractionResult, IngestionPreview, IngestionResult, IngestionStats, EOVRevisionInput, EOVRevisionResult
+from app.schemas.batch import BatchJobRequest
+from app.schemas.feedback import FeedbackItem, UserFeedback_EOV, POSSIBLE_EOVS, KeywordFeedbackItem, MetadataFeedbackItem, MetadataFeedback, BulkFeedback
+from app.services.metadata_transform import transform_metadata_to_full, transform_ndjson
+from app.services.feedback_queue import FeedbackQueue, FeedbackWorkerPool, QueueFullError
+from app.services.feedback_store import FeedbackStore
+from app.services.long_document import with_long_document_mode
+from app.services.citation_verifier import with_citation_verification, verify_citations
+from app.services.eov_revision import reextract_eov
+from app.services.eov_prefilter import prefilter_settings
+from app.services.extraction import extract_document, stream_extraction
+from app.services.ingestion import IngestionError, UploadTooLargeError, normalize_file, spool_upload
+from app.services.metadata_stream import stream_metadata
+from app.services.batch_jobs import BatchJobStore, BatchWorkerPool, extraction_processor, BATCH_MAX_DOCUMENTS
+from app.services.result_cache import ResultCache, with_result_cache, chain_fingerprint, cache_bypass_modifier, cache_key
+from app.services.near_duplicates import NearDuplicateIndex, with_near_duplicate_reuse, NEAR_DUPLICATE_ENABLED
+from app.services.metrics import MetricsRegistry, MetricsMiddleware, LLMMetricsHandler, PROMETHEUS_CONTENT_TYPE
+from app.core.chain_setup_eov import model_eov, model_eov_small, chain_eov, eov_cascade, prompt_eov_v1
+from app.core.chain_setup_metadata import model, chain_MetadataSchemaCIOOS, chain_MetadataSchemaCIOOS_streaming, prompt_MetadataSchemaCIOOS_v1
 
 # Utilities
-from app.utils.helpers import evaluate_keyword_feedback
+from app.utils.startup import start_warmup, current_rss_mb
 
 SENTRY_DSN = os.getenv('SENTRY_DSN')
-MLFLOW_TRACKING_URI = os.getenv("MLFLOW_TRACKING_URI")
-
-# Initialize MLflow
-mlflow.set_tracking_uri(MLFLOW_TRACKING_URI)
+# MLflow reads MLFLOW_TRACKING_URI from the environment when the feedback workers first use it
 
 
+# Integrations are listed explicitly: auto-enabling imports every supported library that
+# happens to be installed (SQLAlchemy, aiohttp, Flask, Graphene...), which costs over a second.
 sentry_sdk.init(
     dsn=SENTRY_DSN,
     send_default_pii=False,
     traces_sample_rate=1.0,
+    auto_enabling_integrations=False,
+    integrations=[StarletteIntegration(), FastApiIntegration(), OpenAIIntegration()],
 )
 
+# Durable queue of feedback submissions, drained into MLflow by background workers
+feedback_queue = FeedbackQueue()
+
+
+def _handle_eov_feedback(payload: dict) -> None:
+    from app.services.feedback_logging import log_eov_feedback
+    log_eov_feedback(UserFeedback_EOV(**payload))
+
+
+def _handle_metadata_feedback(payload: dict) -> None:
+    from app.services.feedback_logging import log_metadata_feedback
+    log_metadata_feedback(MetadataFeedback(**payload))
+
+
+def _handle_bulk_feedback(payload: dict) -> None:
+    from app.services.feedback_logging import log_bulk_feedback
+    log_bulk_feedback(BulkFeedback(**payload))
+
+
+# Local copy of every submission with daily counters, for the /feedback/analytics queries
+feedback_store = FeedbackStore()
+
+feedback_workers = FeedbackWorkerPool(feedback_queue, {
+    "eov": _handle_eov_feedback,
+    "metadata": _handle_metadata_feedback,
+    "bulk": _handle_bulk_feedback,
+})
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the feedback dependencies (MLflow, pandas) off the request path
+    start_warmup(["app.services.feedback_logging"])
+    # Expired cache rows and near-duplicate documents are also purged on writes,
+    # at most every RESULT_CACHE_PURGE_SECONDS
+    await run_in_threadpool(result_cache.purge_expired)
+    if near_duplicate_index is not None:
+        await run_in_threadpool(near_duplicate_index.purge_expired)
+    feedback_workers.start()
+    batch_workers.start()
+    print(f"API ready (RSS {current_rss_mb():.0f} MB)")
+    yield
+    batch_workers.stop()
+    feedback_workers.stop()
+
+
 # Initialize FastAPI application
 app = FastAPI(
     title="LangChain Server",
     version="1.0",
     description="A simple API server using LangChain's Runnable interfaces",
+    lifespan=lifespan,
+)
+
+# Prometheus metrics: HTTP requests, chat model calls and cache lookups, summed over workers
+metrics = MetricsRegistry()
+app.add_middleware(MetricsMiddleware, registry=metrics)
+
+# Result cache shared by both chains (in-process LRU + SQLite file shared by workers)
+result_cache = ResultCache()
+
+
+def _cache_lookups():
+    counters = result_cache.counters()
+    for result, name in (("memory_hit", "memory_hits"), ("disk_hit", "disk_hits"), ("miss", "misses"), ("bypass", "bypasses")):
+        yield "chain_cache_lookups_total", {"result": result}, counters[name]
+
+
+metrics.register_collector(_cache_lookups)
+
+
+def _cascade_answers():
+    for (tier, reason), count in eov_cascade.counters().items():
+        yield "eov_cascade_answers_total", {"tier": tier, "reason": reason}, count
+
+
+# Which tier of the EOV model cascade answered (EOV_CASCADE_ENABLED)
+if eov_cascade is not None:
+    metrics.register_collector(_cascade_answers)
+
+# Token usage, latency and errors of the chat model calls
+instrumented_chain_MetadataSchemaCIOOS = chain_MetadataSchemaCIOOS.with_config(
+    callbacks=[LLMMetricsHandler(metrics, "chain_MetadataSchemaCIOOS")])
+instrumented_chain_eov = chain_eov.with_config(callbacks=[LLMMetricsHandler(metrics, "chain_eov")])
+instrumented_chain_MetadataSchemaCIOOS_streaming = chain_MetadataSchemaCIOOS_streaming.with_config(
+    callbacks=[LLMMetricsHandler(metrics, "chain_MetadataSchemaCIOOS_streaming")])
+
+# Documents missing from the exact cache can reuse the result of a nearly identical one
+# (new revision, light edits) when NEAR_DUPLICATE_ENABLED is set
+near_duplicate_index = NearDuplicateIndex() if NEAR_DUPLICATE_ENABLED else None
+
+
+def _with_near_duplicates(chain, namespace: str, fingerprint: str, output_schema):
+    if near_duplicate_index is None:
+        return chain
+    return with_near_duplicate_reuse(chain, index=near_duplicate_index, namespace=namespace,
+                                     fingerprint=fingerprint, output_schema=output_schema)
+
+
+# The streaming metadata endpoint reads and fills the same cache entries
+metadata_fingerprint = chain_fingerprint(prompt_MetadataSchemaCIOOS_v1, model)
+cached_chain_MetadataSchemaCIOOS = with_result_cache(
+    _with_near_duplicates(instrumented_chain_MetadataSchemaCIOOS, "chain_MetadataSchemaCIOOS",
+                          metadata_fingerprint, MetadataSchemaCIOOS),
+    cache=result_cache,
+    namespace="chain_MetadataSchemaCIOOS",
+    fingerprint=metadata_fingerprint,
+    output_schema=MetadataSchemaCIOOS,
+)
+# Long documents are split into overlapping chunks processed in parallel. Citations are
+# located in the input text after the cache, so cached and reused results are verified as well.
+# The prefilter settings change the prompt the model receives, so they are part of the fingerprint
+eov_prompt_settings = prompt_eov_v1 + prefilter_settings()
+eov_fingerprint = (chain_fingerprint(eov_prompt_settings, model_eov) if eov_cascade is None
+                   else eov_cascade.fingerprint(eov_prompt_settings, model_eov_small, model_eov))
+cached_chain_eov_unverified = with_result_cache(
+    _with_near_duplicates(with_long_document_mode(instrumented_chain_eov), "chain_eov",
+                          eov_fingerprint, EOVWithCitations),
+    cache=result_cache,
+    namespace="chain_eov",
+    fingerprint=eov_fingerprint,
+    output_schema=EOVWithCitations,
 )
+cached_chain_eov = with_citation_verification(cached_chain_eov_unverified)
+
+# Batch jobs: documents stored locally and run through both chains by background workers
+batch_store = BatchJobStore()
+batch_workers = BatchWorkerPool(batch_store, extraction_processor(cached_chain_MetadataSchemaCIOOS, cached_chain_eov))
 
 # Add LangChain routes for metadata and EOV chains
-add_routes(app, chain_MetadataSchemaCIOOS, path="/chain_MetadataSchemaCIOOS")
-add_routes(app, chain_eov, path="/chain_eov")
+add_routes(app, cached_chain_MetadataSchemaCIOOS, path="/chain_MetadataSchemaCIOOS",
+           per_req_config_modifier=cache_bypass_modifier)
+add_routes(app, cached_chain_eov, path="/chain_eov",
+           per_req_config_modifier=cache_bypass_modifier)
 
 
-# Endpoint to handle user eov feedback and log to MLflow
-@app.post("/submit_feedback_eov")
-def submit_eov_feedback(feedback: UserFeedback_EOV):
+# Endpoint exposing the metrics in the Prometheus text format
+@app.get("/metrics")
+def get_metrics():
+    """
+    Return request latency, chat model latency, token usage, estimated cost, errors
+    and cache lookups of all workers in the Prometheus text format.
+    """
+    return Response(metrics.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+# Endpoint to inspect the result cache
+@app.get("/cache/stats")
+def get_cache_stats():
+    """
+    Return hit/miss counters and occupancy of the chain result cache, and of the
+    near-duplicate index when it is enabled.
+
+    Counters are per worker process; the disk tier is shared by all workers.
+    """
+    stats = result_cache.stats()
+    if near_duplicate_index is not None:
+        stats["near_duplicates"] = near_duplicate_index.stats()
+    return stats
+
+
+# Endpoint running the metadata and EOV chains concurrently on one document
+@app.post("/extract", response_model=ExtractionResult)
+async def extract(document: DocumentInput, request: Request):
     """
-    Process user feedback and log data to MLflow.
+    Extract metadata (including its full JSON schema) and EOVs from a document in one call.
 
     Args:
-        feedback (UserFeedback_EOV): Feedback details including file metadata and EOV details.
-    
+        document (DocumentInput): The document text.
+
     Returns:
-        dict: Success message indicating feedback submission and logging.
+        ExtractionResult: Both chain outputs plus per-chain timings in seconds.
     """
     try:
+        config = cache_bypass_modifier({}, request)
+        return await extract_document(document.text, cached_chain_MetadataSchemaCIOOS, cached_chain_eov, config)
+    except Exception as e:
+        print(f"Error during extract: {e}")
+        capture_exception(e)
 
-        # Print the received payload for debugging
-        print("Received Payload:", feedback.dict())
-
-        # Set up MLflow experiment
-        experiment_name = "User Feedback - EOVs"
-        experiment = mlflow.get_experiment_by_name(experiment_name)
-
-        if experiment and experiment.lifecycle_stage == "deleted":
-            mlflow.tracking.MlflowClient().restore_experiment(experiment.experiment_id)
-        elif not experiment:
-            mlflow.create_experiment(experiment_name)
-
-        mlflow.set_experiment(experiment_name)
-
-        # Start an MLflow run
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        run_name = f"EOVs {current_time}"
-
-        with mlflow.start_run(run_name=run_name) as run:
-
-            # Save feedback data
-            feedback_from_predicted_eovs = [item.dict() for item in feedback.feedback]
-            missing_eovs_with_comments = [item.dict() for item in feedback.missing_eovs]
-
-            # Log the JSON file to MLflow
-            mlflow.log_dict(feedback_from_predicted_eovs, "raw_feedback_data/feedback_from_predicted_eovs.json")
-            mlflow.log_dict(missing_eovs_with_comments, "raw_feedback_data/feedback_missing_eovs.json")
-
-            # Log metadata and context
-            mlflow.log_param("file_name", feedback.file_name)
-            mlflow.log_param("file_revision_date", feedback.revision_date)
-            mlflow.log_param("user_context", feedback.user_context)
-
-            # Log LangChain model as code
-            chain_path = "./app/core/chain_setup_eov.py"
-            model_info = mlflow.langchain.log_model(
-                lc_model=chain_path,
-                artifact_path="langchain_model"
-            )
-            print(f"LangChain model logged: {model_info}")
-
-            # Identify confusion matrix components
-            all_possible_eovs = set(POSSIBLE_EOVS)
-            true_positives = [item.eov for item in feedback.feedback if item.eov in POSSIBLE_EOVS and item.accept.lower() == "yes"]
-            false_negatives = [item.eov for item in feedback.missing_eovs if item.eov in POSSIBLE_EOVS]
-            false_positives = [item.eov for item in feedback.feedback if item.eov in POSSIBLE_EOVS and item.accept.lower() == "no"]
-            true_negatives = list(all_possible_eovs - set(true_positives) - set(false_negatives) - set(false_positives))
-
-            # Calculate precision, recall, and F1 score
-            precision = len(true_positives) / (len(true_positives) + len(false_positives)) if (len(true_positives) + len(false_positives)) > 0 else 0
-            recall = len(true_positives) / (len(true_positives) + len(false_negatives)) if (len(true_positives) + len(false_negatives)) > 0 else 0
-            f1_score_val = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
-
-            # Log metrics
-            mlflow.log_metric("precision", round(precision, 2))
-            mlflow.log_metric("recall", round(recall, 2))
-            mlflow.log_metric("f1_score", round(f1_score_val, 2))
-
-            # Create evaluation table
-            eval_data = []
-            for eov in POSSIBLE_EOVS:
-                eval_data.append({
-                    "EOV Name": eov,
-                    "True Positive": eov in true_positives,
-                    "False Positive": eov in false_positives,
-                    "True Negative": eov in true_negatives,
-                    "False Negative": eov in false_negatives,
-                })
-
-            eval_df = pd.DataFrame(eval_data)
-
-            # Save evaluation table
-            # Ensure the evaluation directory exists
-            os.makedirs("evaluation", exist_ok=True)
-
-            # Save the evaluation table to a CSV file
-            eval_table_path = "evaluation/evaluation_table.csv"
-            eval_df.to_csv(eval_table_path, index=False)
-
-            # Log the CSV file as an artifact
-            #mlflow.log_artifact(eval_table_path)
-            mlflow.log_artifact(eval_table_path, artifact_path="evaluation")
-
-
-            # Log confusion matrix components
-            conf_matrix_artifact = {
-                "true_positives": true_positives,
-                "false_positives": false_positives,
-                "false_negatives": false_negatives,
-                "true_negatives": true_negatives,
-            }
-            mlflow.log_dict(conf_matrix_artifact, "evaluation/confusion_matrix_components.json")
-
-        return {"message": "Feedback and model successfully submitted to MLflow."}
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+
+
+# Endpoint updating the EOVs of a previous revision from the changed sections only
+@app.post("/extract/eov/revision", response_model=EOVRevisionResult)
+async def extract_eov_revision(revision: EOVRevisionInput, request: Request):
+    """
+    Extract the EOVs of a new document revision from the result of the previous one.
+
+    The two texts are compared paragraph by paragraph: only the changed and added
+    paragraphs are sent to the EOV chain, previous citations no longer in the text are
+    dropped, and both results are merged. Citations are then located in the new text.
+
+    Args:
+        revision (EOVRevisionInput): New text, previous text and the previous EOVs.
 
+    Returns:
+        EOVRevisionResult: The EOVs of the new revision and what was sent to the chain.
+    """
+    try:
+        config = cache_bypass_modifier({}, request)
+        result, report = await reextract_eov(revision.text, revision.previous_text, revision.previous_eov,
+                                             cached_chain_eov_unverified, config)
     except Exception as e:
-        print(f"Error during submit_feedback_eov: {e}")
+        print(f"Error during EOV revision update: {e}")
         capture_exception(e)
 
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+    return {"eov": verify_citations(revision.text, result), "revision": report}
 
-# Endpoint to handle user metadta feedback and log to MLflow
-@app.post("/submit_feedback_metadata")
-def submit_metadata_feedback(feedback: MetadataFeedback):
+
+# Streaming variant: each half is sent as a Server-Sent Event as soon as it is ready
+@app.post("/extract/stream")
+async def extract_stream(document: DocumentInput, request: Request):
     """
-    Process metadata and keyword feedback, log data to MLflow, and save LangChain model as code.
-    This version includes a full evaluation of keyword feedback (including rejected items) and
-    computes the accuracy rate between the API's proposals and the final accepted keywords.
+    Stream `metadata`, `eov` (or `error`) and a final `end` event for a document.
     """
+    config = cache_bypass_modifier({}, request)
+
+    async def event_stream():
+        async for event, data in stream_extraction(document.text, cached_chain_MetadataSchemaCIOOS, cached_chain_eov, config):
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+async def _ingest(request: Request, drop_sections: List[str]) -> Tuple[str, IngestionStats]:
+    """Spool the request body to disk, normalize it and return the cleaned text with its stats."""
+    try:
+        path = await spool_upload(request.stream())
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     try:
-        print("Received Metadata Payload:", feedback.dict())
-
-        # Process metadata feedback
-        metadata_feedback = [item.dict() for item in feedback.metadata_feedback]
-
-        # Process keyword feedback (les objets Pydantic reçus)
-        keywords_feedback_en_objs = feedback.keywords_feedback.get("en", [])
-        keywords_feedback_fr_objs = feedback.keywords_feedback.get("fr", [])
-
-
-        keywords_feedback_en = [item.dict() for item in keywords_feedback_en_objs]
-        keywords_feedback_fr = [item.dict() for item in keywords_feedback_fr_objs]
-
-        print("Metadata Feedback:", metadata_feedback)
-        print("Keywords EN Feedback:", keywords_feedback_en)
-        print("Keywords FR Feedback:", keywords_feedback_fr)
-
-        # Listes prédéfinies pour chaque langue (les propositions du modèle)
-        predefined_keywords_fr = [
-            "abondance et biomasse", "accès à la mer", "aide à la décision",
-            "aires protégées", "amélioration des connaissances", "aménagement du territoire",
-            "assainissement des eaux", "bar rayé", "bassin versant",
-            "caractérisation des habitats", "caractérisation des rives",
-            "changement climatique", "conservation des ressources", "consommation d'eau",
-            "courant marin", "crustacé", "développement durable",
-            "échantillonnage", "mammifères marins", "milieux humides",
-            "qualité de l'eau", "télédétection", "température de l'eau", "vents", "zone côtière"
-        ]
-        predefined_keywords_en = [
-            "abundance and biomass", "sea access", "decision making",
-            "protected areas", "knowledge improvement", "land-use planning",
-            "water purification", "striped bass", "watershed",
-            "habitat characterization", "coastal characterization",
-            "climate change", "resource conservation", "water consumption",
-            "sea currents", "crustacean", "sustainable development",
-            "sampling", "marine mammal", "wetlands",
-            "water quality", "remote sensing", "water temperature", "wind", "coastal zone"
-        ]
-
-        # Evaluate keyword feedback for French and English
-        evaluation_fr = evaluate_keyword_feedback(keywords_feedback_fr, predefined_keywords_fr)
-        evaluation_en = evaluate_keyword_feedback(keywords_feedback_en, predefined_keywords_en)
-
-        # Set up MLflow experiment for metadata feedback
-        experiment_name = "User Feedback - Metadata"
-        experiment = mlflow.get_experiment_by_name(experiment_name)
-        if experiment and experiment.lifecycle_stage == "deleted":
-            mlflow.tracking.MlflowClient().restore_experiment(experiment.experiment_id)
-        elif not experiment:
-            mlflow.create_experiment(experiment_name)
-        mlflow.set_experiment(experiment_name)
-
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        run_name = f"Metadata Feedback {current_time}"
-
-        with mlflow.start_run(run_name=run_name) as run:
-            # Log raw metadata and keyword feedback to MLflow
-            mlflow.log_dict(metadata_feedback, "raw_feedback_data/metadata_feedback.json")
-            mlflow.log_dict(keywords_feedback_en, "raw_feedback_data/keywords_en_feedback.json")
-            mlflow.log_dict(keywords_feedback_fr, "raw_feedback_data/keywords_fr_feedback.json")
-
-            # Log contextual parameters
-            mlflow.log_param("file_name", feedback.file_name)
-            mlflow.log_param("file_revision_date", feedback.revision_date)
-            mlflow.log_param("user_context", feedback.user_context)
-
-            # Log LangChain model code artifact if exists
-            model_code_path = "./app/core/chain_setup_metadata.py"
-            if os.path.exists(model_code_path):
-                mlflow.log_artifact(model_code_path, artifact_path="langchain_model_code")
-                print(f"Logged LangChain model code from: {model_code_path}")
-            else:
-                print(f"Model code file not found at: {model_code_path}")
-
-            # Calculate simple metrics for metadata feedback
-            total_metadata = len(metadata_feedback)
-            accepted_metadata = sum(1 for item in metadata_feedback if item.get("accept", "").lower() == "accept")
-            rejected_metadata = total_metadata - accepted_metadata
-            acceptance_rate_metadata = accepted_metadata / total_metadata if total_metadata > 0 else 0
-
-            mlflow.log_metric("01-total_metadata", total_metadata)
-            mlflow.log_metric("02-accepted_metadata", accepted_metadata)
-            mlflow.log_metric("03-rejected_metadata", rejected_metadata)
-            mlflow.log_metric("04-acceptance_rate_metadata", round(acceptance_rate_metadata, 2))
-
-            # Keyword evaluation metrics for French
-            mlflow.log_metric("05-keywords_total_keywords_fr", evaluation_fr["total_keywords"])
-            mlflow.log_metric("06-keywords_api_accepted_count_fr", evaluation_fr["api_accepted_count"])
-            mlflow.log_metric("07-keywords_manual_added_count_fr", evaluation_fr["manual_added_count"])
-            mlflow.log_metric("08-keywords_final_true_count_fr", evaluation_fr["final_true_count"])
-            mlflow.log_metric("09-keywords_count_rejected_fr", evaluation_fr["count_rejected"])
-            mlflow.log_metric("10-keywords_accuracy_rate_fr", evaluation_fr["accuracy_rate"])
-
-            # Keyword evaluation metrics for English
-            mlflow.log_metric("11-keywords_total_keywords_en", evaluation_en["total_keywords"])
-            mlflow.log_metric("12-keywords_api_accepted_count_en", evaluation_en["api_accepted_count"])
-            mlflow.log_metric("13-keywords_manual_added_count_en", evaluation_en["manual_added_count"])
-            mlflow.log_metric("14-keywords_final_true_count_en", evaluation_en["final_true_count"])
-            mlflow.log_metric("15-keywords_count_rejected_en", evaluation_en["count_rejected"])
-            mlflow.log_metric("16-keywords_accuracy_rate_en", evaluation_en["accuracy_rate"])
-
-
-
-            # Log keyword evaluation results
-            mlflow.log_dict(evaluation_fr, "evaluation/keywords_evaluation_fr.json")
-            mlflow.log_dict(evaluation_en, "evaluation/keywords_evaluation_en.json")
-
-
-            # Generate and log an evaluation table for metadata feedback
-            eval_df_metadata = pd.DataFrame(metadata_feedback)
-            os.makedirs("evaluation", exist_ok=True)
-            metadata_eval_path = "evaluation/metadata_evaluation_table.csv"
-            eval_df_metadata.to_csv(metadata_eval_path, index=False)
-            mlflow.log_artifact(metadata_eval_path, artifact_path="evaluation")
-            print("Logged evaluation table to MLflow.")
-
-        return {"message": "Metadata and keywords feedback successfully submitted, including model code."}
+        upload_bytes = os.path.getsize(path)
+        document = await run_in_threadpool(normalize_file, path, drop_sections)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except IngestionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        os.unlink(path)
+    if not document.text:
+        raise HTTPException(status_code=422, detail="The document contains no text.")
+    return document.text, IngestionStats(upload_bytes=upload_bytes, **document.stats)
+
+
+# Endpoint ingesting an uploaded document file and running both chains on the cleaned text
+@app.post("/ingest", response_model=IngestionResult)
+async def ingest(request: Request, drop_sections: List[str] = Query([])):
+    """
+    Extract metadata and EOVs from an uploaded text file.
 
+    The request body is the file itself (UTF-8 text, optionally gzip-compressed). It is
+    streamed to disk, then cleaned to reduce the tokens sent to the chains: repeated
+    headers and footers, page numbers, dot leaders, hyphenation breaks and whitespace
+    runs are removed, as well as the sections listed in `drop_sections`
+    (contents, acknowledgements, references, appendices).
+
+    Args:
+        drop_sections (List[str]): Sections to leave out, e.g. `?drop_sections=references`.
+
+    Returns:
+        IngestionResult: Same as /extract, plus token counts before and after cleaning.
+    """
+    text, stats = await _ingest(request, drop_sections)
+    try:
+        config = cache_bypass_modifier({}, request)
+        result = await extract_document(text, cached_chain_MetadataSchemaCIOOS, cached_chain_eov, config)
     except Exception as e:
-        print(f"Error during submit_feedback_metadata: {e}")
+        print(f"Error during ingest: {e}")
         capture_exception(e)
-     
+
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
-  
-  
-   
+    return {**result, "ingestion": stats}
+
+
+# Endpoint returning the cleaned text of an uploaded document, without calling the chains
+@app.post("/ingest/preview", response_model=IngestionPreview)
+async def ingest_preview(request: Request, drop_sections: List[str] = Query([])):
+    """
+    Clean an uploaded text file as /ingest does and return the text sent to the chains.
+    """
+    text, stats = await _ingest(request, drop_sections)
+    return {"text": text, "ingestion": stats}
+
+
+# Endpoint streaming the metadata fields as the model writes them
+@app.post("/metadata/stream")
+async def metadata_stream(document: DocumentInput, request: Request):
+    """
+    Stream the metadata of a document as Server-Sent Events.
+
+    Short fields (title, resource_type, langue...) arrive first as `field` events,
+    the summaries are streamed as `delta` events while they are written, then a
+    `metadata` event carries the validated metadata and its full JSON schema,
+    followed by `end`. Results are shared with the /chain_MetadataSchemaCIOOS cache.
+    """
+    config = cache_bypass_modifier({}, request)
+    key = cache_key("chain_MetadataSchemaCIOOS", metadata_fingerprint, document.text)
+
+    async def event_stream():
+        async for event, data in stream_metadata(document.text, instrumented_chain_MetadataSchemaCIOOS_streaming,
+                                                 config, cache=result_cache, key=key):
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+# Endpoint to submit a batch of documents for extraction
+@app.post("/jobs", status_code=202)
+def submit_batch_job(job: BatchJobRequest):
+    """
+    Store a batch of documents to be run through the metadata and EOV chains.
+
+    Args:
+        job (BatchJobRequest): Documents, each with an optional client ID.
+
+    Returns:
+        dict: Job ID and number of documents. Poll /jobs/{job_id} and download
+        /jobs/{job_id}/results.
+    """
+    if not job.documents:
+        raise HTTPException(status_code=422, detail="No documents provided.")
+    if len(job.documents) > BATCH_MAX_DOCUMENTS:
+        raise HTTPException(status_code=413, detail=f"A job is limited to {BATCH_MAX_DOCUMENTS} documents.")
+    try:
+        job_id = batch_store.create_job([document.dict() for document in job.documents])
+    except Exception as e:
+        print(f"Error while creating batch job: {e}")
+        capture_exception(e)
+
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+    return {"job_id": job_id, "total": len(job.documents)}
+
+
+# Endpoint reporting the progress of a batch job
+@app.get("/jobs/{job_id}")
+def get_batch_job(job_id: str):
+    status = batch_store.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return status
+
+
+# Endpoint downloading the results of a batch job as NDJSON
+@app.get("/jobs/{job_id}/results")
+def get_batch_job_results(job_id: str):
+    """
+    Return one JSON line per document, in submission order: its status, and its
+    result (metadata, full_metadata, eov, timings) or last error. Documents still
+    running are included with their current status.
+    """
+    if batch_store.status(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    lines = (json.dumps(item, ensure_ascii=False) + "\n" for item in batch_store.iter_results(job_id))
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+
+# Endpoint cancelling the documents of a batch job that are not finished
+@app.post("/jobs/{job_id}/cancel")
+def cancel_batch_job(job_id: str):
+    if not batch_store.cancel(job_id):
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return batch_store.status(job_id)
+
+
+# Endpoint to queue user eov feedback for logging to MLflow
+@app.post("/submit_feedback_eov", status_code=202)
+def submit_eov_feedback(feedback: UserFeedback_EOV):
+    """
+    Validate user EOV feedback and queue it for logging to MLflow.
+
+    Args:
+        feedback (UserFeedback_EOV): Feedback details including file metadata and EOV details.
+    
+    Returns:
+        dict: Message and ID of the queued feedback (see /feedback/{feedback_id}).
+    """
+    return _enqueue_feedback("eov", feedback)
+
+
+# Endpoint to queue user metadata feedback for logging to MLflow
+@app.post("/submit_feedback_metadata", status_code=202)
+def submit_metadata_feedback(feedback: MetadataFeedback):
+    """
+    Validate metadata and keyword feedback and queue it for logging to MLflow.
+
+    Args:
+        feedback (MetadataFeedback): Metadata and keyword feedback for one file.
+
+    Returns:
+        dict: Message and ID of the queued feedback (see /feedback/{feedback_id}).
+    """
+    return _enqueue_feedback("metadata", feedback)
+
+
+# Endpoint to queue the feedback of a whole review session as a single submission
+@app.post("/submit_feedback_bulk", status_code=202)
+def submit_bulk_feedback(feedback: BulkFeedback):
+    """
+    Validate a list of EOV and metadata feedback items and queue them for MLflow.
+
+    Metrics for all documents are computed together and logged as one run per
+    experiment, with per-document tables, instead of one run per file.
+
+    Args:
+        feedback (BulkFeedback): EOV and metadata feedback for several files.
+
+    Returns:
+        dict: Message and ID of the queued feedback (see /feedback/{feedback_id}).
+    """
+    if not feedback.eov_feedback and not feedback.metadata_feedback:
+        raise HTTPException(status_code=422, detail="No feedback items provided.")
+    return _enqueue_feedback("bulk", feedback)
+
+
+def _enqueue_feedback(kind: str, feedback: BaseModel) -> dict:
+    try:
+        feedback_id = feedback_queue.enqueue(kind, feedback.model_dump())
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    except Exception as e:
+        print(f"Error while queuing {kind} feedback: {e}")
+        capture_exception(e)
+
+        raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
+    _record_feedback(kind, feedback)
+    return {"message": "Feedback accepted and queued for MLflow.", "feedback_id": feedback_id}
+
+
+def _record_feedback(kind: str, feedback: BaseModel) -> None:
+    """Add a queued submission to the analytics store. A failure there does not reject the feedback."""
+    if kind == "bulk":
+        eov_items, metadata_items = feedback.eov_feedback, feedback.metadata_feedback
+    else:
+        eov_items, metadata_items = ([feedback], []) if kind == "eov" else ([], [feedback])
+    try:
+        for item in eov_items:
+            feedback_store.add_eov_feedback(item)
+        for item in metadata_items:
+            feedback_store.add_metadata_feedback(item)
+    except Exception as e:
+        print(f"Error while recording {kind} feedback for analytics: {e}")
+        capture_exception(e)
+
+
+# Endpoint reporting the feedback queue depth and lag
+@app.get("/feedback/queue/status")
+def get_feedback_queue_status():
+    """
+    Return the number of queued, running, done and failed feedback items and the
+    age in seconds of the oldest item still waiting.
+    """
+    return feedback_queue.status()
+
+
+TrendBucket = Literal["day", "week", "month", "quarter", "year"]
+
+
+def _day(value: Optional[date]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+# Endpoint reporting EOV precision and recall over time
+@app.get("/feedback/analytics/eov")
+def get_eov_feedback_trend(eov: Optional[str] = None, since: Optional[date] = None, until: Optional[date] = None,
+                           bucket: TrendBucket = "month"):
+    """
+    Precision, recall and F1 of the proposed EOVs per period, from the reviewer feedback.
+
+    Args:
+        eov (str, optional): One EOV name (e.g. "Oxygène"); all EOVs are summed otherwise.
+        since (date, optional): First day included (UTC submission date).
+        until (date, optional): Last day included.
+        bucket (str): Period of each trend point: day, week, month, quarter or year.
+    """
+    return feedback_store.eov_trend(eov, _day(since), _day(until), bucket)
+
+
+# Endpoint comparing the EOVs over a period
+@app.get("/feedback/analytics/eov/summary")
+def get_eov_feedback_summary(since: Optional[date] = None, until: Optional[date] = None):
+    """Precision, recall and F1 of each EOV over the period, most reviewed first."""
+    return feedback_store.eov_summary(_day(since), _day(until))
+
+
+# Endpoint reporting keyword acceptance over time
+@app.get("/feedback/analytics/keywords")
+def get_keyword_feedback_trend(keyword: Optional[str] = None, language: Optional[str] = None,
+                               since: Optional[date] = None, until: Optional[date] = None,
+                               bucket: TrendBucket = "month"):
+    """
+    Acceptance of the proposed keywords per period.
+
+    `keyword` matches regardless of case, accents and plural ("Mammifères marins" is
+    "mammifère marin"); all keywords are summed when it is omitted.
+    """
+    return feedback_store.keyword_trend(keyword, language, _day(since), _day(until), bucket)
+
+
+# Endpoint listing the most reviewed keywords
+@app.get("/feedback/analytics/keywords/summary")
+def get_keyword_feedback_summary(language: Optional[str] = None, since: Optional[date] = None,
+                                 until: Optional[date] = None, limit: int = Query(100, ge=1, le=1000)):
+    return feedback_store.keyword_summary(language, _day(since), _day(until), limit)
+
+
+# Endpoint reporting metadata field acceptance over time
+@app.get("/feedback/analytics/metadata")
+def get_metadata_feedback_trend(field: Optional[str] = None, since: Optional[date] = None,
+                                until: Optional[date] = None, bucket: TrendBucket = "month"):
+    return feedback_store.metadata_trend(field, _day(since), _day(until), bucket)
+
+
+# Endpoint listing the feedback received for one file
+@app.get("/feedback/analytics/files/{file_name}")
+def get_file_feedback(file_name: str, revision_date: Optional[str] = None):
+    submissions = feedback_store.file_feedback(file_name, revision_date)
+    if not submissions:
+        raise HTTPException(status_code=404, detail="No feedback for this file.")
+    return submissions
+
+
+# Endpoint reporting the processing state of one feedback submission
+@app.get("/feedback/{feedback_id}")
+def get_feedback_status(feedback_id: int):
+    item = feedback_queue.get(feedback_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="Feedback not found.")
+    return item
+
+
 # Endpoint to generate full metadata JSON schema
 @app.post("/generate_full_metadata_json/")
 async def generate_full_metadata(metadata: MetadataSchemaCIOOS):
@@ -312,3 +604,33 @@ async def generate_full_metadata(metadata: MetadataSchemaCIOOS):
         Transformed metadata in full JSON schema format.
     """
     return transform_metadata_to_full(metadata)
+
+
+class RequestStreamingResponse(StreamingResponse):
+    """
+    Streaming response for a request body that is still being read.
+
+    StreamingResponse listens for a client disconnect on `receive` while streaming, which
+    would consume the request body. A disconnect shows up as a failed send instead.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+# Endpoint to generate full metadata JSON records in bulk
+@app.post("/generate_full_metadata_ndjson/")
+async def generate_full_metadata_ndjson(request: Request):
+    """
+    Transform an NDJSON stream of metadata records (one `MetadataSchemaCIOOS` per line).
+
+    The request body is read and the results are sent as they are produced, so memory use
+    does not depend on the number of records.
+
+    Returns:
+        NDJSON stream of full metadata records, in input order; an invalid line gives
+        {"line": <line number>, "error": [...]}.
+    """
+    return RequestStreamingResponse(transform_ndjson(request.stream()), media_type="application/x-ndjson")
@@ -1,17 +1,26 @@
+import sys
 from langchain_core.prompts import ChatPromptTemplate
 from app.schemas.eov import EOVWithCitations
-from langchain_community.callbacks import MlflowCallbackHandler
-import mlflow.models
-from langchain_openai import ChatOpenAI
+from app.services.eov_prefilter import EOV_PREFILTER_ENABLED, eov_prompt_with_prefilter
+from app.services.eov_cascade import EOV_CASCADE_ENABLED, EOV_CASCADE_MODEL, EOVCascade
+from app.services.llm_cassette import chat_model
 
-# 1. Model configuration
-model_eov = ChatOpenAI(
+# 1. Model configuration (rate-controlled; recorded or replayed depending on LLM_CASSETTE_MODE)
+model_eov = chat_model(
     model="gpt-4o-2024-08-06",
     temperature=0.1,
     seed=42,
     disable_streaming=True
 )
 
+# Smaller, faster model answering first when EOV_CASCADE_ENABLED is set
+model_eov_small = chat_model(
+    model=EOV_CASCADE_MODEL,
+    temperature=0.1,
+    seed=42,
+    disable_streaming=True
+)
+
 # 2. Define the EOV-specific prompt
 prompt_eov_v1 = f'''
 
@@ -126,10 +135,36 @@ prompt_template_eov = ChatPromptTemplate.from_messages([
 ])
 
 # 4. Create the chain for EOV processing with structured output
-chain_eov = prompt_template_eov | model_eov.with_structured_output(
+# With EOV_PREFILTER_ENABLED, the system prompt only keeps the EOVs likely to be in the text
+if EOV_PREFILTER_ENABLED:
+    prompt_stage_eov = eov_prompt_with_prefilter(prompt_eov_v1).with_types(
+        input_type=prompt_template_eov.get_input_schema(),
+    )
+else:
+    prompt_stage_eov = prompt_template_eov
+
+chain_eov_large = prompt_stage_eov | model_eov.with_structured_output(
     schema=EOVWithCitations,
     method='json_schema',
 )
 
+# With EOV_CASCADE_ENABLED, the small model answers first and only answers failing the
+# local checks (unknown EOVs, citations not in the text, EOVs named in the text missing)
+# are sent to the large model
+if EOV_CASCADE_ENABLED:
+    chain_eov_small = prompt_stage_eov | model_eov_small.with_structured_output(
+        schema=EOVWithCitations,
+        method='json_schema',
+    )
+    eov_cascade = EOVCascade(chain_eov_small, chain_eov_large, prompt=prompt_eov_v1)
+    chain_eov = eov_cascade.as_runnable()
+else:
+    eov_cascade = None
+    chain_eov = chain_eov_large
+
 # 5. Register the EOV chain in MLflow
-mlflow.models.set_model(chain_eov)
\ No newline at end of file
+# MLflow is only imported when it loads this file as a model (models from code) or by the
+# feedback workers, so the API does not pay for importing it at startup.
+if "mlflow" in sys.modules:
+    import mlflow.models
+    mlflow.models.set_model(chain_eov)
\ No newline at end of file
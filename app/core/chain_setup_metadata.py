@@ -1,30 +1,34 @@
 # Imports
 # 1. LangChain core components
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_community.callbacks import MlflowCallbackHandler
-from langchain_core.prompts import ChatPromptTemplate
-from app.schemas.eov import EOVWithCitations
-from langchain_community.callbacks import MlflowCallbackHandler
-import mlflow.models  # Import MLflow models
-from langchain_openai import ChatOpenAI
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.utils.function_calling import convert_to_openai_function
 
 # 2. Application-specific imports
 from app.schemas.metadata import MetadataSchemaCIOOS
+from app.services.llm_cassette import chat_model
+from app.utils.keyword_vocabulary import KEYWORD_VOCABULARY
 
-# 3. MLflow imports
-import mlflow.models  # Import MLflow models
-
-# 4. Standard Python libraries
+# 3. Standard Python libraries
+import sys
 from datetime import datetime
 
-# Model Configuration
-model = ChatOpenAI(
+# Model Configuration (rate-controlled; recorded or replayed depending on LLM_CASSETTE_MODE)
+model = chat_model(
     model="gpt-4o-2024-08-06",
     temperature=0.1,
     seed=42,
     disable_streaming=True
 )
 
+# Same model with token streaming, used by the streaming metadata endpoint
+model_streaming = chat_model(
+    model="gpt-4o-2024-08-06",
+    temperature=0.1,
+    seed=42,
+    stream_usage=True
+)
+
 # Metadata Prompt
 prompt_MetadataSchemaCIOOS_v1 = f'''
     Vous êtes un expert en extraction de données non structurées maritimes. Votre tâche est d'extraire les informations strictement présentes dans le texte fourni et de remplir les champs de la structure de données demandée, en français et en anglais, selon la définition de la classe ci-dessous.
@@ -65,31 +69,7 @@ prompt_MetadataSchemaCIOOS_v1 = f'''
 
     Vous pouvez choisir un mot clé prédéfini de la liste suivante. Vous pouvez aussi créer votre propre mot clé en rédigeant un texte libre en anglais ou en français (vérifiez toujours si son équivalent existe dans la liste déroulante afin de diminuer le risque d'écriture multiple d'un même mot clé -ex: phoque Vs Phoques-).
 
-        "en": "abundance and biomass", "fr": "abondance et biomasse"
-        "en": "sea access", "fr": "accès à la mer"
-        "en": "decision making", "fr": "aide à la décision"
-        "en": "protected areas", "fr": "aires protégées"
-        "en": "knowledge improvement", "fr": "amélioration des connaissances"
-        "en": "land-use planning", "fr": "aménagement du territoire"
-        "en": "water purification", "fr": "assainissement des eaux"
-        "en": "striped bass", "fr": "bar rayé"
-        "en": "watershed", "fr": "bassin versant"
-        "en": "habitat characterization", "fr": "caractérisation des habitats"
-        "en": "coastal characterization", "fr": "caractérisation des rives"
-        "en": "climate change", "fr": "changement climatique"
-        "en": "resource conservation", "fr": "conservation des ressources"
-        "en": "water consumption", "fr": "consommation d'eau"
-        "en": "sea currents", "fr": "courant marin"
-        "en": "crustacean", "fr": "crustacé"
-        "en": "sustainable development", "fr": "développement durable"
-        "en": "sampling", "fr": "échantillonnage"
-        "en": "marine mammal", "fr": "mammifères marins"
-        "en": "wetlands", "fr": "milieux humides"
-        "en": "water quality", "fr": "qualité de l'eau"
-        "en": "remote sensing", "fr": "télédétection"
-        "en": "water temperature", "fr": "température de l'eau"
-        "en": "wind", "fr": "vents"
-        "en": "coastal zone", "fr": "zone côtière"
+{KEYWORD_VOCABULARY.prompt_list()}
 
     - **langue** : Indiquez la langue principale des données : 'fr' pour Français ou 'en' pour Anglais. Ne faites pas de supposition.
 
@@ -117,6 +97,31 @@ chain_MetadataSchemaCIOOS = prompt_template_MetadataSchemaCIOOS | model.with_str
     method='json_schema',
 )
 
+# 2. Streaming variant: the same strict JSON schema, given as a plain response format (the
+# OpenAI client only streams those) and parsed into a growing partial object as tokens arrive.
+# Fields are generated in schema order: short fields come first so that reviewers see the
+# title, resource type and language before the long summaries are written.
+STREAMING_FIELD_ORDER = [
+    "title", "resource_type", "langue", "theme", "title_translated", "date_debut", "date_fin",
+    "spatial", "auteurs", "mots_cles", "summary", "summary_translated",
+]
+metadata_function = convert_to_openai_function(MetadataSchemaCIOOS, strict=True)
+metadata_schema = metadata_function["parameters"]
+metadata_schema["properties"] = {name: metadata_schema["properties"][name] for name in STREAMING_FIELD_ORDER}
+metadata_schema["required"] = STREAMING_FIELD_ORDER
+metadata_response_format = {
+    "type": "json_schema",
+    "json_schema": {"name": metadata_function["name"], "schema": metadata_schema, "strict": True},
+}
+chain_MetadataSchemaCIOOS_streaming = (
+    prompt_template_MetadataSchemaCIOOS
+    | model_streaming.bind(response_format=metadata_response_format)
+    | JsonOutputParser()
+)
+
 # Register Chain with MLflow
-# Use MLflow to register the chain for MetadataSchemaCIOOS
-mlflow.models.set_model(chain_MetadataSchemaCIOOS)
+# Use MLflow to register the chain for MetadataSchemaCIOOS (models from code). MLflow is only
+# imported when it loads this file or by the feedback workers, not at API startup.
+if "mlflow" in sys.modules:
+    import mlflow.models
+    mlflow.models.set_model(chain_MetadataSchemaCIOOS)
@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+# =============================================================================
+# BATCH JOB MODELS
+# =============================================================================
+
+class BatchDocument(BaseModel):
+    # Client identifier (e.g. file name) echoed in the results
+    id: Optional[str] = None
+    text: str
+
+
+class BatchJobRequest(BaseModel):
+    documents: List[BatchDocument]
@@ -8,6 +8,14 @@ from typing import List, Optional
 class Citation(BaseModel):
     citation_texte: str
 
+
+class VerifiedCitation(Citation):
+    # Character offsets of the quote in the source text, None if it could not be found
+    start: Optional[int] = None
+    end: Optional[int] = None
+    score: float = 0.0
+    verified: bool = False
+
 # =============================================================================
 # EOV MODELS
 # =============================================================================
@@ -19,3 +27,15 @@ class EOVWithReason(BaseModel):
 
 class EOVWithCitations(BaseModel):
     liste_eov: List[EOVWithReason]
+
+
+# =============================================================================
+# VERIFIED EOV MODELS (citations located in the source text)
+# =============================================================================
+
+class VerifiedEOVWithReason(EOVWithReason):
+    citation: List[VerifiedCitation]
+
+
+class VerifiedEOVWithCitations(EOVWithCitations):
+    liste_eov: List[VerifiedEOVWithReason]
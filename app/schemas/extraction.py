@@ -0,0 +1,92 @@
+from pydantic import BaseModel
+from typing import Dict, List, Literal, Optional
+
+from app.schemas.eov import EOVWithCitations, VerifiedEOVWithCitations
+from app.schemas.metadata import MetadataSchemaCIOOS, FullMetadataSchema
+
+# =============================================================================
+# COMBINED EXTRACTION MODELS
+# =============================================================================
+
+class DocumentInput(BaseModel):
+    text: str
+
+
+class NearDuplicateMatch(BaseModel):
+    # Prior document whose result was reused, and the estimated similarity of the texts (0-1)
+    document_id: int
+    similarity: float
+
+
+class EOVCascadeReport(BaseModel):
+    # "large" when the large model answered at least one of the calls (one per chunk of a long document)
+    tier: Literal["small", "large"]
+    calls: int
+    escalated: int
+    reasons: List[str]
+
+
+class ExtractionResult(BaseModel):
+    metadata: MetadataSchemaCIOOS
+    full_metadata: FullMetadataSchema
+    eov: VerifiedEOVWithCitations
+    timings: Dict[str, float]
+    # By chain name, only for the chains that reused a prior result
+    near_duplicates: Dict[str, NearDuplicateMatch] = {}
+    # Only when the EOV model cascade is enabled and the EOV chain ran (not served from a cache)
+    eov_cascade: Optional[EOVCascadeReport] = None
+
+
+# =============================================================================
+# INGESTION MODELS
+# =============================================================================
+
+class IngestionStats(BaseModel):
+    upload_bytes: int
+    chars_before: int
+    chars_after: int
+    lines_before: int
+    lines_after: int
+    # Estimated tokens (~4 characters per token) of the text as uploaded and as sent to the chains
+    tokens_before: int
+    tokens_after: int
+    page_numbers: int = 0
+    repeated_lines: int = 0
+    hyphens_repaired: int = 0
+    section_lines: int = 0
+
+
+class IngestionPreview(BaseModel):
+    text: str
+    ingestion: IngestionStats
+
+
+class IngestionResult(ExtractionResult):
+    ingestion: IngestionStats
+
+
+# =============================================================================
+# EOV REVISION MODELS
+# =============================================================================
+
+class EOVRevisionInput(BaseModel):
+    text: str
+    previous_text: str
+    # EOVs returned for previous_text (/chain_eov or /extract output; offsets are ignored)
+    previous_eov: EOVWithCitations
+
+
+class EOVRevisionReport(BaseModel):
+    sections: int
+    changed_sections: int
+    removed_sections: int
+    citations_dropped: int
+    full_run: bool
+    estimated_tokens_document: int
+    estimated_tokens_sent: int
+    seconds: float
+
+
+class EOVRevisionResult(BaseModel):
+    eov: VerifiedEOVWithCitations
+    revision: EOVRevisionReport
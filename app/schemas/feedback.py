@@ -48,6 +48,11 @@ class MetadataFeedback(BaseModel):
     user_context: str
 
 
+class BulkFeedback(BaseModel):
+    eov_feedback: List[UserFeedback_EOV] = []
+    metadata_feedback: List[MetadataFeedback] = []
+
+
 # =============================================================================
 # CONSTANTS
 # =============================================================================
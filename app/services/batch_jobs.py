@@ -0,0 +1,228 @@
+import json
+import os
+import sqlite3
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.runnables import Runnable
+
+from app.services.extraction import extract_document_sync
+from app.services.work_queue import LeasedWorkQueue, LeasedWorkerPool
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+BATCH_JOBS_PATH = os.getenv("BATCH_JOBS_PATH", "data/batch_jobs.sqlite3")
+# Documents processed at the same time by each API process
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", 4))
+BATCH_MAX_ATTEMPTS = int(os.getenv("BATCH_MAX_ATTEMPTS", 3))
+BATCH_MAX_DOCUMENTS = int(os.getenv("BATCH_MAX_DOCUMENTS", 1000))
+# A document claimed by a process that stopped is picked up again after this delay
+BATCH_LEASE_SECONDS = float(os.getenv("BATCH_LEASE_SECONDS", 600))
+
+RETRY_BASE_SECONDS = 5.0
+RETRY_MAX_SECONDS = 300.0
+# Rows read per query when exporting results
+RESULTS_PAGE_SIZE = 100
+
+ITEM_STATUSES = ("pending", "processing", "done", "failed", "cancelled")
+
+
+# =============================================================================
+# JOB STORE
+# =============================================================================
+
+class BatchJobStore(LeasedWorkQueue):
+    """
+    Jobs and their documents in a local SQLite file.
+
+    Each document is a work item of a `LeasedWorkQueue`, like a feedback queue item:
+    claimed atomically with a lease (so work held by a stopped process is resumed),
+    retried with backoff, then parked as failed. Results are stored per document.
+    """
+
+    table = "batch_items"
+    key_columns = ("job_id", "item_index")
+    retry_base_seconds = RETRY_BASE_SECONDS
+    retry_max_seconds = RETRY_MAX_SECONDS
+
+    def __init__(self, path: str = BATCH_JOBS_PATH, max_attempts: int = BATCH_MAX_ATTEMPTS,
+                 lease_seconds: float = BATCH_LEASE_SECONDS):
+        super().__init__(path, max_attempts, lease_seconds)
+
+    def _create_schema(self, conn: sqlite3.Connection) -> None:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS batch_jobs ("
+            " id TEXT PRIMARY KEY,"
+            " cancelled INTEGER NOT NULL DEFAULT 0,"
+            " total INTEGER NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS batch_items ("
+            " job_id TEXT NOT NULL,"
+            " item_index INTEGER NOT NULL,"
+            " document_id TEXT,"
+            " text TEXT NOT NULL,"
+            " status TEXT NOT NULL DEFAULT 'pending',"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " available_at REAL NOT NULL,"
+            " finished_at REAL,"
+            " result TEXT,"
+            " error TEXT,"
+            " PRIMARY KEY (job_id, item_index))"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_batch_items_status ON batch_items (status, available_at)")
+
+    def create_job(self, documents: List[Dict[str, Any]]) -> str:
+        """Store a job and its documents ({"id", "text"}), and return the job ID."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("INSERT INTO batch_jobs (id, total, created_at) VALUES (?, ?, ?)",
+                         (job_id, len(documents), now))
+            conn.executemany(
+                "INSERT INTO batch_items (job_id, item_index, document_id, text, available_at) VALUES (?, ?, ?, ?, ?)",
+                [(job_id, i, document.get("id"), document["text"], now) for i, document in enumerate(documents)],
+            )
+        self.available.set()
+        return job_id
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Take the oldest available document (or one whose lease expired), or None."""
+        item = self.claim_item(("job_id", "item_index", "text"))
+        if item is not None:
+            item["index"] = item.pop("item_index")
+        return item
+
+    def complete(self, job_id: str, index: int, result: Dict[str, Any]) -> None:
+        # A document cancelled while it was running keeps its cancelled status
+        self.complete_item((job_id, index), {"result": json.dumps(result, ensure_ascii=False)})
+
+    def fail(self, job_id: str, index: int, attempts: int, error: str) -> None:
+        """Schedule a jittered exponential retry, or park the document as failed after `max_attempts`."""
+        self.fail_item((job_id, index), attempts, error)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel the documents of a job that are not finished. Returns False for an unknown job."""
+        with self._connect() as conn:
+            if conn.execute("UPDATE batch_jobs SET cancelled = 1 WHERE id = ?", (job_id,)).rowcount == 0:
+                return False
+            conn.execute(
+                "UPDATE batch_items SET status = 'cancelled', finished_at = ?"
+                " WHERE job_id = ? AND status IN ('pending', 'processing')",
+                (time.time(), job_id),
+            )
+        return True
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Progress of a job: document counts per status, overall status and timings."""
+        conn = self._connect()
+        job = conn.execute("SELECT cancelled, total, created_at FROM batch_jobs WHERE id = ?", (job_id,)).fetchone()
+        if job is None:
+            return None
+        counts = dict.fromkeys(ITEM_STATUSES, 0)
+        counts.update(conn.execute(
+            "SELECT status, COUNT(*) FROM batch_items WHERE job_id = ? GROUP BY status", (job_id,)
+        ).fetchall())
+        finished_at = conn.execute(
+            "SELECT MAX(finished_at) FROM batch_items WHERE job_id = ?", (job_id,)
+        ).fetchone()[0]
+        cancelled, total, created_at = job
+        remaining = counts["pending"] + counts["processing"]
+        if cancelled:
+            status = "cancelled"
+        elif remaining == 0:
+            status = "done"
+        elif remaining == total:
+            status = "pending" if counts["processing"] == 0 else "running"
+        else:
+            status = "running"
+        return {
+            "job_id": job_id,
+            "status": status,
+            "total": total,
+            **counts,
+            "progress": round((total - remaining) / total, 4) if total else 1.0,
+            "created_at": created_at,
+            "finished_at": finished_at if remaining == 0 else None,
+        }
+
+    def iter_results(self, job_id: str) -> Iterator[Dict[str, Any]]:
+        """Yield every document of a job in submission order with its result or error."""
+        last = -1
+        while True:
+            # A fresh query per page: the caller may resume iteration from another thread
+            rows = self._connect().execute(
+                "SELECT item_index, document_id, status, attempts, result, error FROM batch_items"
+                " WHERE job_id = ? AND item_index > ? ORDER BY item_index LIMIT ?",
+                (job_id, last, RESULTS_PAGE_SIZE),
+            ).fetchall()
+            if not rows:
+                return
+            for index, document_id, status, attempts, result, error in rows:
+                yield {
+                    "index": index,
+                    "id": document_id,
+                    "status": status,
+                    "attempts": attempts,
+                    "result": json.loads(result) if result else None,
+                    "error": error,
+                }
+            last = rows[-1][0]
+
+
+# =============================================================================
+# PROCESSING
+# =============================================================================
+
+def extraction_processor(metadata_chain: Runnable, eov_chain: Runnable) -> Callable[[str], Dict[str, Any]]:
+    """
+    Build the function run on each document: both chains concurrently (see
+    `extract_document_sync`), serialized to JSON-compatible values.
+    """
+
+    def _process(text: str) -> Dict[str, Any]:
+        result = extract_document_sync(text, metadata_chain, eov_chain)
+        return {
+            "metadata": result["metadata"].model_dump(),
+            "full_metadata": result["full_metadata"].model_dump(),
+            "eov": result["eov"].model_dump(),
+            "timings": result["timings"],
+        }
+
+    return _process
+
+
+class BatchWorkerPool(LeasedWorkerPool):
+    """
+    Background threads processing the documents of a `BatchJobStore`.
+
+    The number of threads bounds how many documents are processed at once.
+    """
+
+    name = "batch"
+
+    def __init__(self, store: BatchJobStore, processor: Callable[[str], Dict[str, Any]],
+                 workers: int = BATCH_WORKERS, poll_seconds: float = 1.0):
+        super().__init__(store, workers, poll_seconds)
+        self.store = store
+        self.processor = processor
+
+    def _key(self, item: Dict[str, Any]) -> Tuple[Any, ...]:
+        return (item["job_id"], item["index"])
+
+    def _describe(self, item: Dict[str, Any]) -> str:
+        return f"document {item['index']} of batch job {item['job_id']}"
+
+    def _process(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        return self.processor(item["text"])
+
+    def _complete(self, item: Dict[str, Any], result: Dict[str, Any]) -> None:
+        self.store.complete(item["job_id"], item["index"], result)
+
+    def _fail(self, item: Dict[str, Any], error: str) -> None:
+        self.store.fail(item["job_id"], item["index"], item["attempts"], error)
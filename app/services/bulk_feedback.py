@@ -0,0 +1,90 @@
+from typing import Dict, List
+
+import numpy as np
+
+from app.schemas.feedback import POSSIBLE_EOVS, UserFeedback_EOV, MetadataFeedback
+from app.services.eov_evaluator import confusion_masks
+
+
+def eov_feedback_matrices(feedbacks: List[UserFeedback_EOV]) -> Dict[str, np.ndarray]:
+    """
+    Build documents × `POSSIBLE_EOVS` boolean matrices from EOV feedback.
+
+    Same rules as the single-feedback endpoint, see `eov_evaluator.confusion_masks`.
+
+    Returns:
+        dict: "tp", "fp" and "fn" matrices of shape (len(feedbacks), len(POSSIBLE_EOVS)).
+    """
+    masks = np.array([confusion_masks(feedback)[:3] for feedback in feedbacks], dtype=np.uint64).reshape(-1, 3)
+    # Unpack the bitsets (bit i = POSSIBLE_EOVS[i]) into boolean columns
+    bits = np.unpackbits(masks.astype("<u8").view(np.uint8).reshape(-1, 3, 8), axis=2, bitorder="little")
+    bits = bits[:, :, :len(POSSIBLE_EOVS)].astype(bool)
+    tp, fp, fn = bits[:, 0], bits[:, 1], bits[:, 2]
+    return {"tp": tp, "fp": fp, "fn": fn}
+
+
+def _precision_recall_f1(tp: np.ndarray, fp: np.ndarray, fn: np.ndarray):
+    """Element-wise precision, recall and F1 over count arrays, 0 where undefined."""
+    tp, fp, fn = (np.asarray(a, dtype=float) for a in (tp, fp, fn))
+    precision = np.divide(tp, tp + fp, out=np.zeros_like(tp), where=(tp + fp) > 0)
+    recall = np.divide(tp, tp + fn, out=np.zeros_like(tp), where=(tp + fn) > 0)
+    f1 = np.divide(2 * precision * recall, precision + recall,
+                   out=np.zeros_like(tp), where=(precision + recall) > 0)
+    return precision, recall, f1
+
+
+def bulk_eov_metrics(tp: np.ndarray, fp: np.ndarray, fn: np.ndarray) -> Dict[str, object]:
+    """
+    Compute per-document, per-EOV and aggregate precision, recall and F1 in one pass.
+
+    Micro scores pool the counts of every document. Macro scores average the per-EOV
+    scores over EOVs that appear in at least one document's feedback.
+
+    Args:
+        tp, fp, fn (np.ndarray): Boolean documents × EOVs matrices from `eov_feedback_matrices`.
+
+    Returns:
+        dict: "per_document" and "per_eov" arrays keyed by metric, plus "micro" and "macro" scores.
+    """
+    doc_counts = [m.sum(axis=1) for m in (tp, fp, fn)]
+    eov_counts = [m.sum(axis=0) for m in (tp, fp, fn)]
+    doc_p, doc_r, doc_f1 = _precision_recall_f1(*doc_counts)
+    eov_p, eov_r, eov_f1 = _precision_recall_f1(*eov_counts)
+    micro_p, micro_r, micro_f1 = _precision_recall_f1(*(np.array([c.sum()]) for c in doc_counts))
+
+    support = (eov_counts[0] + eov_counts[1] + eov_counts[2]) > 0
+    macro = (
+        {"precision": float(eov_p[support].mean()), "recall": float(eov_r[support].mean()), "f1_score": float(eov_f1[support].mean())}
+        if support.any() else {"precision": 0.0, "recall": 0.0, "f1_score": 0.0}
+    )
+    return {
+        "per_document": {
+            "true_positives": doc_counts[0], "false_positives": doc_counts[1], "false_negatives": doc_counts[2],
+            "precision": doc_p, "recall": doc_r, "f1_score": doc_f1,
+        },
+        "per_eov": {
+            "true_positives": eov_counts[0], "false_positives": eov_counts[1], "false_negatives": eov_counts[2],
+            "precision": eov_p, "recall": eov_r, "f1_score": eov_f1,
+        },
+        "micro": {"precision": float(micro_p[0]), "recall": float(micro_r[0]), "f1_score": float(micro_f1[0])},
+        "macro": macro,
+    }
+
+
+def bulk_metadata_acceptance(feedbacks: List[MetadataFeedback]) -> Dict[str, object]:
+    """
+    Count accepted metadata fields per document and overall.
+
+    Returns:
+        dict: "total" and "accepted" arrays per document, the per-document acceptance
+        rate, and the pooled "acceptance_rate" over all documents.
+    """
+    total = np.array([len(f.metadata_feedback) for f in feedbacks], dtype=int)
+    accepted = np.array([sum(item.accept.lower() == "accept" for item in f.metadata_feedback) for f in feedbacks], dtype=int)
+    rate = np.divide(accepted, total, out=np.zeros(len(feedbacks)), where=total > 0)
+    return {
+        "total": total,
+        "accepted": accepted,
+        "acceptance_rate_per_document": rate,
+        "acceptance_rate": float(accepted.sum() / total.sum()) if total.sum() else 0.0,
+    }
@@ -0,0 +1,249 @@
+import bisect
+import os
+import re
+import unicodedata
+from collections import Counter
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+
+from app.schemas.eov import EOVWithCitations, VerifiedCitation, VerifiedEOVWithCitations, VerifiedEOVWithReason
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+# Citations matching the source below this similarity (0-1) are flagged as unverified
+CITATION_MIN_SCORE = float(os.getenv("CITATION_MIN_SCORE", 0.8))
+# "flag" keeps unverified citations with verified=False, "drop" removes them
+CITATION_VERIFICATION_MODE = os.getenv("CITATION_VERIFICATION_MODE", "flag")
+
+# Word n-gram size used to anchor fuzzy matches
+NGRAM_SIZE = 3
+# N-grams occurring more often than this in the source carry no location information
+MAX_NGRAM_POSITIONS = 50
+# Number of candidate windows scored with difflib per fuzzy lookup
+FUZZY_CANDIDATES = 3
+
+# Typographic variants the model tends to swap when quoting
+_CHAR_MAP = str.maketrans({
+    "‘": "'", "’": "'", "‚": "'", "′": "'", "`": "'",
+    "“": '"', "”": '"', "„": '"', "«": '"', "»": '"',
+    "‐": "-", "‑": "-", "‒": "-", "–": "-", "—": "-", "−": "-",
+    "\t": " ", "\n": " ", "\r": " ", "\f": " ", "\v": " ", " ": " ", " ": " ", " ": " ",
+})
+_SPACE_RUN = re.compile(r" {2,}")
+_WORD = re.compile(r"\w+")
+_ELLIPSIS = re.compile(r"\s*(?:\.{3,}|…|\[\s*(?:\.{3}|…)\s*\])\s*")
+_QUOTES = " \"'"
+
+
+class CitationMatch(NamedTuple):
+    start: int
+    end: int
+    score: float
+
+
+# =============================================================================
+# SOURCE INDEX
+# =============================================================================
+
+def _normalize(text: str) -> str:
+    return _SPACE_RUN.sub(" ", text.translate(_CHAR_MAP).lower())
+
+
+@lru_cache(maxsize=65536)
+def _fold_word(word: str) -> str:
+    # N-grams ignore accents, which models sometimes drop when quoting French text
+    return "".join(c for c in unicodedata.normalize("NFKD", word) if not unicodedata.combining(c))
+
+
+class SourceIndex:
+    """
+    Normalized view of a source document for locating quotes.
+
+    The text is case folded, typographic quotes and dashes are unified and whitespace
+    runs are collapsed. Offsets found in the normalized text are mapped back to the
+    original text. Exact lookups are plain substring searches; the word n-gram index
+    used for fuzzy lookups is built on first use.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        translated = text.translate(_CHAR_MAP).lower()
+        if len(translated) != len(text):
+            # A few characters (e.g. "İ") change length when lowercased
+            translated = "".join(c if len(c.lower()) != 1 else c.lower() for c in text.translate(_CHAR_MAP))
+
+        # Each collapsed whitespace run starts a new segment: (normalized start, original start)
+        parts, self._norm_starts, self._orig_starts = [], [0], [0]
+        removed, last = 0, 0
+        for run in _SPACE_RUN.finditer(translated):
+            parts.append(translated[last:run.start() + 1])
+            removed += len(run.group()) - 1
+            last = run.end()
+            self._norm_starts.append(run.end() - removed)
+            self._orig_starts.append(run.end())
+        parts.append(translated[last:])
+        self.normalized = "".join(parts)
+
+        self._words: Optional[List[Tuple[int, int]]] = None
+        self._ngrams: Optional[Dict[Tuple[str, ...], List[int]]] = None
+
+    def to_original(self, position: int) -> int:
+        """Map an offset in the normalized text to the original text."""
+        segment = bisect.bisect_right(self._norm_starts, position) - 1
+        return self._orig_starts[segment] + position - self._norm_starts[segment]
+
+    def to_normalized(self, position: int) -> int:
+        """Map an offset in the original text to the normalized text."""
+        segment = bisect.bisect_right(self._orig_starts, position) - 1
+        return self._norm_starts[segment] + max(position - self._orig_starts[segment], 0)
+
+    def _span(self, start: int, end: int, score: float) -> CitationMatch:
+        return CitationMatch(self.to_original(start), self.to_original(end - 1) + 1, round(score, 3))
+
+    def _build_ngrams(self) -> None:
+        self._words = [m.span() for m in _WORD.finditer(self.normalized)]
+        tokens = [_fold_word(self.normalized[start:end]) for start, end in self._words]
+        ngrams: Dict[Tuple[str, ...], List[int]] = {}
+        for i in range(len(tokens) - NGRAM_SIZE + 1):
+            ngrams.setdefault(tuple(tokens[i:i + NGRAM_SIZE]), []).append(i)
+        self._ngrams = ngrams
+
+    def _fuzzy(self, quote: str, min_score: float, from_position: int) -> Optional[CitationMatch]:
+        tokens = [_fold_word(word) for word in _WORD.findall(quote)]
+        if len(tokens) < NGRAM_SIZE:
+            return None
+        if self._ngrams is None:
+            self._build_ngrams()
+
+        # Each shared n-gram votes for the word where the quote would start
+        votes: Counter = Counter()
+        for offset in range(len(tokens) - NGRAM_SIZE + 1):
+            positions = self._ngrams.get(tuple(tokens[offset:offset + NGRAM_SIZE]), ())
+            if len(positions) <= MAX_NGRAM_POSITIONS:
+                for position in positions:
+                    votes[max(position - offset, 0)] += 1
+
+        best = None
+        for first_word, _ in votes.most_common(FUZZY_CANDIDATES):
+            last_word = min(first_word + len(tokens), len(self._words)) - 1
+            start, end = self._words[first_word][0], self._words[last_word][1]
+            if start < from_position:
+                continue
+            score = SequenceMatcher(None, quote, self.normalized[start:end], autojunk=False).ratio()
+            if score >= min_score and (best is None or score > best[2]):
+                best = (start, end, score)
+        return self._span(*best) if best else None
+
+    def locate(self, quote: str, min_score: float = CITATION_MIN_SCORE,
+               from_position: int = 0) -> Optional[CitationMatch]:
+        """
+        Find `quote` in the source text.
+
+        Args:
+            quote (str): Text quoted by the model.
+            min_score (float): Minimum similarity accepted for a fuzzy match.
+            from_position (int): Normalized offset where the search starts.
+
+        Returns:
+            CitationMatch or None: Original-text offsets and similarity (1.0 when exact).
+        """
+        needle = _normalize(quote).strip(_QUOTES)
+        if not needle:
+            return None
+        start = self.normalized.find(needle, from_position)
+        if start >= 0:
+            return self._span(start, start + len(needle), 1.0)
+        return self._fuzzy(needle, min_score, from_position)
+
+    def locate_citation(self, citation: str, min_score: float = CITATION_MIN_SCORE) -> Optional[CitationMatch]:
+        """
+        Find a citation that may elide parts of the source with "..." or "[…]".
+
+        Every fragment must be found, in order. The span covers the first to the last
+        fragment and the score is that of the weakest fragment.
+        """
+        fragments = [f for f in _ELLIPSIS.split(citation) if f.strip(_QUOTES)]
+        if len(fragments) <= 1:
+            return self.locate(citation, min_score)
+        matches, position = [], 0
+        for fragment in fragments:
+            match = self.locate(fragment, min_score, position)
+            if match is None:
+                return None
+            matches.append(match)
+            position = self.to_normalized(match.end)
+        return CitationMatch(matches[0].start, matches[-1].end, min(m.score for m in matches))
+
+
+# =============================================================================
+# VERIFICATION
+# =============================================================================
+
+def verify_citations(text: str, result: EOVWithCitations, *,
+                     min_score: float = CITATION_MIN_SCORE,
+                     mode: str = CITATION_VERIFICATION_MODE) -> VerifiedEOVWithCitations:
+    """
+    Locate every citation of an EOV result in the source text.
+
+    Args:
+        text (str): Document the EOVs were extracted from.
+        result (EOVWithCitations): Output of the EOV chain.
+        min_score (float): Minimum similarity for a citation to be verified.
+        mode (str): "flag" keeps unverified citations, "drop" removes them.
+
+    Returns:
+        VerifiedEOVWithCitations: The same EOVs, citations carrying their character
+        offsets in `text`, similarity score and `verified` flag.
+    """
+    index = SourceIndex(text)
+    liste_eov = []
+    for item in result.liste_eov:
+        citations = []
+        for citation in item.citation:
+            match = index.locate_citation(citation.citation_texte, min_score)
+            if match is not None:
+                citations.append(VerifiedCitation(citation_texte=citation.citation_texte, start=match.start,
+                                                  end=match.end, score=match.score, verified=True))
+            elif mode != "drop":
+                citations.append(VerifiedCitation(citation_texte=citation.citation_texte))
+        liste_eov.append(VerifiedEOVWithReason(eov=item.eov, raison=item.raison, citation=citations))
+    return VerifiedEOVWithCitations(liste_eov=liste_eov)
+
+
+# =============================================================================
+# CHAIN WRAPPER
+# =============================================================================
+
+def with_citation_verification(chain: Runnable, *, min_score: float = CITATION_MIN_SCORE,
+                               mode: str = CITATION_VERIFICATION_MODE) -> Runnable:
+    """
+    Check the citations returned by the EOV chain against the input text.
+
+    Runs locally after `chain`, without any LLM call.
+
+    Args:
+        chain (Runnable): Chain taking {"text": ...} and returning `EOVWithCitations`.
+
+    Returns:
+        Runnable: A runnable with the input schema of `chain` returning `VerifiedEOVWithCitations`.
+    """
+
+    def _verify(inputs: Dict[str, Any], result: EOVWithCitations) -> VerifiedEOVWithCitations:
+        return verify_citations(inputs["text"], result, min_score=min_score, mode=mode)
+
+    def _invoke(inputs: Dict[str, Any], config: RunnableConfig) -> VerifiedEOVWithCitations:
+        return _verify(inputs, chain.invoke(inputs, config))
+
+    async def _ainvoke(inputs: Dict[str, Any], config: RunnableConfig) -> VerifiedEOVWithCitations:
+        return _verify(inputs, await chain.ainvoke(inputs, config))
+
+    return RunnableLambda(_invoke, afunc=_ainvoke, name="verified_citations_eov").with_types(
+        input_type=chain.get_input_schema(),
+        output_type=VerifiedEOVWithCitations,
+    )
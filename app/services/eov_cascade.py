@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import os
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+
+from app.schemas.eov import EOVWithCitations
+from app.schemas.feedback import POSSIBLE_EOVS
+from app.services.citation_verifier import CITATION_MIN_SCORE, SourceIndex
+from app.services.eov_prefilter import EOVPrefilter
+from app.services.result_cache import chain_fingerprint
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+# Off by default: compare the answers of both tiers on reviewed documents first
+# (benchmarks/bench_eov_cascade.py)
+EOV_CASCADE_ENABLED = os.getenv("EOV_CASCADE_ENABLED", "false").lower() in ("1", "true", "yes")
+EOV_CASCADE_MODEL = os.getenv("EOV_CASCADE_MODEL", "gpt-4o-mini-2024-07-18")
+# Share of the small model's citations that must be found in the text
+EOV_CASCADE_MIN_CITED_RATIO = float(os.getenv("EOV_CASCADE_MIN_CITED_RATIO", 1.0))
+# Share of the EOVs named in the text (lexicon of the prefilter) the small model must return; 0 disables the check
+EOV_CASCADE_MIN_LEXICON_AGREEMENT = float(os.getenv("EOV_CASCADE_MIN_LEXICON_AGREEMENT", 0.5))
+
+SMALL_TIER = "small"
+LARGE_TIER = "large"
+
+# Run metadata key of a dict the cascade fills with the tier that answered
+CASCADE_REPORT = "eov_cascade"
+
+
+class CascadeCheck(NamedTuple):
+    # Escalation reasons, empty when the small model's answer is accepted
+    reasons: List[str]
+    cited_ratio: float
+    lexicon_agreement: float
+
+    @property
+    def accepted(self) -> bool:
+        return not self.reasons
+
+
+# =============================================================================
+# CASCADE
+# =============================================================================
+
+class EOVCascade:
+    """
+    Answer EOV requests with a small model first and escalate to the large one when needed.
+
+    The small model's answer is checked locally and kept when every EOV is in
+    POSSIBLE_EOVS, cited by a quote found in the text (at least `min_cited_ratio` of
+    the quotes overall) and when it returns at least `min_lexicon_agreement` of the
+    EOVs the prefilter lexicon finds in the text. Otherwise, or if the small model
+    fails, the large model answers. Both chains take {"text": ...} and return
+    `EOVWithCitations`.
+    """
+
+    def __init__(self, small_chain: Runnable, large_chain: Runnable, *, prompt: str,
+                 min_cited_ratio: float = EOV_CASCADE_MIN_CITED_RATIO,
+                 min_lexicon_agreement: float = EOV_CASCADE_MIN_LEXICON_AGREEMENT,
+                 citation_min_score: float = CITATION_MIN_SCORE):
+        self.small_chain = small_chain
+        self.large_chain = large_chain
+        self.min_cited_ratio = min_cited_ratio
+        self.min_lexicon_agreement = min_lexicon_agreement
+        self.citation_min_score = citation_min_score
+        self.prefilter = EOVPrefilter(prompt) if min_lexicon_agreement > 0 else None
+        self._allowed = set(POSSIBLE_EOVS)
+        # (tier, reason) -> answers, reason "accepted" for the small tier
+        self._counters: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def fingerprint(self, prompt: str, small_model: Any, large_model: Any) -> str:
+        """Cache fingerprint covering both models and the routing thresholds."""
+        parts = [
+            chain_fingerprint(prompt, small_model),
+            chain_fingerprint(prompt, large_model),
+            f"{self.min_cited_ratio}:{self.min_lexicon_agreement}:{self.citation_min_score}",
+        ]
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def check(self, text: str, result: EOVWithCitations) -> CascadeCheck:
+        """Decide whether the small model's answer can be returned as is."""
+        reasons = []
+        if any(item.eov not in self._allowed for item in result.liste_eov):
+            reasons.append("unknown_eov")
+
+        index = SourceIndex(text)
+        quotes = cited = 0
+        uncited = False
+        for item in result.liste_eov:
+            found = sum(index.locate_citation(c.citation_texte, self.citation_min_score) is not None
+                        for c in item.citation)
+            quotes += len(item.citation)
+            cited += found
+            uncited = uncited or not found
+        cited_ratio = cited / quotes if quotes else 1.0
+        if uncited:
+            reasons.append("uncited_eov")
+        if cited_ratio < self.min_cited_ratio:
+            reasons.append("citations")
+
+        agreement = 1.0
+        if self.prefilter is not None:
+            named = set(self.prefilter.lexicon_hits(text))
+            if named:
+                agreement = len(named & {item.eov for item in result.liste_eov}) / len(named)
+            if agreement < self.min_lexicon_agreement:
+                reasons.append("lexicon")
+        return CascadeCheck(reasons, round(cited_ratio, 3), round(agreement, 3))
+
+    def counters(self) -> Dict[Tuple[str, str], int]:
+        with self._lock:
+            return dict(self._counters)
+
+    def _record(self, tier: str, reasons: List[str], config: RunnableConfig) -> None:
+        reason = reasons[0] if reasons else "accepted"
+        with self._lock:
+            self._counters[(tier, reason)] = self._counters.get((tier, reason), 0) + 1
+        report = (config.get("metadata") or {}).get(CASCADE_REPORT)
+        if isinstance(report, dict):
+            # Long documents run the cascade once per chunk
+            report["calls"] = report.get("calls", 0) + 1
+            report["escalated"] = report.get("escalated", 0) + (tier == LARGE_TIER)
+            report["reasons"] = sorted(set(report.get("reasons", [])) | set(reasons))
+            report["tier"] = LARGE_TIER if report["escalated"] else SMALL_TIER
+
+    def _small_or_reasons(self, text: str, outcome: Any) -> Tuple[Optional[EOVWithCitations], List[str]]:
+        if isinstance(outcome, Exception):
+            return None, ["error"]
+        reasons = self.check(text, outcome).reasons
+        return (None if reasons else outcome), reasons
+
+    def as_runnable(self) -> Runnable:
+        """Runnable taking {"text": ...} and returning the answer of the tier that was kept."""
+
+        def _invoke(inputs: Dict[str, Any], config: RunnableConfig) -> EOVWithCitations:
+            try:
+                outcome = self.small_chain.invoke(inputs, config)
+            except Exception as e:
+                outcome = e
+            result, reasons = self._small_or_reasons(inputs["text"], outcome)
+            if result is None:
+                result = self.large_chain.invoke(inputs, config)
+            self._record(LARGE_TIER if reasons else SMALL_TIER, reasons, config)
+            return result
+
+        async def _ainvoke(inputs: Dict[str, Any], config: RunnableConfig) -> EOVWithCitations:
+            try:
+                outcome = await self.small_chain.ainvoke(inputs, config)
+            except Exception as e:
+                outcome = e
+            result, reasons = await asyncio.to_thread(self._small_or_reasons, inputs["text"], outcome)
+            if result is None:
+                result = await self.large_chain.ainvoke(inputs, config)
+            self._record(LARGE_TIER if reasons else SMALL_TIER, reasons, config)
+            return result
+
+        return RunnableLambda(_invoke, afunc=_ainvoke, name="eov_cascade").with_types(
+            input_type=self.large_chain.get_input_schema(),
+            output_type=EOVWithCitations,
+        )
@@ -0,0 +1,89 @@
+from typing import Any, Dict, List, Tuple
+
+from app.schemas.feedback import POSSIBLE_EOVS, UserFeedback_EOV
+
+# Position of each EOV in POSSIBLE_EOVS, used as its bit in the confusion masks
+EOV_INDEX = {eov: i for i, eov in enumerate(POSSIBLE_EOVS)}
+ALL_EOVS_MASK = (1 << len(POSSIBLE_EOVS)) - 1
+
+
+def confusion_masks(feedback: UserFeedback_EOV) -> Tuple[int, int, int, int]:
+    """
+    Compute the confusion matrix components of one EOV feedback as bitsets.
+
+    Bit i of each mask stands for POSSIBLE_EOVS[i]. A proposed EOV accepted with "yes"
+    is a true positive, rejected with "no" a false positive, a missing EOV a false
+    negative, and every other possible EOV a true negative. EOVs outside
+    POSSIBLE_EOVS are ignored.
+
+    Returns:
+        tuple[int, int, int, int]: True positive, false positive, false negative and true negative masks.
+    """
+    tp = fp = fn = 0
+    for item in feedback.feedback:
+        index = EOV_INDEX.get(item.eov)
+        if index is None:
+            continue
+        answer = item.accept.lower()
+        if answer == "yes":
+            tp |= 1 << index
+        elif answer == "no":
+            fp |= 1 << index
+    for item in feedback.missing_eovs:
+        index = EOV_INDEX.get(item.eov)
+        if index is not None:
+            fn |= 1 << index
+    tn = ALL_EOVS_MASK & ~(tp | fp | fn)
+    return tp, fp, fn, tn
+
+
+def mask_count(mask: int) -> int:
+    return bin(mask).count("1")
+
+
+def mask_to_eovs(mask: int) -> List[str]:
+    """List the EOVs set in a mask, in POSSIBLE_EOVS order."""
+    return [eov for i, eov in enumerate(POSSIBLE_EOVS) if mask >> i & 1]
+
+
+def precision_recall_f1(tp: int, fp: int, fn: int) -> Tuple[float, float, float]:
+    precision = tp / (tp + fp) if (tp + fp) > 0 else 0
+    recall = tp / (tp + fn) if (tp + fn) > 0 else 0
+    f1_score = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
+    return precision, recall, f1_score
+
+
+def evaluate_eov_feedback(feedback: UserFeedback_EOV) -> Dict[str, Any]:
+    """
+    Evaluate one EOV feedback in memory.
+
+    Args:
+        feedback (UserFeedback_EOV): Feedback on the EOVs proposed for one file.
+
+    Returns:
+        dict: The four confusion components (lists of EOV names), "precision",
+        "recall", "f1_score", and "table", one row per possible EOV with the same
+        columns as the evaluation table logged to MLflow.
+    """
+    tp, fp, fn, tn = confusion_masks(feedback)
+    precision, recall, f1_score = precision_recall_f1(mask_count(tp), mask_count(fp), mask_count(fn))
+    table = [
+        {
+            "EOV Name": eov,
+            "True Positive": bool(tp >> i & 1),
+            "False Positive": bool(fp >> i & 1),
+            "True Negative": bool(tn >> i & 1),
+            "False Negative": bool(fn >> i & 1),
+        }
+        for i, eov in enumerate(POSSIBLE_EOVS)
+    ]
+    return {
+        "true_positives": mask_to_eovs(tp),
+        "false_positives": mask_to_eovs(fp),
+        "false_negatives": mask_to_eovs(fn),
+        "true_negatives": mask_to_eovs(tn),
+        "precision": precision,
+        "recall": recall,
+        "f1_score": f1_score,
+        "table": table,
+    }
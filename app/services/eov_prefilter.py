@@ -0,0 +1,431 @@
+import json
+import math
+import os
+import re
+import time
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, Iterable, List, NamedTuple, Sequence, Tuple
+
+from langchain_core.callbacks.manager import dispatch_custom_event
+from langchain_core.prompt_values import ChatPromptValue
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+
+from app.schemas.feedback import POSSIBLE_EOVS
+from app.utils.tokens import estimate_tokens
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+# Off by default: check the recall on reviewed documents first (benchmarks/bench_eov_prefilter.py)
+EOV_PREFILTER_ENABLED = os.getenv("EOV_PREFILTER_ENABLED", "false").lower() in ("1", "true", "yes")
+# Number of EOV definitions kept in the prompt (every EOV named in the text is kept as well)
+EOV_PREFILTER_TOP_K = int(os.getenv("EOV_PREFILTER_TOP_K", 10))
+
+# Name of the custom LangChain event carrying the prompt reduction report
+PREFILTER_REPORT_EVENT = "eov_prefilter_report"
+
+OTHER_EOV = "Autre"
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+# A lexicon hit outweighs any BM25 score (which is normalized to 0-1)
+LEXICON_WEIGHT = 2.0
+
+
+# =============================================================================
+# BILINGUAL LEXICON
+# =============================================================================
+
+# Terms naming each EOV in French and English, lower case without accents. A term matches
+# at the start of a word, so "temperature" also matches "temperatures"; terms of up to
+# SHORT_TERM_LENGTH characters only match whole words.
+SHORT_TERM_LENGTH = 4
+EOV_LEXICON: Dict[str, List[str]] = {
+    "État de la mer": ["etat de la mer", "sea state", "vague", "houle", "wave height", "waves", "swell",
+                       "hauteur significative", "significant wave"],
+    "Contraintes sur la surface océanique": ["contrainte", "tension de surface du vent", "surface stress",
+                                             "wind stress", "tension du vent"],
+    "Glace de mer": ["glace de mer", "sea ice", "banquise", "couvert de glace", "ice cover", "glaces marines"],
+    "Niveau marin": ["niveau marin", "niveau de la mer", "niveau d'eau", "sea level", "water level", "maregraph",
+                     "tide gauge", "maree", "tidal"],
+    "Température de surface": ["temperature de surface", "temperature de l'eau de surface", "sea surface temperature",
+                               "surface temperature", "sst"],
+    "Température sous la surface": ["temperature", "thermocline", "ctd", "couche intermediaire froide",
+                                    "subsurface temperature", "profil de temperature"],
+    "Courants de surface": ["courant de surface", "courants de surface", "surface current", "derive", "drifter",
+                            "radar hf", "hf radar"],
+    "Courants sous la surface": ["courant", "current", "adcp", "circulation", "courantometre"],
+    "Salinité sous la surface": ["salinite", "salinity", "salin", "conductivite", "conductivity", "psu"],
+    "Flux de chaleur océanique de surface": ["flux de chaleur", "heat flux", "echange de chaleur",
+                                             "bilan thermique", "air-sea flux", "flux air-mer"],
+    "Oxygène": ["oxygene", "oxygen", "hypoxi", "anoxi", "o2 dissous", "dissolved o2"],
+    "Nutriments": ["nutriment", "nutrient", "nitrate", "nitrite", "phosphate", "silicate", "sels nutritifs",
+                   "ammonium"],
+    "Carbone inorganique": ["carbone inorganique", "inorganic carbon", "dic", "alcalinite", "alkalinity",
+                            "pco2", "acidification", "ph de l'eau", "carbonate"],
+    "Traceurs transitoires": ["traceur", "tracer", "cfc", "chlorofluorocarbon", "sf6", "tritium", "radiocarbon"],
+    "Matière particulaire": ["matiere particulaire", "particulate", "particules en suspension",
+                             "matiere en suspension", "suspended particulate", "poc", "turbidite", "turbidity"],
+    "Isotopes stables du carbone": ["isotope", "delta13c", "d13c", "13c"],
+    "Carbone organique dissous": ["carbone organique dissous", "dissolved organic carbon", "doc",
+                                  "matiere organique dissoute", "dissolved organic matter", "cdom"],
+    "Biomasse et diversité phytoplanctonique": ["phytoplancton", "phytoplankton", "chlorophyll", "diatom",
+                                                "dinoflagell", "algues toxiques", "floraison", "bloom"],
+    "Biomasse et diversité zooplanctonique": ["zooplancton", "zooplankton", "copepod", "krill", "calanus",
+                                              "larves", "larvae", "ichthyoplancton"],
+    "Abondance et distribution de tortues, oiseaux et mammifères marins": [
+        "tortue", "turtle", "oiseau", "seabird", "sea bird", "mammifere", "mammal", "baleine", "whale", "phoque",
+        "seal", "beluga", "dauphin", "dolphin", "marsouin", "porpoise", "cetace", "cetacean", "pinniped"],
+    "Composition et couverture des coraux durs": ["corail", "coraux", "coral", "recif", "reef"],
+    "Composition et couverture des herbiers marins": ["herbier", "zostere", "zostera", "seagrass", "eelgrass"],
+    "Composition et couverture de la canopée de macroalgues": ["macroalgue", "macroalgae", "kelp", "laminaire",
+                                                               "varech", "fucus", "algues brunes", "seaweed"],
+    "Biomasse et diversité microbienne": ["microbien", "microbial", "bacteri", "microbiome", "virus",
+                                          "archae", "metagenom"],
+    "Abondance et distribution des invertébrés": ["invertebre", "invertebrate", "benthos", "benthique",
+                                                  "crabe", "crab", "homard", "lobster", "crevette", "shrimp",
+                                                  "oursin", "urchin", "moule", "mussel", "petoncle", "scallop"],
+    "Couleur des océans": ["couleur de l'ocean", "couleur des oceans", "ocean colour", "ocean color",
+                           "reflectance", "teledetection", "remote sensing", "modis", "sentinel-3"],
+    "Débris marins": ["debris", "dechet", "plastique", "plastic", "microplast", "litter", "engins fantomes",
+                      "ghost gear"],
+    "Paysage acoustique des océans": ["acoustique", "acoustic", "hydrophone", "bruit sous-marin",
+                                      "underwater noise", "soundscape", "sonar", "bruit ambiant", "ambient noise"],
+    "Salinité de surface": ["salinite de surface", "sea surface salinity", "surface salinity", "sss"],
+    "Pression au fond de l'océan": ["pression au fond", "bottom pressure", "ocean bottom pressure"],
+    "Protoxyde d'azote": ["protoxyde d'azote", "oxyde nitreux", "nitrous oxide", "n2o"],
+    "Abondance et diversité de poissons": ["poisson", "fish", "morue", "cod", "hareng", "herring", "capelan",
+                                           "capelin", "maquereau", "mackerel", "sebaste", "redfish", "fletan",
+                                           "halibut"],
+    "Mangrove cover and composition": ["mangrove"],
+}
+
+# EOVs of POSSIBLE_EOVS without a definition in the system prompt: name -> (prompt category, definition).
+# They are added to the candidates so a reduced prompt can offer them.
+EXTRA_EOV_DEFINITIONS: Dict[str, Tuple[str, str]] = {
+    "Salinité de surface": (
+        "'Physics' / 'Physique'",
+        "Salinity of the upper ocean layer, measured in situ (ships, floats, drifters, moorings) or by "
+        "satellite. It tracks the freshwater exchanges between the ocean and the atmosphere, river runoff "
+        "and sea ice melt.",
+    ),
+    "Pression au fond de l'océan": (
+        "'Physics' / 'Physique'",
+        "Pressure exerted on the sea floor by the water column and the atmosphere, measured by bottom pressure "
+        "recorders or derived from satellite gravimetry. It reflects changes in ocean mass, deep currents and "
+        "sea level.",
+    ),
+    "Protoxyde d'azote": (
+        "'Biochemistry' / 'Biogéochimie'",
+        "Dissolved concentration and air-sea flux of nitrous oxide (N2O), a greenhouse gas produced by "
+        "nitrification and denitrification. It is linked to oxygen depletion and nutrient cycling.",
+    ),
+    "Abondance et diversité de poissons": (
+        "'Biology and Ecosystems' / 'Biologie et écosystèmes'",
+        "Abundance, biomass, distribution, size and species composition of fish populations, from scientific "
+        "surveys, fisheries data, acoustics or environmental DNA. It informs stock assessments and the state "
+        "of marine ecosystems.",
+    ),
+    "Mangrove cover and composition": (
+        "'Biology and Ecosystems' / 'Biologie et écosystèmes'",
+        "Area, extent and species composition of mangrove forests, mapped by remote sensing and field surveys. "
+        "Mangroves protect coastlines and store carbon.",
+    ),
+}
+
+_STOPWORDS = frozenset("""
+a an and are as at be been but by can for from has have in into is it its of on or such that the their them
+these this to was were which with also are more most other some than then there they through used using
+au aux avec ce ces dans de des du elle en est et il ils la le les leur mais ne ou par pas pour qui que sa se
+ses son sont sur un une
+""".split())
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _fold(text: str) -> str:
+    # Dropping non-ASCII after NFKD removes the accents (and symbols, irrelevant here)
+    text = unicodedata.normalize("NFKD", text.lower().replace("’", "'"))
+    return text.encode("ascii", "ignore").decode("ascii")
+
+
+def _terms(text: str) -> List[str]:
+    return [w for w in _WORD.findall(_fold(text)) if len(w) > 2 and w not in _STOPWORDS]
+
+
+# =============================================================================
+# PROMPT PARSING
+# =============================================================================
+
+_CATEGORY = re.compile(r"^ {8}\d+\. (.+)\n", re.M)
+_ENTRY = re.compile(r"^ {16}- '([^']+)' : (.*)$", re.M)
+_FOOTER = re.compile(r"^ {4}\n {4}- \*\*raisons\*\*", re.M)
+
+
+class EOVDefinition(NamedTuple):
+    name: str
+    category: str
+    definition: str
+    # Exact prompt text of the entry, reused verbatim in reduced prompts
+    block: str
+
+
+def parse_eov_prompt(prompt: str) -> Tuple[str, List[EOVDefinition], str]:
+    """
+    Split the EOV system prompt into its header, EOV definitions and footer.
+
+    Returns:
+        tuple: (header, definitions in prompt order, footer).
+    """
+    categories = list(_CATEGORY.finditer(prompt))
+    footer = _FOOTER.search(prompt)
+    if not categories or footer is None:
+        raise ValueError("Unrecognized EOV prompt layout")
+    definitions = []
+    for i, category in enumerate(categories):
+        end = categories[i + 1].start() if i + 1 < len(categories) else footer.start()
+        section = prompt[category.end():end]
+        entries = list(_ENTRY.finditer(section))
+        for j, entry in enumerate(entries):
+            block = section[entry.start():entries[j + 1].start() if j + 1 < len(entries) else len(section)]
+            definitions.append(EOVDefinition(entry.group(1), category.group(1), entry.group(2), block))
+    return prompt[:categories[0].start()], definitions, prompt[footer.start():]
+
+
+def add_missing_definitions(definitions: List[EOVDefinition], names: Sequence[str] = POSSIBLE_EOVS,
+                            extra: Dict[str, Tuple[str, str]] = EXTRA_EOV_DEFINITIONS) -> List[EOVDefinition]:
+    """
+    Add the EOVs of `names` missing from the prompt definitions, from `extra`.
+
+    Each one goes into its category, before the next EOV of `names` in that category
+    (or before the last EOV of the category), so grouped prompts stay well formed.
+    """
+    definitions = list(definitions)
+    parsed = {d.name for d in definitions}
+    for i, name in enumerate(names):
+        if name in parsed:
+            continue
+        if name not in extra:
+            raise ValueError(f"No definition for the EOV '{name}'")
+        category, definition = extra[name]
+        same = [j for j, d in enumerate(definitions) if d.category == category]
+        if not same:
+            raise ValueError(f"Unknown category {category} for the EOV '{name}'")
+        later = [j for j in same if definitions[j].name in names[i + 1:]]
+        block = f"{' ' * 16}- '{name}' : {definition}\n{' ' * 16}\n"
+        definitions.insert(later[0] if later else same[-1], EOVDefinition(name, category, definition, block))
+    return definitions
+
+
+# =============================================================================
+# CANDIDATE RETRIEVAL
+# =============================================================================
+
+class EOVSelection(NamedTuple):
+    candidates: List[str]
+    scores: Dict[str, float]
+    fallback: bool
+    prompt: str
+
+
+class EOVPrefilter:
+    """
+    Rank the EOVs of POSSIBLE_EOVS against a document and build a reduced prompt.
+
+    The EOVs the system prompt does not define use EXTRA_EOV_DEFINITIONS. Scores combine lexicon hits (EOV names and common terms in French and English)
+    with BM25 over the definitions. The reduced prompt keeps the top-k EOVs, every EOV
+    whose lexicon matched, and 'Autre'. When nothing in the lexicon matches, the system
+    prompt is used unchanged.
+    """
+
+    def __init__(self, prompt: str, lexicon: Dict[str, List[str]] = EOV_LEXICON, top_k: int = EOV_PREFILTER_TOP_K):
+        self.prompt = prompt
+        self.top_k = top_k
+        self.header, definitions, self.footer = parse_eov_prompt(prompt)
+        self.definitions = add_missing_definitions(definitions)
+        self.names = [d.name for d in self.definitions if d.name != OTHER_EOV]
+
+        # One alternation scanned once per document; each term maps back to its EOVs
+        self._term_eovs: Dict[str, List[str]] = {}
+        for d in self.definitions:
+            if d.name == OTHER_EOV:
+                continue
+            for term in dict.fromkeys([_fold(d.name)] + lexicon.get(d.name, [])):
+                self._term_eovs.setdefault(term, []).append(d.name)
+        # Acronyms and short terms must match whole words ("doc" is not "document")
+        alternation = "|".join(
+            re.escape(t) + ("(?![a-z0-9])" if len(t) <= SHORT_TERM_LENGTH else "")
+            for t in sorted(self._term_eovs, key=len, reverse=True)
+        )
+        self._lexicon = re.compile(rf"(?<![a-z0-9])(?:{alternation})")
+
+        # BM25 index: one document per EOV (name, definition and lexicon)
+        docs = {d.name: Counter(_terms(" ".join([d.name, d.definition] + lexicon.get(d.name, []))))
+                for d in self.definitions if d.name != OTHER_EOV}
+        self._doc_terms = docs
+        self._doc_length = {name: sum(tf.values()) for name, tf in docs.items()}
+        self._avg_length = sum(self._doc_length.values()) / max(len(docs), 1)
+        document_frequency = Counter(term for tf in docs.values() for term in tf)
+        n = len(docs)
+        self._idf = {t: math.log(1 + (n - df + 0.5) / (df + 0.5)) for t, df in document_frequency.items()}
+
+    def lexicon_hits(self, text: str) -> Counter:
+        hits: Counter = Counter()
+        for match in self._lexicon.finditer(_fold(text)):
+            for name in self._term_eovs[match.group()]:
+                hits[name] += 1
+        return hits
+
+    def bm25(self, text: str) -> Dict[str, float]:
+        # The document is the query; each distinct term counts once so long texts are not favoured
+        query = set(_terms(text)) & self._idf.keys()
+        scores = {}
+        for name, tf in self._doc_terms.items():
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_length[name] / self._avg_length)
+            scores[name] = sum(self._idf[t] * tf[t] * (BM25_K1 + 1) / (tf[t] + norm) for t in query if t in tf)
+        return scores
+
+    def build_prompt(self, names: Iterable[str]) -> str:
+        """Return the system prompt restricted to `names` (and 'Autre'), in prompt order."""
+        keep = set(names) | {OTHER_EOV}
+        parts, category, number = [self.header], None, 0
+        for d in self.definitions:
+            if d.name not in keep:
+                continue
+            if d.category != category:
+                category, number = d.category, number + 1
+                parts.append(f"        {number}. {category}\n")
+            parts.append(d.block)
+        parts.append(self.footer)
+        return "".join(parts)
+
+    def select(self, text: str, top_k: int = None) -> EOVSelection:
+        """
+        Choose the candidate EOVs for a document.
+
+        Args:
+            text (str): Document text.
+            top_k (int, optional): Overrides the number of definitions kept.
+
+        Returns:
+            EOVSelection: Candidates, their scores, whether the full prompt is used and the prompt.
+        """
+        top_k = self.top_k if top_k is None else top_k
+        hits = self.lexicon_hits(text)
+        bm25 = self.bm25(text)
+        best = max(bm25.values(), default=0) or 1.0
+        scores = {name: LEXICON_WEIGHT * min(hits[name], 3) + bm25[name] / best for name in self.names}
+
+        ranked = sorted((name for name in self.names if scores[name] > 0), key=lambda name: -scores[name])
+        candidates = [name for name in ranked if hits[name]]
+        candidates += [name for name in ranked if not hits[name]][:max(top_k - len(candidates), 0)]
+
+        fallback = not hits or len(candidates) >= len(self.names)
+        prompt = self.prompt if fallback else self.build_prompt(candidates)
+        return EOVSelection(self.names if fallback else candidates, scores, fallback, prompt)
+
+    def report(self, selection: EOVSelection) -> Dict[str, Any]:
+        full = estimate_tokens(self.prompt)
+        reduced = estimate_tokens(selection.prompt)
+        return {
+            "candidates": selection.candidates,
+            "fallback": selection.fallback,
+            "prompt_tokens_full": full,
+            "prompt_tokens": reduced,
+            "tokens_saved": full - reduced,
+        }
+
+
+# =============================================================================
+# EVALUATION
+# =============================================================================
+
+def evaluate_prefilter(prefilter: EOVPrefilter, samples: Sequence[Tuple[str, Iterable[str]]],
+                       top_k: int = None) -> Dict[str, Any]:
+    """
+    Measure how many reviewed EOVs the candidate stage keeps, and the prompt tokens saved.
+
+    Args:
+        prefilter (EOVPrefilter): Prefilter to evaluate.
+        samples: (document text, EOVs confirmed by a reviewer) pairs. 'Autre' and EOVs
+            missing from POSSIBLE_EOVS are ignored.
+        top_k (int, optional): Overrides the number of definitions kept.
+
+    Returns:
+        dict: EOV recall, share of documents keeping all their EOVs, fallback rate,
+        mean prompt tokens before/after and mean selection time in milliseconds.
+    """
+    known = set(prefilter.names)
+    found = expected = complete = fallbacks = 0
+    tokens_full = tokens = 0
+    seconds = 0.0
+    for text, eovs in samples:
+        start = time.perf_counter()
+        selection = prefilter.select(text, top_k)
+        seconds += time.perf_counter() - start
+        truth = set(eovs) & known
+        kept = truth & set(selection.candidates)
+        found += len(kept)
+        expected += len(truth)
+        complete += kept == truth
+        fallbacks += selection.fallback
+        report = prefilter.report(selection)
+        tokens_full += report["prompt_tokens_full"]
+        tokens += report["prompt_tokens"]
+    count = max(len(samples), 1)
+    return {
+        "documents": len(samples),
+        "recall": found / expected if expected else 1.0,
+        "documents_with_full_recall": complete / count,
+        "fallback_rate": fallbacks / count,
+        "mean_prompt_tokens_full": tokens_full / count,
+        "mean_prompt_tokens": tokens / count,
+        "mean_tokens_saved": (tokens_full - tokens) / count,
+        "mean_selection_ms": seconds / count * 1000,
+    }
+
+
+# =============================================================================
+# CHAIN STAGE
+# =============================================================================
+
+def prefilter_settings(enabled: bool = EOV_PREFILTER_ENABLED, top_k: int = EOV_PREFILTER_TOP_K,
+                       lexicon: Dict[str, List[str]] = EOV_LEXICON) -> str:
+    """
+    Everything about the prefilter that changes the prompt the model receives, to add to
+    the chain fingerprint. Empty when the prefilter is disabled, so the fingerprint of the
+    full prompt does not change.
+    """
+    if not enabled:
+        return ""
+    return json.dumps({"top_k": top_k, "lexicon_weight": LEXICON_WEIGHT, "bm25": [BM25_K1, BM25_B],
+                       "short_term_length": SHORT_TERM_LENGTH, "lexicon": lexicon,
+                       "definitions": EXTRA_EOV_DEFINITIONS},
+                      sort_keys=True, ensure_ascii=False)
+
+
+def eov_prompt_with_prefilter(prompt: str, top_k: int = EOV_PREFILTER_TOP_K) -> Runnable:
+    """
+    Prompt stage replacing the EOV ChatPromptTemplate with a per-document reduced prompt.
+
+    The reduction is dispatched as the `eov_prefilter_report` custom event.
+
+    Args:
+        prompt (str): Full EOV system prompt.
+        top_k (int): Number of EOV definitions kept.
+
+    Returns:
+        Runnable: Takes {"text": ...} and returns the chat messages for the model.
+    """
+    prefilter = EOVPrefilter(prompt, top_k=top_k)
+
+    def _prompt(inputs: Dict[str, Any], config: RunnableConfig) -> ChatPromptValue:
+        selection = prefilter.select(inputs["text"])
+        dispatch_custom_event(PREFILTER_REPORT_EVENT, prefilter.report(selection), config=config)
+        return ChatPromptValue(messages=[SystemMessage(content=selection.prompt), HumanMessage(content=inputs["text"])])
+
+    return RunnableLambda(_prompt, name="eov_prefilter_prompt")
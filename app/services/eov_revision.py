@@ -0,0 +1,144 @@
+import os
+import re
+import time
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from app.schemas.eov import Citation, EOVWithCitations, EOVWithReason
+from app.services.citation_verifier import CITATION_MIN_SCORE, SourceIndex
+from app.services.long_document import merge_eov_results
+from app.services.result_cache import normalize_text
+from app.utils.tokens import estimate_tokens
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+# Above this share of changed characters, the whole revision is sent to the chain instead
+EOV_REVISION_MAX_CHANGED_RATIO = float(os.getenv("EOV_REVISION_MAX_CHANGED_RATIO", 0.5))
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+
+class SectionDiff(NamedTuple):
+    sections: List[str]
+    # Sections of the new text that were changed or added, in document order
+    changed: List[str]
+    removed: int
+
+
+# =============================================================================
+# DIFF
+# =============================================================================
+
+def split_sections(text: str, by_lines: Optional[bool] = None) -> List[str]:
+    """Split a document into paragraphs (lines when it has no blank lines), without empty ones."""
+    if by_lines is None:
+        by_lines = not _PARAGRAPH_BREAK.search(text)
+    sections = text.splitlines() if by_lines else _PARAGRAPH_BREAK.split(text)
+    return [section.strip() for section in sections if section.strip()]
+
+
+def diff_sections(previous_text: str, text: str) -> SectionDiff:
+    """
+    Compare two revisions section by section.
+
+    Sections are compared once whitespace is collapsed, so reflowed paragraphs are
+    not counted as changes. Both revisions are split by lines unless both have
+    paragraphs.
+    """
+    by_lines = not (_PARAGRAPH_BREAK.search(previous_text) and _PARAGRAPH_BREAK.search(text))
+    previous = split_sections(previous_text, by_lines)
+    sections = split_sections(text, by_lines)
+    matcher = SequenceMatcher(None, [normalize_text(s) for s in previous], [normalize_text(s) for s in sections],
+                              autojunk=False)
+    changed, removed = [], 0
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag in ("replace", "insert"):
+            changed.extend(sections[j1:j2])
+        if tag in ("replace", "delete"):
+            removed += i2 - i1
+    return SectionDiff(sections, changed, removed)
+
+
+# =============================================================================
+# CITATIONS
+# =============================================================================
+
+def keep_surviving_citations(previous_eov: EOVWithCitations, text: str,
+                             min_score: float = CITATION_MIN_SCORE) -> Tuple[EOVWithCitations, int]:
+    """
+    Drop the citations of a previous result that are no longer in the revised text.
+
+    An EOV whose citations were all removed is dropped with them: its evidence was
+    deleted, and the changed sections are extracted again anyway. EOVs that had no
+    citation are kept.
+
+    Returns:
+        tuple[EOVWithCitations, int]: The pruned result and the number of citations dropped.
+    """
+    index = SourceIndex(text)
+    liste_eov, dropped = [], 0
+    for item in previous_eov.liste_eov:
+        citations = [Citation(citation_texte=c.citation_texte) for c in item.citation
+                     if index.locate_citation(c.citation_texte, min_score) is not None]
+        dropped += len(item.citation) - len(citations)
+        if citations or not item.citation:
+            liste_eov.append(EOVWithReason(eov=item.eov, raison=item.raison, citation=citations))
+    return EOVWithCitations(liste_eov=liste_eov), dropped
+
+
+# =============================================================================
+# RE-EXTRACTION
+# =============================================================================
+
+async def reextract_eov(text: str, previous_text: str, previous_eov: EOVWithCitations, eov_chain: Runnable,
+                        config: Optional[RunnableConfig] = None,
+                        max_changed_ratio: float = EOV_REVISION_MAX_CHANGED_RATIO) -> Tuple[EOVWithCitations, Dict[str, Any]]:
+    """
+    Update the EOVs of a previous revision by running the chain on the changed sections only.
+
+    The citations of `previous_eov` still found in `text` are kept, the changed and
+    added sections are sent to `eov_chain` in one call and both results are merged.
+    Unchanged revisions make no call; when more than `max_changed_ratio` of the text
+    changed, the whole revision is sent instead.
+
+    Args:
+        text (str): The new revision.
+        previous_text (str): The revision `previous_eov` was extracted from.
+        previous_eov (EOVWithCitations): EOVs of the previous revision.
+        eov_chain (Runnable): Chain taking {"text": ...} and returning `EOVWithCitations`.
+        config (RunnableConfig, optional): Config passed to the chain.
+
+    Returns:
+        tuple[EOVWithCitations, dict]: Merged EOVs (citations not yet located) and a
+        report of the sections and estimated tokens sent.
+    """
+    start = time.perf_counter()
+    diff = diff_sections(previous_text, text)
+    changed_text = "\n\n".join(diff.changed)
+    document_chars = sum(len(section) for section in diff.sections)
+    full_run = len(changed_text) > max_changed_ratio * document_chars
+
+    kept, dropped = keep_surviving_citations(previous_eov, text)
+    if full_run:
+        result = await eov_chain.ainvoke({"text": text}, config)
+    elif changed_text:
+        result = merge_eov_results([kept, await eov_chain.ainvoke({"text": changed_text}, config)])
+    else:
+        result = kept
+
+    report = {
+        "sections": len(diff.sections),
+        "changed_sections": len(diff.changed),
+        "removed_sections": diff.removed,
+        "citations_dropped": dropped,
+        "full_run": full_run,
+        "estimated_tokens_document": estimate_tokens(text),
+        "estimated_tokens_sent": estimate_tokens(text if full_run else changed_text),
+        "seconds": round(time.perf_counter() - start, 3),
+    }
+    return result, report
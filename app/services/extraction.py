@@ -0,0 +1,148 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from app.services.metadata_transform import transform_metadata_to_full
+from app.services.eov_cascade import CASCADE_REPORT
+from app.services.near_duplicates import NEAR_DUPLICATE_REPORT
+
+
+async def _timed(name: str, chain: Runnable, text: str, config: Optional[RunnableConfig]) -> Tuple[str, Any, float]:
+    start = time.perf_counter()
+    result = await chain.ainvoke({"text": text}, config)
+    return name, result, round(time.perf_counter() - start, 3)
+
+
+async def _timed_or_error(name: str, chain: Runnable, text: str, config: Optional[RunnableConfig]) -> Tuple[str, Any, float]:
+    start = time.perf_counter()
+    try:
+        return await _timed(name, chain, text, config)
+    except Exception as e:
+        return name, e, round(time.perf_counter() - start, 3)
+
+
+def _timed_sync(chain: Runnable, text: str, config: Optional[RunnableConfig]) -> Tuple[Any, float]:
+    start = time.perf_counter()
+    result = chain.invoke({"text": text}, config)
+    return result, round(time.perf_counter() - start, 3)
+
+
+def _with_reports(config: Optional[RunnableConfig]) -> Tuple[RunnableConfig, Dict[str, Any], Dict[str, Any]]:
+    # Filled by the near-duplicate wrappers and the EOV cascade (the metadata dict is copied, not its values)
+    near_duplicates: Dict[str, Any] = {}
+    cascade: Dict[str, Any] = {}
+    config = {**(config or {})}
+    config["metadata"] = {**(config.get("metadata") or {}), NEAR_DUPLICATE_REPORT: near_duplicates,
+                          CASCADE_REPORT: cascade}
+    return config, near_duplicates, cascade
+
+
+def _extraction_result(metadata, eov, metadata_seconds: float, eov_seconds: float, start: float,
+                       near_duplicates: Dict[str, Any], cascade: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "metadata": metadata,
+        "full_metadata": transform_metadata_to_full(metadata),
+        "eov": eov,
+        "timings": {
+            "metadata": metadata_seconds,
+            "eov": eov_seconds,
+            "total": round(time.perf_counter() - start, 3),
+        },
+        "near_duplicates": near_duplicates,
+        "eov_cascade": cascade or None,
+    }
+
+
+def metadata_payload(metadata) -> Dict[str, Any]:
+    """Serialize a `MetadataSchemaCIOOS` with its full JSON schema for an event stream."""
+    return {
+        "metadata": metadata.model_dump(),
+        "full_metadata": transform_metadata_to_full(metadata).model_dump(),
+    }
+
+
+async def extract_document(text: str, metadata_chain: Runnable, eov_chain: Runnable,
+                           config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+    """
+    Run the metadata and EOV chains concurrently on one document. If one chain fails,
+    the other is cancelled and the error is raised.
+
+    Args:
+        text (str): Document text, sent once to both chains.
+        metadata_chain (Runnable): Chain returning a `MetadataSchemaCIOOS`.
+        eov_chain (Runnable): Chain returning an `EOVWithCitations`.
+        config (RunnableConfig, optional): Config passed to both chains.
+
+    Returns:
+        dict: Metadata, its full JSON schema, EOVs, per-chain timings in seconds, the
+        near-duplicate documents whose results were reused, by chain, and the tier of the
+        EOV model cascade that answered (None when it did not run).
+    """
+    start = time.perf_counter()
+    config, near_duplicates, cascade = _with_reports(config)
+    tasks = [
+        asyncio.ensure_future(_timed("metadata", metadata_chain, text, config)),
+        asyncio.ensure_future(_timed("eov", eov_chain, text, config)),
+    ]
+    try:
+        (_, metadata, metadata_seconds), (_, eov, eov_seconds) = await asyncio.gather(*tasks)
+    finally:
+        # When one chain fails (or the request is cancelled), stop the other instead of
+        # letting it spend tokens on a result nobody will receive
+        for task in tasks:
+            task.cancel()
+    return _extraction_result(metadata, eov, metadata_seconds, eov_seconds, start, near_duplicates, cascade)
+
+
+def extract_document_sync(text: str, metadata_chain: Runnable, eov_chain: Runnable,
+                          config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+    """
+    Same as `extract_document`, for worker threads: the chains' synchronous `invoke`
+    runs in two threads instead of `asyncio.run`, which would use the async OpenAI
+    clients and rate controller waiters of the shared models from a new event loop
+    on every call. A synchronous call cannot be interrupted: if one chain fails, the
+    other still runs to completion before the error is raised.
+    """
+    start = time.perf_counter()
+    config, near_duplicates, cascade = _with_reports(config)
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="extraction") as executor:
+        metadata_future = executor.submit(_timed_sync, metadata_chain, text, config)
+        eov_future = executor.submit(_timed_sync, eov_chain, text, config)
+        metadata, metadata_seconds = metadata_future.result()
+        eov, eov_seconds = eov_future.result()
+    return _extraction_result(metadata, eov, metadata_seconds, eov_seconds, start, near_duplicates, cascade)
+
+
+async def stream_extraction(text: str, metadata_chain: Runnable, eov_chain: Runnable,
+                            config: Optional[RunnableConfig] = None) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Same as `extract_document`, but yield each half as soon as its chain finishes.
+
+    Yields:
+        tuple[str, dict]: ("metadata" | "eov" | "error", payload), then ("end", timings).
+    """
+    start = time.perf_counter()
+    tasks = [
+        asyncio.ensure_future(_timed_or_error("metadata", metadata_chain, text, config)),
+        asyncio.ensure_future(_timed_or_error("eov", eov_chain, text, config)),
+    ]
+    timings = {}
+    try:
+        for future in asyncio.as_completed(tasks):
+            name, result, seconds = await future
+            if isinstance(result, Exception):
+                yield "error", {"part": name, "detail": str(result)}
+                continue
+            timings[name] = seconds
+            if name == "metadata":
+                yield "metadata", {**metadata_payload(result), "seconds": seconds}
+            else:
+                yield "eov", {"eov": result.model_dump(), "seconds": seconds}
+    finally:
+        for task in tasks:
+            task.cancel()
+    timings["total"] = round(time.perf_counter() - start, 3)
+    yield "end", {"timings": timings}
@@ -0,0 +1,253 @@
+# Import necessary libraries
+from datetime import datetime
+
+# Core schemas and services
+from app.schemas.feedback import UserFeedback_EOV, POSSIBLE_EOVS, MetadataFeedback, BulkFeedback
+from app.services.eov_evaluator import evaluate_eov_feedback
+from app.services.bulk_feedback import eov_feedback_matrices, bulk_eov_metrics, bulk_metadata_acceptance
+from app.services.tracking import batched_run
+from app.services.feedback_queue import current_item_key
+from app.services.model_registry import chain_model_registry, chain_version
+from app.core.chain_setup_eov import prompt_eov_v1, model_eov
+from app.core.chain_setup_metadata import prompt_MetadataSchemaCIOOS_v1, model
+
+# Utilities
+from app.utils.helpers import evaluate_keyword_feedback
+
+
+# Chain modules logged as models-from-code
+EOV_CHAIN_PATH = "./app/core/chain_setup_eov.py"
+METADATA_CHAIN_PATH = "./app/core/chain_setup_metadata.py"
+
+
+def _log_chain_reference(chain_name: str, chain_path: str, prompt: str, model) -> dict:
+    """
+    Make sure this version of the chain is logged once and return the tags pointing to it.
+    Must be called before the feedback run starts.
+    """
+    version = chain_version(chain_path, prompt, model)
+    model_uri = chain_model_registry.model_uri(chain_name, chain_path, version)
+    return {"chain_name": chain_name, "chain_version": version, "langchain_model_uri": model_uri}
+
+
+# Function to log user EOV feedback to MLflow
+def log_eov_feedback(feedback: UserFeedback_EOV) -> None:
+    """
+    Log user EOV feedback, a reference to the LangChain model and evaluation metrics to MLflow.
+
+    Args:
+        feedback (UserFeedback_EOV): Feedback details including file metadata and EOV details.
+    """
+
+    # Print the received payload for debugging
+    print("Received Payload:", feedback.dict())
+
+    # Log the LangChain model once per chain version, the run only references it (via its tags)
+    chain_tags = _log_chain_reference("chain_eov", EOV_CHAIN_PATH, prompt_eov_v1, model_eov)
+
+    # Start an MLflow run (params, metrics and tags are sent in one batch on exit)
+    experiment_name = "User Feedback - EOVs"
+    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    run_name = f"EOVs {current_time}"
+
+    with batched_run(experiment_name, run_name, tags=chain_tags, idempotency_key=current_item_key.get()) as run:
+
+        # Save feedback data
+        feedback_from_predicted_eovs = [item.dict() for item in feedback.feedback]
+        missing_eovs_with_comments = [item.dict() for item in feedback.missing_eovs]
+
+        # Log the JSON file to MLflow
+        run.log_dict(feedback_from_predicted_eovs, "raw_feedback_data/feedback_from_predicted_eovs.json")
+        run.log_dict(missing_eovs_with_comments, "raw_feedback_data/feedback_missing_eovs.json")
+
+        # Log metadata and context
+        run.log_param("file_name", feedback.file_name)
+        run.log_param("file_revision_date", feedback.revision_date)
+        run.log_param("user_context", feedback.user_context)
+
+        # Evaluate the feedback against all possible EOVs
+        evaluation = evaluate_eov_feedback(feedback)
+
+        # Log metrics
+        run.log_metric("precision", round(evaluation["precision"], 2))
+        run.log_metric("recall", round(evaluation["recall"], 2))
+        run.log_metric("f1_score", round(evaluation["f1_score"], 2))
+
+        # Log the evaluation table (serialized in memory, uploaded with the other artifacts)
+        run.log_csv(evaluation["table"], "evaluation/evaluation_table.csv")
+
+        # Log confusion matrix components
+        conf_matrix_artifact = {
+            key: evaluation[key]
+            for key in ("true_positives", "false_positives", "false_negatives", "true_negatives")
+        }
+        run.log_dict(conf_matrix_artifact, "evaluation/confusion_matrix_components.json")
+
+
+# Function to log user metadata feedback to MLflow
+def log_metadata_feedback(feedback: MetadataFeedback) -> None:
+    """
+    Log metadata and keyword feedback, a reference to the LangChain model and evaluation metrics to MLflow.
+    This version includes a full evaluation of keyword feedback (including rejected items) and
+    computes the accuracy rate between the API's proposals and the final accepted keywords.
+
+    Args:
+        feedback (MetadataFeedback): Metadata and keyword feedback for one file.
+    """
+    print("Received Metadata Payload:", feedback.dict())
+
+    # Process metadata feedback
+    metadata_feedback = [item.dict() for item in feedback.metadata_feedback]
+
+    # Process keyword feedback (les objets Pydantic reçus)
+    keywords_feedback_en_objs = feedback.keywords_feedback.get("en", [])
+    keywords_feedback_fr_objs = feedback.keywords_feedback.get("fr", [])
+
+
+    keywords_feedback_en = [item.dict() for item in keywords_feedback_en_objs]
+    keywords_feedback_fr = [item.dict() for item in keywords_feedback_fr_objs]
+
+    print("Metadata Feedback:", metadata_feedback)
+    print("Keywords EN Feedback:", keywords_feedback_en)
+    print("Keywords FR Feedback:", keywords_feedback_fr)
+
+    # Evaluate keyword feedback for French and English
+    evaluation_fr = evaluate_keyword_feedback(keywords_feedback_fr)
+    evaluation_en = evaluate_keyword_feedback(keywords_feedback_en)
+
+    # Log the LangChain model once per chain version, the run only references it (via its tags)
+    chain_tags = _log_chain_reference("chain_MetadataSchemaCIOOS", METADATA_CHAIN_PATH, prompt_MetadataSchemaCIOOS_v1, model)
+
+    # Start an MLflow run for metadata feedback (params, metrics and tags are sent in one batch on exit)
+    experiment_name = "User Feedback - Metadata"
+    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    run_name = f"Metadata Feedback {current_time}"
+
+    with batched_run(experiment_name, run_name, tags=chain_tags, idempotency_key=current_item_key.get()) as run:
+        # Log raw metadata and keyword feedback to MLflow
+        run.log_dict(metadata_feedback, "raw_feedback_data/metadata_feedback.json")
+        run.log_dict(keywords_feedback_en, "raw_feedback_data/keywords_en_feedback.json")
+        run.log_dict(keywords_feedback_fr, "raw_feedback_data/keywords_fr_feedback.json")
+
+        # Log contextual parameters
+        run.log_param("file_name", feedback.file_name)
+        run.log_param("file_revision_date", feedback.revision_date)
+        run.log_param("user_context", feedback.user_context)
+
+        # Calculate simple metrics for metadata feedback
+        total_metadata = len(metadata_feedback)
+        accepted_metadata = sum(1 for item in metadata_feedback if item.get("accept", "").lower() == "accept")
+        rejected_metadata = total_metadata - accepted_metadata
+        acceptance_rate_metadata = accepted_metadata / total_metadata if total_metadata > 0 else 0
+
+        run.log_metric("01-total_metadata", total_metadata)
+        run.log_metric("02-accepted_metadata", accepted_metadata)
+        run.log_metric("03-rejected_metadata", rejected_metadata)
+        run.log_metric("04-acceptance_rate_metadata", round(acceptance_rate_metadata, 2))
+
+        # Keyword evaluation metrics for French
+        run.log_metric("05-keywords_total_keywords_fr", evaluation_fr["total_keywords"])
+        run.log_metric("06-keywords_api_accepted_count_fr", evaluation_fr["api_accepted_count"])
+        run.log_metric("07-keywords_manual_added_count_fr", evaluation_fr["manual_added_count"])
+        run.log_metric("08-keywords_final_true_count_fr", evaluation_fr["final_true_count"])
+        run.log_metric("09-keywords_count_rejected_fr", evaluation_fr["count_rejected"])
+        run.log_metric("10-keywords_accuracy_rate_fr", evaluation_fr["accuracy_rate"])
+
+        # Keyword evaluation metrics for English
+        run.log_metric("11-keywords_total_keywords_en", evaluation_en["total_keywords"])
+        run.log_metric("12-keywords_api_accepted_count_en", evaluation_en["api_accepted_count"])
+        run.log_metric("13-keywords_manual_added_count_en", evaluation_en["manual_added_count"])
+        run.log_metric("14-keywords_final_true_count_en", evaluation_en["final_true_count"])
+        run.log_metric("15-keywords_count_rejected_en", evaluation_en["count_rejected"])
+        run.log_metric("16-keywords_accuracy_rate_en", evaluation_en["accuracy_rate"])
+
+        # Accepted keywords that match the predefined vocabulary
+        run.log_metric("17-keywords_vocabulary_accepted_count_fr", evaluation_fr["vocabulary_accepted_count"])
+        run.log_metric("18-keywords_vocabulary_accepted_count_en", evaluation_en["vocabulary_accepted_count"])
+
+
+
+        # Log keyword evaluation results
+        run.log_dict(evaluation_fr, "evaluation/keywords_evaluation_fr.json")
+        run.log_dict(evaluation_en, "evaluation/keywords_evaluation_en.json")
+
+
+        # Generate and log an evaluation table for metadata feedback
+        run.log_csv(metadata_feedback, "evaluation/metadata_evaluation_table.csv")
+        print("Logged evaluation table to MLflow.")
+
+
+# Function to log a bulk feedback submission to MLflow
+def log_bulk_feedback(bulk: BulkFeedback) -> None:
+    """
+    Log many EOV and metadata feedback items as one run per experiment.
+
+    Metrics are computed for all documents at once; per-document and per-EOV results
+    are logged as MLflow tables instead of one run per document.
+
+    Args:
+        bulk (BulkFeedback): EOV and metadata feedback for several files.
+    """
+    print(f"Received bulk feedback: {len(bulk.eov_feedback)} EOV and {len(bulk.metadata_feedback)} metadata items")
+    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    if bulk.eov_feedback:
+        chain_tags = _log_chain_reference("chain_eov", EOV_CHAIN_PATH, prompt_eov_v1, model_eov)
+        metrics = bulk_eov_metrics(**eov_feedback_matrices(bulk.eov_feedback))
+
+        with batched_run("User Feedback - EOVs", f"EOVs bulk {current_time}", tags=chain_tags,
+                         idempotency_key=current_item_key.get()) as run:
+            run.log_dict([item.dict() for item in bulk.eov_feedback], "raw_feedback_data/bulk_eov_feedback.json")
+            run.log_param("documents", len(bulk.eov_feedback))
+            for average in ("micro", "macro"):
+                for name, value in metrics[average].items():
+                    run.log_metric(f"{average}_{name}", round(value, 2))
+
+            run.log_table({
+                "file_name": [item.file_name for item in bulk.eov_feedback],
+                "file_revision_date": [item.revision_date for item in bulk.eov_feedback],
+                "user_context": [item.user_context for item in bulk.eov_feedback],
+                **{name: values.tolist() for name, values in metrics["per_document"].items()},
+            }, "evaluation/per_document_evaluation.json")
+            run.log_table({
+                "EOV Name": POSSIBLE_EOVS,
+                **{name: values.tolist() for name, values in metrics["per_eov"].items()},
+            }, "evaluation/per_eov_evaluation.json")
+
+    if bulk.metadata_feedback:
+        chain_tags = _log_chain_reference("chain_MetadataSchemaCIOOS", METADATA_CHAIN_PATH, prompt_MetadataSchemaCIOOS_v1, model)
+        acceptance = bulk_metadata_acceptance(bulk.metadata_feedback)
+        keyword_evaluations = {
+            language: [
+                evaluate_keyword_feedback([item.dict() for item in feedback.keywords_feedback.get(language, [])])
+                for feedback in bulk.metadata_feedback
+            ]
+            for language in ("fr", "en")
+        }
+
+        with batched_run("User Feedback - Metadata", f"Metadata Feedback bulk {current_time}", tags=chain_tags,
+                         idempotency_key=current_item_key.get()) as run:
+            run.log_dict([item.dict() for item in bulk.metadata_feedback], "raw_feedback_data/bulk_metadata_feedback.json")
+            run.log_param("documents", len(bulk.metadata_feedback))
+            run.log_metric("total_metadata", int(acceptance["total"].sum()))
+            run.log_metric("accepted_metadata", int(acceptance["accepted"].sum()))
+            run.log_metric("acceptance_rate_metadata", round(acceptance["acceptance_rate"], 2))
+            for language, evaluations in keyword_evaluations.items():
+                api_accepted = sum(e["api_accepted_count"] for e in evaluations)
+                final_true = sum(e["final_true_count"] for e in evaluations)
+                run.log_metric(f"keywords_final_true_count_{language}", final_true)
+                run.log_metric(f"keywords_accuracy_rate_{language}", round(api_accepted / final_true, 2) if final_true else 0)
+
+            run.log_table({
+                "file_name": [item.file_name for item in bulk.metadata_feedback],
+                "file_revision_date": [item.revision_date for item in bulk.metadata_feedback],
+                "user_context": [item.user_context for item in bulk.metadata_feedback],
+                "total_metadata": acceptance["total"].tolist(),
+                "accepted_metadata": acceptance["accepted"].tolist(),
+                "acceptance_rate_metadata": acceptance["acceptance_rate_per_document"].tolist(),
+                **{
+                    f"keywords_{key}_{language}": [e[key] for e in evaluations]
+                    for language, evaluations in keyword_evaluations.items()
+                    for key in ("api_accepted_count", "manual_added_count", "count_rejected", "accuracy_rate")
+                },
+            }, "evaluation/per_document_evaluation.json")
@@ -0,0 +1,198 @@
+import contextvars
+import json
+import os
+import sqlite3
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.services.work_queue import LeasedWorkQueue, LeasedWorkerPool
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+FEEDBACK_QUEUE_PATH = os.getenv("FEEDBACK_QUEUE_PATH", "data/feedback_queue.sqlite3")
+FEEDBACK_WORKERS = int(os.getenv("FEEDBACK_WORKERS", 2))
+FEEDBACK_MAX_ATTEMPTS = int(os.getenv("FEEDBACK_MAX_ATTEMPTS", 8))
+# Above this many pending items, new submissions are refused with 503 + Retry-After
+FEEDBACK_QUEUE_MAX_DEPTH = int(os.getenv("FEEDBACK_QUEUE_MAX_DEPTH", 1000))
+# An item claimed by a worker that died is handed out again after this delay
+FEEDBACK_LEASE_SECONDS = float(os.getenv("FEEDBACK_LEASE_SECONDS", 300))
+
+RETRY_BASE_SECONDS = 2.0
+RETRY_MAX_SECONDS = 300.0
+
+# Key of the item being handled, the same on every attempt: handlers use it to resume the
+# MLflow run of a failed attempt instead of creating a second one
+current_item_key: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_item_key", default=None)
+
+
+class QueueFullError(Exception):
+    """Raised when the queue holds more than `max_depth` pending items."""
+
+
+# =============================================================================
+# DURABLE QUEUE
+# =============================================================================
+
+class FeedbackQueue(LeasedWorkQueue):
+    """
+    Durable feedback queue backed by a local SQLite file.
+
+    Items are claimed with a lease, retried and parked as failed as described in
+    `LeasedWorkQueue`, so an item held by a crashed worker becomes available again
+    once the lease expires.
+    """
+
+    table = "feedback_queue"
+    key_columns = ("id",)
+    error_column = "last_error"
+    retry_base_seconds = RETRY_BASE_SECONDS
+    retry_max_seconds = RETRY_MAX_SECONDS
+
+    def __init__(self, path: str = FEEDBACK_QUEUE_PATH, max_depth: int = FEEDBACK_QUEUE_MAX_DEPTH,
+                 max_attempts: int = FEEDBACK_MAX_ATTEMPTS, lease_seconds: float = FEEDBACK_LEASE_SECONDS):
+        self.max_depth = max_depth
+        super().__init__(path, max_attempts, lease_seconds)
+
+    def _create_schema(self, conn: sqlite3.Connection) -> None:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS feedback_queue ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " kind TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " status TEXT NOT NULL DEFAULT 'pending',"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " enqueued_at REAL NOT NULL,"
+            " available_at REAL NOT NULL,"
+            " finished_at REAL,"
+            " last_error TEXT)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_feedback_queue_status ON feedback_queue (status, available_at)")
+
+    def depth(self) -> int:
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM feedback_queue WHERE status IN ('pending', 'processing')"
+        ).fetchone()[0]
+
+    def enqueue(self, kind: str, payload: Dict[str, Any]) -> int:
+        """
+        Persist one feedback item and return its ID.
+
+        Raises:
+            QueueFullError: If `max_depth` items are already waiting.
+        """
+        if self.depth() >= self.max_depth:
+            raise QueueFullError(f"Feedback queue is full ({self.max_depth} items waiting).")
+        now = time.time()
+        with self._connect() as conn:
+            item_id = conn.execute(
+                "INSERT INTO feedback_queue (kind, payload, enqueued_at, available_at) VALUES (?, ?, ?, ?)",
+                (kind, json.dumps(payload, ensure_ascii=False), now, now),
+            ).lastrowid
+        self.available.set()
+        return item_id
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Take the oldest available item (or one whose lease expired), or None."""
+        item = self.claim_item(("id", "kind", "payload", "enqueued_at"))
+        if item is None:
+            return None
+        item["payload"] = json.loads(item["payload"])
+        # Item IDs restart with a new queue file, the enqueue time keeps the key unique
+        item["key"] = f"{item['id']}-{int(item.pop('enqueued_at') * 1e6)}"
+        return item
+
+    def complete(self, item_id: int) -> None:
+        self.complete_item((item_id,))
+
+    def fail(self, item_id: int, attempts: int, error: str) -> None:
+        """Schedule a jittered exponential retry, or park the item as failed after `max_attempts`."""
+        self.fail_item((item_id,), attempts, error)
+
+    def get(self, item_id: int) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT id, kind, status, attempts, enqueued_at, finished_at, last_error FROM feedback_queue WHERE id = ?",
+            (item_id,),
+        ).fetchone()
+        if row is None:
+            return None
+        keys = ["id", "kind", "status", "attempts", "enqueued_at", "finished_at", "last_error"]
+        return dict(zip(keys, row))
+
+    def status(self) -> Dict[str, Any]:
+        """Queue depth per status, lag of the oldest waiting item and the latest error."""
+        conn = self._connect()
+        counts = {status: count for status, count in conn.execute(
+            "SELECT status, COUNT(*) FROM feedback_queue GROUP BY status"
+        )}
+        oldest = conn.execute(
+            "SELECT MIN(enqueued_at) FROM feedback_queue WHERE status IN ('pending', 'processing')"
+        ).fetchone()[0]
+        last_error = conn.execute(
+            "SELECT id, last_error FROM feedback_queue WHERE last_error IS NOT NULL ORDER BY id DESC LIMIT 1"
+        ).fetchone()
+        pending = counts.get("pending", 0)
+        processing = counts.get("processing", 0)
+        return {
+            "depth": pending + processing,
+            "pending": pending,
+            "processing": processing,
+            "done": counts.get("done", 0),
+            "failed": counts.get("failed", 0),
+            "lag_seconds": round(time.time() - oldest, 3) if oldest else 0,
+            "max_depth": self.max_depth,
+            "last_error": {"id": last_error[0], "error": last_error[1]} if last_error else None,
+        }
+
+    def retry_failed(self) -> int:
+        """Put every failed item back in the queue with a fresh attempt budget."""
+        with self._connect() as conn:
+            count = conn.execute(
+                "UPDATE feedback_queue SET status = 'pending', attempts = 0, available_at = ?, finished_at = NULL"
+                " WHERE status = 'failed'",
+                (time.time(),),
+            ).rowcount
+        self.available.set()
+        return count
+
+
+# =============================================================================
+# WORKER POOL
+# =============================================================================
+
+class FeedbackWorkerPool(LeasedWorkerPool):
+    """
+    Background threads draining a `FeedbackQueue` into per-kind handlers.
+
+    Handlers are blocking callables (MLflow logging) receiving the stored payload.
+    A handler exception schedules a retry; see `FeedbackQueue.fail`. The lease is renewed
+    while a handler runs, so a slow handler is not handed the same item twice.
+    """
+
+    name = "feedback"
+
+    def __init__(self, queue: FeedbackQueue, handlers: Dict[str, Callable[[Dict[str, Any]], None]],
+                 workers: int = FEEDBACK_WORKERS, poll_seconds: float = 1.0):
+        super().__init__(queue, workers, poll_seconds)
+        self.handlers = handlers
+
+    def _key(self, item: Dict[str, Any]) -> Tuple[Any, ...]:
+        return (item["id"],)
+
+    def _describe(self, item: Dict[str, Any]) -> str:
+        return f"feedback {item['id']}"
+
+    def _process(self, item: Dict[str, Any]) -> None:
+        token = current_item_key.set(item["key"])
+        try:
+            self.handlers[item["kind"]](item["payload"])
+        finally:
+            current_item_key.reset(token)
+
+    def _complete(self, item: Dict[str, Any], result: None) -> None:
+        self.queue.complete(item["id"])
+
+    def _fail(self, item: Dict[str, Any], error: str) -> None:
+        self.queue.fail(item["id"], item["attempts"], error)
@@ -0,0 +1,338 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.schemas.feedback import MetadataFeedback, UserFeedback_EOV
+from app.services.eov_evaluator import confusion_masks, mask_to_eovs, precision_recall_f1
+from app.utils.helpers import MANUAL_JUSTIFICATIONS
+from app.utils.keyword_vocabulary import normalize_keyword
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+FEEDBACK_STORE_PATH = os.getenv("FEEDBACK_STORE_PATH", "data/feedback_store.sqlite3")
+
+# Trend buckets, as SQLite expressions over the day column (YYYY-MM-DD, UTC)
+BUCKETS = {
+    "day": "day",
+    "week": "strftime('%Y-W%W', day)",
+    "month": "substr(day, 1, 7)",
+    "quarter": "substr(day, 1, 4) || '-Q' || ((CAST(substr(day, 6, 2) AS INTEGER) + 2) / 3)",
+    "year": "substr(day, 1, 4)",
+}
+
+_SCHEMA = [
+    # One row per submitted file; the detail tables reference it
+    "CREATE TABLE IF NOT EXISTS feedback_submissions ("
+    " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+    " kind TEXT NOT NULL,"
+    " file_name TEXT NOT NULL,"
+    " revision_date TEXT NOT NULL,"
+    " user_context TEXT,"
+    " submitted_at REAL NOT NULL,"
+    " day TEXT NOT NULL,"
+    " tp INTEGER, fp INTEGER, fn INTEGER)",
+    "CREATE INDEX IF NOT EXISTS idx_feedback_submissions_file ON feedback_submissions (file_name, revision_date)",
+    "CREATE INDEX IF NOT EXISTS idx_feedback_submissions_revision ON feedback_submissions (revision_date)",
+    "CREATE INDEX IF NOT EXISTS idx_feedback_submissions_day ON feedback_submissions (kind, day)",
+    "CREATE TABLE IF NOT EXISTS eov_feedback ("
+    " submission_id INTEGER NOT NULL REFERENCES feedback_submissions (id),"
+    " eov TEXT NOT NULL,"
+    " outcome TEXT NOT NULL,"
+    " day TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_eov_feedback_eov ON eov_feedback (eov, day)",
+    "CREATE INDEX IF NOT EXISTS idx_eov_feedback_submission ON eov_feedback (submission_id)",
+    "CREATE TABLE IF NOT EXISTS keyword_feedback ("
+    " submission_id INTEGER NOT NULL REFERENCES feedback_submissions (id),"
+    " language TEXT NOT NULL,"
+    " keyword TEXT NOT NULL,"
+    " normalized TEXT NOT NULL,"
+    " outcome TEXT NOT NULL,"
+    " day TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_keyword_feedback_keyword ON keyword_feedback (normalized, language, day)",
+    "CREATE INDEX IF NOT EXISTS idx_keyword_feedback_submission ON keyword_feedback (submission_id)",
+    "CREATE TABLE IF NOT EXISTS metadata_field_feedback ("
+    " submission_id INTEGER NOT NULL REFERENCES feedback_submissions (id),"
+    " field TEXT NOT NULL,"
+    " accepted INTEGER NOT NULL,"
+    " day TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_metadata_field_feedback_field ON metadata_field_feedback (field, day)",
+    # Counters per day, updated with each submission: trends never scan the detail tables
+    "CREATE TABLE IF NOT EXISTS eov_counters ("
+    " eov TEXT NOT NULL, day TEXT NOT NULL,"
+    " tp INTEGER NOT NULL DEFAULT 0, fp INTEGER NOT NULL DEFAULT 0, fn INTEGER NOT NULL DEFAULT 0,"
+    " PRIMARY KEY (eov, day)) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS keyword_counters ("
+    " normalized TEXT NOT NULL, language TEXT NOT NULL, day TEXT NOT NULL,"
+    " keyword TEXT NOT NULL,"
+    " api_accepted INTEGER NOT NULL DEFAULT 0, manual_added INTEGER NOT NULL DEFAULT 0,"
+    " rejected INTEGER NOT NULL DEFAULT 0,"
+    " PRIMARY KEY (normalized, language, day)) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS metadata_counters ("
+    " field TEXT NOT NULL, day TEXT NOT NULL,"
+    " accepted INTEGER NOT NULL DEFAULT 0, rejected INTEGER NOT NULL DEFAULT 0,"
+    " PRIMARY KEY (field, day)) WITHOUT ROWID",
+]
+
+
+def _day(timestamp: float) -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime(timestamp))
+
+
+def keyword_outcome(accept: Optional[str], justification: Optional[str]) -> str:
+    """"api_accepted", "manual_added" or "rejected", as counted by `evaluate_keyword_feedback`."""
+    if (accept or "").lower() != "accept":
+        return "rejected"
+    if justification and justification.strip().lower() in MANUAL_JUSTIFICATIONS:
+        return "manual_added"
+    return "api_accepted"
+
+
+def _eov_rates(tp: int = 0, fp: int = 0, fn: int = 0) -> Dict[str, Any]:
+    precision, recall, f1_score = precision_recall_f1(tp, fp, fn)
+    return {"tp": tp, "fp": fp, "fn": fn, "precision": round(precision, 4), "recall": round(recall, 4),
+            "f1_score": round(f1_score, 4)}
+
+
+def _keyword_rates(api_accepted: int = 0, manual_added: int = 0, rejected: int = 0) -> Dict[str, Any]:
+    proposed = api_accepted + rejected
+    final_true = api_accepted + manual_added
+    return {
+        "api_accepted": api_accepted, "manual_added": manual_added, "rejected": rejected,
+        # Share of the proposed keywords kept by the reviewers
+        "acceptance_rate": round(api_accepted / proposed, 4) if proposed else 0,
+        # Share of the final keywords that were proposed (accuracy_rate of the MLflow runs)
+        "accuracy_rate": round(api_accepted / final_true, 4) if final_true else 0,
+    }
+
+
+def _metadata_rates(accepted: int = 0, rejected: int = 0) -> Dict[str, Any]:
+    total = accepted + rejected
+    return {"accepted": accepted, "rejected": rejected, "acceptance_rate": round(accepted / total, 4) if total else 0}
+
+
+# =============================================================================
+# STORE
+# =============================================================================
+
+class FeedbackStore:
+    """
+    Local SQLite copy of the reviewer feedback, for aggregate queries.
+
+    Each submission is stored once with its EOV, keyword and metadata field
+    outcomes, and the daily counters are updated in the same transaction, so
+    precision, recall and acceptance trends are read from a few hundred counter
+    rows instead of the MLflow runs. Safe to share between threads and uvicorn
+    workers on the same host.
+    """
+
+    def __init__(self, path: str = FEEDBACK_STORE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        for statement in _SCHEMA:
+            conn.execute(statement)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _insert_submission(self, conn: sqlite3.Connection, kind: str, feedback, submitted_at: float,
+                           counts: Tuple[Optional[int], ...] = (None, None, None)) -> int:
+        return conn.execute(
+            "INSERT INTO feedback_submissions (kind, file_name, revision_date, user_context, submitted_at, day, tp, fp, fn)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (kind, feedback.file_name, feedback.revision_date, feedback.user_context, submitted_at,
+             _day(submitted_at), *counts),
+        ).lastrowid
+
+    def add_eov_feedback(self, feedback: UserFeedback_EOV, submitted_at: Optional[float] = None) -> int:
+        """Store one EOV feedback and update the per-EOV counters. Returns the submission ID."""
+        submitted_at = time.time() if submitted_at is None else submitted_at
+        day = _day(submitted_at)
+        tp, fp, fn, _ = confusion_masks(feedback)
+        outcomes = [(eov, outcome) for outcome, mask in (("tp", tp), ("fp", fp), ("fn", fn)) for eov in mask_to_eovs(mask)]
+        counts = tuple(sum(1 for _, outcome in outcomes if outcome == name) for name in ("tp", "fp", "fn"))
+        with self._transaction() as conn:
+            submission_id = self._insert_submission(conn, "eov", feedback, submitted_at, counts)
+            conn.executemany(
+                "INSERT INTO eov_feedback (submission_id, eov, outcome, day) VALUES (?, ?, ?, ?)",
+                [(submission_id, eov, outcome, day) for eov, outcome in outcomes],
+            )
+            for eov, outcome in outcomes:
+                conn.execute(
+                    f"INSERT INTO eov_counters (eov, day, {outcome}) VALUES (?, ?, 1)"
+                    f" ON CONFLICT (eov, day) DO UPDATE SET {outcome} = {outcome} + 1",
+                    (eov, day),
+                )
+        return submission_id
+
+    def add_metadata_feedback(self, feedback: MetadataFeedback, submitted_at: Optional[float] = None) -> int:
+        """Store one metadata feedback and update the per-keyword and per-field counters."""
+        submitted_at = time.time() if submitted_at is None else submitted_at
+        day = _day(submitted_at)
+        keywords = [
+            (language, item.keyword, normalize_keyword(item.keyword), keyword_outcome(item.accept, item.justification))
+            for language, items in feedback.keywords_feedback.items()
+            for item in items
+        ]
+        fields = [(item.metadata_field, (item.accept or "").lower() == "accept") for item in feedback.metadata_feedback]
+        with self._transaction() as conn:
+            submission_id = self._insert_submission(conn, "metadata", feedback, submitted_at)
+            conn.executemany(
+                "INSERT INTO keyword_feedback (submission_id, language, keyword, normalized, outcome, day)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [(submission_id, *keyword, day) for keyword in keywords],
+            )
+            for language, keyword, normalized, outcome in keywords:
+                # Spellings that normalize alike share a counter (the first one seen is kept)
+                conn.execute(
+                    f"INSERT INTO keyword_counters (normalized, language, day, keyword, {outcome}) VALUES (?, ?, ?, ?, 1)"
+                    f" ON CONFLICT (normalized, language, day) DO UPDATE SET {outcome} = {outcome} + 1",
+                    (normalized, language, day, keyword),
+                )
+            conn.executemany(
+                "INSERT INTO metadata_field_feedback (submission_id, field, accepted, day) VALUES (?, ?, ?, ?)",
+                [(submission_id, field, int(accepted), day) for field, accepted in fields],
+            )
+            for field, accepted in fields:
+                column = "accepted" if accepted else "rejected"
+                conn.execute(
+                    f"INSERT INTO metadata_counters (field, day, {column}) VALUES (?, ?, 1)"
+                    f" ON CONFLICT (field, day) DO UPDATE SET {column} = {column} + 1",
+                    (field, day),
+                )
+        return submission_id
+
+    # -------------------------------------------------------------------------
+    # Queries (`since` and `until` are inclusive YYYY-MM-DD days, UTC)
+    # -------------------------------------------------------------------------
+
+    def eov_trend(self, eov: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+                  bucket: str = "month") -> Dict[str, Any]:
+        """Precision, recall and F1 per period, for one EOV or all of them (micro-averaged)."""
+        where, params = _filters(("eov", eov), since=since, until=until)
+        return self._trend(
+            "SELECT {period}, SUM(tp), SUM(fp), SUM(fn) FROM eov_counters" + where + " GROUP BY 1 ORDER BY 1",
+            params, bucket, _eov_rates, {"eov": eov},
+        )
+
+    def eov_summary(self, since: Optional[str] = None, until: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Precision, recall and F1 of each EOV over the period, most reviewed first."""
+        where, params = _filters(since=since, until=until)
+        rows = self._connect().execute(
+            "SELECT eov, SUM(tp), SUM(fp), SUM(fn) FROM eov_counters" + where
+            + " GROUP BY eov ORDER BY SUM(tp) + SUM(fp) + SUM(fn) DESC, eov",
+            params,
+        ).fetchall()
+        return [{"eov": eov, **_eov_rates(*counts)} for eov, *counts in rows]
+
+    def keyword_trend(self, keyword: Optional[str] = None, language: Optional[str] = None,
+                      since: Optional[str] = None, until: Optional[str] = None, bucket: str = "month") -> Dict[str, Any]:
+        """Keyword acceptance per period, for one keyword (any spelling) or all of them."""
+        normalized = normalize_keyword(keyword) if keyword else None
+        where, params = _filters(("normalized", normalized), ("language", language), since=since, until=until)
+        return self._trend(
+            "SELECT {period}, SUM(api_accepted), SUM(manual_added), SUM(rejected) FROM keyword_counters" + where
+            + " GROUP BY 1 ORDER BY 1",
+            params, bucket, _keyword_rates, {"keyword": keyword, "language": language},
+        )
+
+    def keyword_summary(self, language: Optional[str] = None, since: Optional[str] = None,
+                        until: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Acceptance of the most reviewed keywords over the period."""
+        where, params = _filters(("language", language), since=since, until=until)
+        rows = self._connect().execute(
+            "SELECT MIN(keyword), language, SUM(api_accepted), SUM(manual_added), SUM(rejected) FROM keyword_counters"
+            + where + " GROUP BY normalized, language"
+            " ORDER BY SUM(api_accepted) + SUM(manual_added) + SUM(rejected) DESC, 1 LIMIT ?",
+            (*params, limit),
+        ).fetchall()
+        return [{"keyword": keyword, "language": lang, **_keyword_rates(*counts)} for keyword, lang, *counts in rows]
+
+    def metadata_trend(self, field: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+                       bucket: str = "month") -> Dict[str, Any]:
+        """Acceptance of the metadata fields per period, for one field or all of them."""
+        where, params = _filters(("field", field), since=since, until=until)
+        return self._trend(
+            "SELECT {period}, SUM(accepted), SUM(rejected) FROM metadata_counters" + where + " GROUP BY 1 ORDER BY 1",
+            params, bucket, _metadata_rates, {"field": field},
+        )
+
+    def file_feedback(self, file_name: str, revision_date: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Every submission for a file (optionally one revision), oldest first, with its EOV outcomes
+        as {"eov", "outcome"} pairs in submission order."""
+        where, params = _filters(("file_name", file_name), ("revision_date", revision_date))
+        conn = self._connect()
+        submissions = conn.execute(
+            "SELECT id, kind, file_name, revision_date, user_context, submitted_at, tp, fp, fn"
+            " FROM feedback_submissions" + where + " ORDER BY submitted_at, id",
+            params,
+        ).fetchall()
+        results = []
+        for submission_id, kind, name, revision, context, submitted_at, tp, fp, fn in submissions:
+            item = {"id": submission_id, "kind": kind, "file_name": name, "revision_date": revision,
+                    "user_context": context, "submitted_at": submitted_at}
+            if kind == "eov":
+                item.update(_eov_rates(tp, fp, fn))
+                # One entry per stored row: an EOV can have two outcomes (rejected and listed as missing)
+                item["eovs"] = [{"eov": eov, "outcome": outcome} for eov, outcome in conn.execute(
+                    "SELECT eov, outcome FROM eov_feedback WHERE submission_id = ? ORDER BY rowid", (submission_id,))]
+            else:
+                item["keywords"] = _keyword_rates(*(conn.execute(
+                    "SELECT COUNT(*) FROM keyword_feedback WHERE submission_id = ? AND outcome = ?",
+                    (submission_id, outcome)).fetchone()[0] for outcome in ("api_accepted", "manual_added", "rejected")))
+            results.append(item)
+        return results
+
+    def _trend(self, query: str, params: List[Any], bucket: str, rates, selection: Dict[str, Any]) -> Dict[str, Any]:
+        if bucket not in BUCKETS:
+            raise ValueError(f"Unknown bucket '{bucket}', expected one of {list(BUCKETS)}")
+        rows = self._connect().execute(query.format(period=BUCKETS[bucket]), params).fetchall()
+        totals = [sum(column) for column in zip(*(row[1:] for row in rows))]
+        return {
+            **selection,
+            "bucket": bucket,
+            "totals": rates(*totals),
+            "trend": [{"period": period, **rates(*counts)} for period, *counts in rows],
+        }
+
+
+def _filters(*equals: Tuple[str, Any], since: Optional[str] = None,
+             until: Optional[str] = None) -> Tuple[str, List[Any]]:
+    clauses, params = [], []
+    for column, value in equals:
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    if since:
+        clauses.append("day >= ?")
+        params.append(since)
+    if until:
+        clauses.append("day <= ?")
+        params.append(until)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
@@ -0,0 +1,270 @@
+import gzip
+import io
+import os
+import re
+import tempfile
+import unicodedata
+from collections import Counter
+from typing import AsyncIterable, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence
+
+from app.utils.tokens import CHARS_PER_TOKEN, estimate_tokens
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+# Largest accepted upload, compressed size (the text is then read from disk line by line)
+INGEST_MAX_BYTES = int(os.getenv("INGEST_MAX_BYTES", 50 * 1024 * 1024))
+# A gzip upload may expand to this many times INGEST_MAX_BYTES (text compresses ~3-10x)
+MAX_DECOMPRESSION_RATIO = 20
+# Directory for spooled uploads (default: the system temporary directory)
+INGEST_SPOOL_DIR = os.getenv("INGEST_SPOOL_DIR") or None
+
+# A short line seen this many times is a page header or footer
+BOILERPLATE_MIN_REPEATS = 3
+BOILERPLATE_MAX_CHARS = 120
+# ...and has at least this many letters (repeated table values are not boilerplate)
+BOILERPLATE_MIN_LETTERS = 8
+GZIP_MAGIC = b"\x1f\x8b"
+
+# Sections that can be left out with `drop_sections`, by their heading (accent and case folded)
+SECTION_HEADINGS: Dict[str, List[str]] = {
+    "contents": ["table des matieres", "sommaire", "contents", "table of contents"],
+    "acknowledgements": ["remerciements", "acknowledgements", "acknowledgments"],
+    "references": ["references", "references bibliographiques", "bibliographie", "bibliography",
+                   "literature cited", "ouvrages cites", "litterature citee"],
+    "appendices": ["annexe", "annexes", "appendix", "appendices"],
+}
+
+_PAGE_NUMBER = re.compile(r"^(page|p\.)?\s*\d{1,4}(\s*(/|de|of|sur)\s*\d{1,4})?$", re.IGNORECASE)
+_DOT_LEADER = re.compile(r"(\s*[.·…_]){4,}\s*")
+_PAGE_COUNTER = re.compile(r"^\d{1,4}\s+|\s+(page\s+|p\.\s*)?\d{1,4}(\s*(/|de|of|sur)\s*\d{1,4})?$", re.IGNORECASE)
+_HYPHENATED = re.compile(r"\w-$")
+_NUMBERED_HEADING = re.compile(r"^(\d+(\.\d+)*\.?|[IVX]+\.)\s+\S")
+_HEADING_NUMBER = re.compile(r"^(\d+(\.\d+)*\.?|[IVX]+\.|(annexe|appendix)\s+[\w\d]+\s*[:.-]?)\s*", re.IGNORECASE)
+
+
+class IngestionError(ValueError):
+    """The upload is too large or cannot be read as text."""
+
+
+class UploadTooLargeError(IngestionError):
+    pass
+
+
+class NormalizedDocument(NamedTuple):
+    text: str
+    stats: Dict[str, int]
+
+
+# =============================================================================
+# UPLOAD
+# =============================================================================
+
+async def spool_upload(chunks: AsyncIterable[bytes], max_bytes: int = INGEST_MAX_BYTES,
+                       directory: Optional[str] = INGEST_SPOOL_DIR) -> str:
+    """Write a request body to a temporary file and return its path. The caller deletes it."""
+    spool = tempfile.NamedTemporaryFile(prefix="ingest_", suffix=".upload", dir=directory, delete=False)
+    size = 0
+    try:
+        with spool:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(f"Upload larger than {max_bytes} bytes")
+                spool.write(chunk)
+    except BaseException:
+        os.unlink(spool.name)
+        raise
+    return spool.name
+
+
+class _CappedReader(io.RawIOBase):
+    """Binary stream raising UploadTooLargeError once more than `max_bytes` were read from it."""
+
+    def __init__(self, stream, max_bytes: int):
+        self._stream = stream
+        self.max_bytes = max_bytes
+        self.size = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        count = self._stream.readinto(buffer)
+        self.size += count
+        if self.size > self.max_bytes:
+            raise UploadTooLargeError(f"Upload larger than {self.max_bytes} bytes once decompressed")
+        return count
+
+    def close(self) -> None:
+        self._stream.close()
+        super().close()
+
+
+def iter_file_lines(path: str, max_text_bytes: int = INGEST_MAX_BYTES * MAX_DECOMPRESSION_RATIO) -> Iterator[str]:
+    """
+    Decode a spooled upload line by line, gunzipping it if needed. Invalid UTF-8 is replaced.
+
+    Decompressed uploads larger than `max_text_bytes` raise UploadTooLargeError as soon as
+    the limit is passed, so a small gzip bomb does not fill memory.
+    """
+    with open(path, "rb") as raw:
+        compressed = raw.read(2) == GZIP_MAGIC
+    binary = io.BufferedReader(_CappedReader(gzip.open(path, "rb"), max_text_bytes)) if compressed else open(path, "rb")
+    try:
+        with io.TextIOWrapper(binary, encoding="utf-8", errors="replace", newline=None) as text:
+            for line in text:
+                yield line
+    except (OSError, EOFError) as e:
+        raise IngestionError(f"Unreadable upload: {e}") from e
+
+
+# =============================================================================
+# NORMALIZATION
+# =============================================================================
+
+def _fold(line: str) -> str:
+    return unicodedata.normalize("NFKD", line.lower()).encode("ascii", "ignore").decode()
+
+
+def _boilerplate_key(line: str) -> Optional[str]:
+    """Key under which repeated headers and footers match ("Rapport 2021 - page 3" ~ "... page 4").
+
+    Only a leading or trailing page counter is ignored, so that body lines differing by a
+    number ("Station 1 : ...", "Station 2 : ...") are kept.
+    """
+    if not line or len(line) > BOILERPLATE_MAX_CHARS or sum(c.isalpha() for c in line) < BOILERPLATE_MIN_LETTERS:
+        return None
+    if line[0].islower():
+        # The end of a sentence wrapped from the previous line
+        return None
+    return _PAGE_COUNTER.sub(" #", _fold(line))
+
+
+def _section_name(line: str, sections: Dict[str, List[str]]) -> Optional[str]:
+    if len(line) > 60:
+        return None
+    heading = _HEADING_NUMBER.sub("", _fold(line)).strip(" :.-")
+    for name, titles in sections.items():
+        if heading in titles:
+            return name
+    return None
+
+
+def _is_heading(line: str) -> bool:
+    return len(line) <= 80 and (_NUMBERED_HEADING.match(line) is not None or (line.isupper() and len(line) > 3))
+
+
+def _clean_line(line: str) -> str:
+    line = line.replace("\f", " ").replace("\u00ad", "")
+    line = _DOT_LEADER.sub(" ", line)
+    return " ".join(line.split())
+
+
+def normalize_lines(read_lines: Callable[[], Iterable[str]], drop_sections: Sequence[str] = (),
+                    sections: Dict[str, List[str]] = SECTION_HEADINGS) -> NormalizedDocument:
+    """
+    Clean extracted document text to reduce the tokens sent to the chains.
+
+    - whitespace runs are collapsed within lines, dot leaders of tables of contents and
+      soft hyphens are removed;
+    - page numbers, and headers/footers repeated on BOILERPLATE_MIN_REPEATS lines or more
+      (page counters ignored) are removed, keeping the first occurrence of each header;
+    - words hyphenated across lines are joined;
+    - the sections named in `drop_sections` (keys of SECTION_HEADINGS) are left out, from
+      their heading to the next heading;
+    - consecutive blank lines are reduced to one.
+
+    Args:
+        read_lines (Callable[[], Iterable[str]]): Returns the raw lines; called twice (one
+            pass counts repeated lines, the second one writes), so memory does not grow
+            with the document.
+        drop_sections (Sequence[str]): Sections to leave out.
+
+    Returns:
+        NormalizedDocument: Cleaned text and counts (characters, lines and estimated tokens
+        before and after).
+    """
+    unknown = set(drop_sections) - set(sections)
+    if unknown:
+        raise IngestionError(f"Unknown sections {sorted(unknown)}, expected some of {sorted(sections)}")
+
+    counts: Counter = Counter()
+    chars_before = 0
+    lines_before = 0
+    for raw in read_lines():
+        chars_before += len(raw)
+        lines_before += 1
+        key = _boilerplate_key(_clean_line(raw))
+        if key is not None:
+            counts[key] += 1
+    boilerplate = {key for key, count in counts.items() if count >= BOILERPLATE_MIN_REPEATS}
+
+    output: List[str] = []
+    seen_boilerplate = set()
+    stats = Counter()
+    pending = ""
+    dropping = False
+    blank = True
+    for raw in read_lines():
+        line = _clean_line(raw)
+        if not line:
+            if pending:
+                output.append(pending)
+                pending = ""
+            if not blank:
+                output.append("")
+                blank = True
+            continue
+        if _PAGE_NUMBER.match(line):
+            stats["page_numbers"] += 1
+            continue
+        key = _boilerplate_key(line)
+        if key in boilerplate:
+            if key in seen_boilerplate:
+                stats["repeated_lines"] += 1
+                continue
+            seen_boilerplate.add(key)
+
+        section = _section_name(line, sections)
+        if section is not None or (dropping and _is_heading(line)):
+            dropping = section in drop_sections
+        if dropping:
+            stats["section_lines"] += 1
+            continue
+
+        if pending:
+            if _HYPHENATED.search(pending) and line[0].islower():
+                line = pending[:-1] + line
+                stats["hyphens_repaired"] += 1
+            else:
+                output.append(pending)
+        pending = line
+        blank = False
+    if pending:
+        output.append(pending)
+    while output and not output[-1]:
+        output.pop()
+
+    text = "\n".join(output)
+    stats.update({
+        "chars_before": chars_before,
+        "chars_after": len(text),
+        "lines_before": lines_before,
+        "lines_after": text.count("\n") + 1 if text else 0,
+        "tokens_before": (chars_before + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN,
+        "tokens_after": estimate_tokens(text),
+    })
+    return NormalizedDocument(text, dict(stats))
+
+
+def normalize_file(path: str, drop_sections: Sequence[str] = (),
+                   max_text_bytes: int = INGEST_MAX_BYTES * MAX_DECOMPRESSION_RATIO) -> NormalizedDocument:
+    """Normalize a spooled upload (plain or gzip-compressed UTF-8 text)."""
+    return normalize_lines(lambda: iter_file_lines(path, max_text_bytes), drop_sections)
+
+
+def normalize_document_text(text: str, drop_sections: Sequence[str] = ()) -> NormalizedDocument:
+    return normalize_lines(lambda: io.StringIO(text), drop_sections)
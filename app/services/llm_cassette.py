@@ -0,0 +1,303 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_openai import ChatOpenAI
+
+from app.services.rate_limit import RateControlledChatOpenAI
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+# "off" (default), "record" (call OpenAI and store the responses) or "replay" (serve stored
+# responses only; an unknown request raises CassetteMissError)
+LLM_CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE", "off").lower()
+LLM_CASSETTE_PATH = os.getenv("LLM_CASSETTE_PATH", "data/llm_cassettes.sqlite3")
+# Replayed latency = recorded latency x scale (0 answers immediately)
+LLM_CASSETTE_LATENCY_SCALE = float(os.getenv("LLM_CASSETTE_LATENCY_SCALE", 1.0))
+
+CASSETTE_MODES = ("off", "record", "replay")
+# Payload entries that do not change the response
+IGNORED_PAYLOAD_KEYS = ("stream", "stream_options", "ls_structured_output_format")
+# Characters per chunk when a response is replayed as a stream
+REPLAY_CHUNK_CHARS = 16
+
+
+class CassetteMissError(LookupError):
+    """A request was made in replay mode that is not in the cassette."""
+
+
+# =============================================================================
+# STORE
+# =============================================================================
+
+def request_key(payload: Dict[str, Any]) -> str:
+    """Hash an OpenAI request payload. Pydantic response formats are hashed by their JSON schema."""
+    payload = {key: value for key, value in payload.items() if key not in IGNORED_PAYLOAD_KEYS}
+    response_format = payload.get("response_format")
+    if isinstance(response_format, type) and hasattr(response_format, "model_json_schema"):
+        payload["response_format"] = {"name": response_format.__name__, "schema": response_format.model_json_schema()}
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class CassetteStore:
+    """
+    Recorded chat completions in a local SQLite file.
+
+    Requests map to response bodies by hash; bodies are zlib-compressed JSON stored once
+    per distinct content, so identical answers to different prompts take no extra space.
+    """
+
+    def __init__(self, path: str = LLM_CASSETTE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cassette_bodies ("
+                " hash TEXT PRIMARY KEY,"
+                " body BLOB NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cassette_requests ("
+                " key TEXT PRIMARY KEY,"
+                " body_hash TEXT NOT NULL,"
+                " model TEXT NOT NULL,"
+                " latency REAL NOT NULL,"
+                " first_token_latency REAL NOT NULL,"
+                " recorded_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def put(self, key: str, model: str, response: Dict[str, Any], latency: float,
+            first_token_latency: Optional[float] = None) -> None:
+        body = json.dumps(response, sort_keys=True, ensure_ascii=False).encode("utf-8")
+        body_hash = hashlib.sha256(body).hexdigest()
+        with self._connect() as conn:
+            conn.execute("INSERT OR IGNORE INTO cassette_bodies (hash, body) VALUES (?, ?)",
+                         (body_hash, zlib.compress(body, 9)))
+            conn.execute(
+                "INSERT OR REPLACE INTO cassette_requests"
+                " (key, body_hash, model, latency, first_token_latency, recorded_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, body_hash, model, latency, latency if first_token_latency is None else first_token_latency,
+                 time.time()),
+            )
+
+    def get(self, key: str) -> Optional[Tuple[Dict[str, Any], float, float]]:
+        """Return (response, latency, first token latency) or None."""
+        row = self._connect().execute(
+            "SELECT b.body, r.latency, r.first_token_latency FROM cassette_requests r"
+            " JOIN cassette_bodies b ON b.hash = r.body_hash WHERE r.key = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(row[0])), row[1], row[2]
+
+    def stats(self) -> Dict[str, int]:
+        conn = self._connect()
+        return {
+            "requests": conn.execute("SELECT COUNT(*) FROM cassette_requests").fetchone()[0],
+            "bodies": conn.execute("SELECT COUNT(*) FROM cassette_bodies").fetchone()[0],
+            "compressed_bytes": conn.execute("SELECT COALESCE(SUM(LENGTH(body)), 0) FROM cassette_bodies").fetchone()[0],
+        }
+
+
+# =============================================================================
+# SERIALIZATION
+# =============================================================================
+
+def _message_record(message: BaseMessage, llm_output: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    # The parsed structured output is rebuilt from the content on replay
+    additional_kwargs = {key: value for key, value in message.additional_kwargs.items() if key != "parsed"}
+    return {
+        "content": message.content,
+        "additional_kwargs": additional_kwargs,
+        "response_metadata": message.response_metadata,
+        "usage_metadata": dict(message.usage_metadata) if getattr(message, "usage_metadata", None) else None,
+        "llm_output": llm_output or {},
+    }
+
+
+def _replayed_message(record: Dict[str, Any], response_format: Any) -> AIMessage:
+    additional_kwargs = dict(record["additional_kwargs"])
+    if isinstance(response_format, type) and hasattr(response_format, "model_validate_json") and record["content"]:
+        additional_kwargs["parsed"] = response_format.model_validate_json(record["content"])
+    return AIMessage(
+        content=record["content"],
+        additional_kwargs=additional_kwargs,
+        response_metadata=record["response_metadata"],
+        usage_metadata=record["usage_metadata"],
+    )
+
+
+def _replayed_chunks(record: Dict[str, Any]) -> List[ChatGenerationChunk]:
+    content = record["content"] if isinstance(record["content"], str) else json.dumps(record["content"])
+    chunks = [
+        ChatGenerationChunk(message=AIMessageChunk(content=content[start:start + REPLAY_CHUNK_CHARS]))
+        for start in range(0, len(content), REPLAY_CHUNK_CHARS)
+    ]
+    chunks.append(ChatGenerationChunk(message=AIMessageChunk(
+        content="", usage_metadata=record["usage_metadata"], response_metadata=record["response_metadata"],
+    )))
+    return chunks
+
+
+# =============================================================================
+# CHAT MODEL
+# =============================================================================
+
+_stores: Dict[str, CassetteStore] = {}
+_stores_lock = threading.Lock()
+
+
+def cassette_store(path: str = LLM_CASSETTE_PATH) -> CassetteStore:
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = CassetteStore(path)
+        return _stores[path]
+
+
+class CassetteChatOpenAI(RateControlledChatOpenAI):
+    """
+    Rate-controlled `ChatOpenAI` that records its responses to a cassette, or replays them.
+
+    Requests are identified by a hash of the complete OpenAI payload (model, parameters,
+    messages and response schema). In replay mode no network call is made: responses
+    are served after their recorded latency times `latency_scale`.
+    """
+
+    cassette_mode: str = LLM_CASSETTE_MODE
+    cassette_path: str = LLM_CASSETTE_PATH
+    latency_scale: float = LLM_CASSETTE_LATENCY_SCALE
+
+    def _cassette_key(self, messages, stop, kwargs) -> str:
+        return request_key(self._get_request_payload(messages, stop=stop, **kwargs))
+
+    def _lookup(self, key: str) -> Tuple[Dict[str, Any], float, float]:
+        entry = cassette_store(self.cassette_path).get(key)
+        if entry is None:
+            raise CassetteMissError(f"No recorded response for request {key[:12]} in {self.cassette_path}")
+        return entry
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        key = self._cassette_key(messages, stop, kwargs)
+        if self.cassette_mode == "replay":
+            record, latency, _ = self._lookup(key)
+            time.sleep(latency * self.latency_scale)
+            return self._replayed_result(record, kwargs)
+        start = time.monotonic()
+        result = super()._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        if self.cassette_mode == "record":
+            self._record(key, result, time.monotonic() - start)
+        return result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        key = self._cassette_key(messages, stop, kwargs)
+        if self.cassette_mode == "replay":
+            record, latency, _ = self._lookup(key)
+            await asyncio.sleep(latency * self.latency_scale)
+            return self._replayed_result(record, kwargs)
+        start = time.monotonic()
+        result = await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        if self.cassette_mode == "record":
+            self._record(key, result, time.monotonic() - start)
+        return result
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        key = self._cassette_key(messages, stop, kwargs)
+        if self.cassette_mode == "replay":
+            record, latency, first_token_latency = self._lookup(key)
+            chunks = _replayed_chunks(record)
+            time.sleep(first_token_latency * self.latency_scale)
+            pause = max(latency - first_token_latency, 0.0) * self.latency_scale / len(chunks)
+            for chunk in chunks:
+                if run_manager:
+                    run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+                time.sleep(pause)
+            return
+        yield from self._recorded_stream(key, super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        key = self._cassette_key(messages, stop, kwargs)
+        if self.cassette_mode == "replay":
+            record, latency, first_token_latency = self._lookup(key)
+            chunks = _replayed_chunks(record)
+            await asyncio.sleep(first_token_latency * self.latency_scale)
+            pause = max(latency - first_token_latency, 0.0) * self.latency_scale / len(chunks)
+            for chunk in chunks:
+                if run_manager:
+                    await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+                await asyncio.sleep(pause)
+            return
+        start = time.monotonic()
+        first_token_latency, collected = None, []
+        async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            if first_token_latency is None:
+                first_token_latency = time.monotonic() - start
+            collected.append(chunk)
+            yield chunk
+        self._record_chunks(key, collected, time.monotonic() - start, first_token_latency)
+
+    def _recorded_stream(self, key: str, stream: Iterator[ChatGenerationChunk]) -> Iterator[ChatGenerationChunk]:
+        start = time.monotonic()
+        first_token_latency, collected = None, []
+        for chunk in stream:
+            if first_token_latency is None:
+                first_token_latency = time.monotonic() - start
+            collected.append(chunk)
+            yield chunk
+        self._record_chunks(key, collected, time.monotonic() - start, first_token_latency)
+
+    def _replayed_result(self, record: Dict[str, Any], kwargs) -> ChatResult:
+        message = _replayed_message(record, kwargs.get("response_format"))
+        return ChatResult(generations=[ChatGeneration(message=message)], llm_output=record["llm_output"])
+
+    def _record(self, key: str, result: ChatResult, latency: float) -> None:
+        record = _message_record(result.generations[0].message, result.llm_output)
+        cassette_store(self.cassette_path).put(key, self.model_name, record, latency)
+
+    def _record_chunks(self, key: str, chunks: List[ChatGenerationChunk], latency: float,
+                       first_token_latency: Optional[float]) -> None:
+        if self.cassette_mode != "record" or not chunks:
+            return
+        message = chunks[0].message
+        for chunk in chunks[1:]:
+            message = message + chunk.message
+        cassette_store(self.cassette_path).put(key, self.model_name, _message_record(message, None),
+                                               latency, first_token_latency)
+
+
+def chat_model(**kwargs: Any) -> ChatOpenAI:
+    """
+    Build a chat model for the chains: rate-controlled, with the cassette layer when
+    LLM_CASSETTE_MODE is "record" or "replay".
+    """
+    if LLM_CASSETTE_MODE not in CASSETTE_MODES:
+        raise ValueError(f"LLM_CASSETTE_MODE must be one of {CASSETTE_MODES}, not {LLM_CASSETTE_MODE!r}")
+    if LLM_CASSETTE_MODE == "off":
+        return RateControlledChatOpenAI(**kwargs)
+    return CassetteChatOpenAI(**kwargs)
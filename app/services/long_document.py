@@ -0,0 +1,160 @@
+import os
+import time
+import unicodedata
+from typing import Any, Dict, List, Tuple
+
+from langchain_core.callbacks.manager import adispatch_custom_event, dispatch_custom_event
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.schemas.eov import Citation, EOVWithCitations, EOVWithReason
+from app.utils.tokens import CHARS_PER_TOKEN, estimate_tokens
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+# Documents above this estimated size are split and processed chunk by chunk
+EOV_CHUNK_THRESHOLD_TOKENS = int(os.getenv("EOV_CHUNK_THRESHOLD_TOKENS", 12000))
+EOV_CHUNK_TOKENS = int(os.getenv("EOV_CHUNK_TOKENS", 6000))
+EOV_CHUNK_OVERLAP_TOKENS = int(os.getenv("EOV_CHUNK_OVERLAP_TOKENS", 300))
+EOV_CHUNK_CONCURRENCY = int(os.getenv("EOV_CHUNK_CONCURRENCY", 4))
+
+# Name of the custom LangChain event carrying the per-chunk report
+CHUNK_REPORT_EVENT = "eov_chunk_report"
+
+
+# =============================================================================
+# SPLIT
+# =============================================================================
+
+def split_document(text: str, chunk_tokens: int = EOV_CHUNK_TOKENS,
+                   overlap_tokens: int = EOV_CHUNK_OVERLAP_TOKENS) -> List[str]:
+    """
+    Split a document into overlapping sections, preferring paragraph and sentence boundaries.
+    """
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_tokens * CHARS_PER_TOKEN,
+        chunk_overlap=overlap_tokens * CHARS_PER_TOKEN,
+        separators=["\n\n", "\n", ". ", " ", ""],
+    )
+    return splitter.split_text(text)
+
+
+# =============================================================================
+# MERGE
+# =============================================================================
+
+def _fold(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", text).split()).casefold()
+
+
+def merge_eov_results(results: List[EOVWithCitations]) -> EOVWithCitations:
+    """
+    Merge the EOVs found in several chunks of the same document.
+
+    EOVs are deduplicated by name (case and whitespace insensitive) in order of first
+    appearance. Citations are joined without duplicates. The kept `raison` is the one
+    from the chunk that cited the EOV most, longest explanation first on ties.
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    for result in results:
+        for item in result.liste_eov:
+            entry = merged.setdefault(_fold(item.eov), {
+                "eov": item.eov, "raison": "", "score": (-1, -1), "citations": {},
+            })
+            for citation in item.citation:
+                entry["citations"].setdefault(_fold(citation.citation_texte), citation)
+            score = (len(item.citation), len(item.raison))
+            if score > entry["score"]:
+                entry["score"] = score
+                entry["raison"] = item.raison
+
+    return EOVWithCitations(liste_eov=[
+        EOVWithReason(
+            eov=entry["eov"],
+            raison=entry["raison"],
+            citation=[Citation(citation_texte=c.citation_texte) for c in entry["citations"].values()],
+        )
+        for entry in merged.values()
+    ])
+
+
+# =============================================================================
+# CHAIN WRAPPER
+# =============================================================================
+
+def with_long_document_mode(chain: Runnable, *,
+                            threshold_tokens: int = EOV_CHUNK_THRESHOLD_TOKENS,
+                            chunk_tokens: int = EOV_CHUNK_TOKENS,
+                            overlap_tokens: int = EOV_CHUNK_OVERLAP_TOKENS,
+                            max_concurrency: int = EOV_CHUNK_CONCURRENCY) -> Runnable:
+    """
+    Route long documents through a chunked map-reduce over the EOV chain.
+
+    Short documents go straight to `chain`. Above `threshold_tokens`, the text is split
+    into overlapping sections that are sent to `chain` in parallel (at most
+    `max_concurrency` at a time) and the `EOVWithCitations` results are merged.
+    The per-chunk timings are printed and dispatched as the `eov_chunk_report`
+    custom event, visible on the LangServe `stream_events` route.
+
+    Args:
+        chain (Runnable): Chain taking {"text": ...} and returning `EOVWithCitations`.
+
+    Returns:
+        Runnable: A runnable with the same input/output schemas as `chain`.
+    """
+
+    def _chunk(inputs: Dict[str, Any], config: RunnableConfig) -> Tuple[EOVWithCitations, float]:
+        start = time.perf_counter()
+        result = chain.invoke(inputs, config)
+        return result, time.perf_counter() - start
+
+    async def _achunk(inputs: Dict[str, Any], config: RunnableConfig) -> Tuple[EOVWithCitations, float]:
+        start = time.perf_counter()
+        result = await chain.ainvoke(inputs, config)
+        return result, time.perf_counter() - start
+
+    timed_chunk = RunnableLambda(_chunk, afunc=_achunk, name="eov_chunk")
+
+    def _prepare(inputs: Dict[str, Any]) -> List[Dict[str, Any]]:
+        chunks = split_document(inputs["text"], chunk_tokens, overlap_tokens)
+        return [{**inputs, "text": chunk} for chunk in chunks]
+
+    def _report(chunk_inputs, outputs, start) -> Dict[str, Any]:
+        return {
+            "chunks": [
+                {
+                    "index": i,
+                    "estimated_tokens": estimate_tokens(inputs["text"]),
+                    "eov_count": len(result.liste_eov),
+                    "seconds": round(seconds, 3),
+                }
+                for i, (inputs, (result, seconds)) in enumerate(zip(chunk_inputs, outputs))
+            ],
+            "total_seconds": round(time.perf_counter() - start, 3),
+        }
+
+    def _invoke(inputs: Dict[str, Any], config: RunnableConfig) -> EOVWithCitations:
+        if estimate_tokens(inputs["text"]) <= threshold_tokens:
+            return chain.invoke(inputs, config)
+        start = time.perf_counter()
+        chunk_inputs = _prepare(inputs)
+        outputs = timed_chunk.batch(chunk_inputs, {**config, "max_concurrency": max_concurrency})
+        dispatch_custom_event(CHUNK_REPORT_EVENT, _report(chunk_inputs, outputs, start), config=config)
+        return merge_eov_results([result for result, _ in outputs])
+
+    async def _ainvoke(inputs: Dict[str, Any], config: RunnableConfig) -> EOVWithCitations:
+        if estimate_tokens(inputs["text"]) <= threshold_tokens:
+            return await chain.ainvoke(inputs, config)
+        start = time.perf_counter()
+        chunk_inputs = _prepare(inputs)
+        outputs = await timed_chunk.abatch(chunk_inputs, {**config, "max_concurrency": max_concurrency})
+        await adispatch_custom_event(CHUNK_REPORT_EVENT, _report(chunk_inputs, outputs, start), config=config)
+        return merge_eov_results([result for result, _ in outputs])
+
+    return RunnableLambda(_invoke, afunc=_ainvoke, name="long_document_eov").with_types(
+        input_type=chain.get_input_schema(),
+        output_type=EOVWithCitations,
+    )
@@ -0,0 +1,100 @@
+import asyncio
+import time
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from app.schemas.metadata import MetadataSchemaCIOOS
+from app.services.extraction import metadata_payload
+from app.services.result_cache import ResultCache
+
+
+def _last_string(partial: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    # The value being written is the last key, possibly nested (e.g. summary_translated.en)
+    path, value = [], partial
+    while isinstance(value, dict) and value:
+        key = next(reversed(value))
+        path.append(key)
+        value = value[key]
+    return (".".join(path), value) if path and isinstance(value, str) else None
+
+
+def _metadata_event(metadata: MetadataSchemaCIOOS, start: float, cached: bool) -> Dict[str, Any]:
+    return {**metadata_payload(metadata), "seconds": round(time.perf_counter() - start, 3), "cached": cached}
+
+
+async def stream_metadata(text: str, chain: Runnable, config: Optional[RunnableConfig] = None, *,
+                          cache: Optional[ResultCache] = None,
+                          key: Optional[str] = None) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Stream the metadata of a document field by field while the model writes it.
+
+    Events, in order:
+        - ("delta", {"field", "text"}): new text of the string field being written
+          (nested fields are dotted, e.g. "summary_translated.en").
+        - ("field", {"field", "value"}): a top-level field is complete; fields arrive
+          in the order the model writes them.
+        - ("metadata", {"metadata", "full_metadata", "seconds", "cached"}): the validated
+          `MetadataSchemaCIOOS` and its full JSON schema.
+        - ("error", {"detail"}) if the model or the validation fails.
+        - ("end", {"seconds", "first_field_seconds"}).
+
+    Args:
+        text (str): Document text.
+        chain (Runnable): Chain taking {"text": ...} and streaming partial JSON dicts.
+        config (RunnableConfig, optional): Run config; `metadata.cache_bypass` skips the cache lookup.
+        cache (ResultCache, optional): Cache shared with the non-streaming metadata chain.
+        key (str, optional): Cache key of the document for that chain.
+    """
+    start = time.perf_counter()
+    first_field = None
+    bypass = bool(((config or {}).get("metadata") or {}).get("cache_bypass"))
+
+    payload = None
+    if cache is not None and key is not None:
+        if bypass:
+            cache.count_bypass()
+        else:
+            payload = await asyncio.to_thread(cache.get, key)
+    if payload is not None:
+        metadata = MetadataSchemaCIOOS.model_validate_json(payload)
+        for name, value in metadata.model_dump().items():
+            yield "field", {"field": name, "value": value}
+        yield "metadata", _metadata_event(metadata, start, cached=True)
+        yield "end", {"seconds": round(time.perf_counter() - start, 3), "first_field_seconds": 0.0}
+        return
+
+    partial: Dict[str, Any] = {}
+    completed = set()
+    written: Tuple[str, str] = ("", "")
+    try:
+        async for partial in chain.astream({"text": text}, config):
+            if not isinstance(partial, dict):
+                continue
+            # Every key before the last one is finished
+            for name in list(partial)[:-1]:
+                if name not in completed:
+                    completed.add(name)
+                    first_field = first_field or round(time.perf_counter() - start, 3)
+                    yield "field", {"field": name, "value": partial[name]}
+
+            current = _last_string(partial)
+            if current is not None:
+                path, value = current
+                previous = written[1] if path == written[0] and value.startswith(written[1]) else ""
+                if len(value) > len(previous):
+                    yield "delta", {"field": path, "text": value[len(previous):]}
+                written = current
+
+        for name in partial:
+            if name not in completed:
+                first_field = first_field or round(time.perf_counter() - start, 3)
+                yield "field", {"field": name, "value": partial[name]}
+
+        metadata = MetadataSchemaCIOOS.model_validate(partial)
+        if cache is not None and key is not None:
+            await asyncio.to_thread(cache.set, key, metadata.model_dump_json().encode("utf-8"))
+        yield "metadata", _metadata_event(metadata, start, cached=False)
+    except Exception as e:
+        yield "error", {"detail": str(e)}
+    yield "end", {"seconds": round(time.perf_counter() - start, 3), "first_field_seconds": first_field}
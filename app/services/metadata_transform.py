@@ -1,95 +1,186 @@
+from typing import Any, AsyncIterable, AsyncIterator, Dict
+
+from pydantic import ValidationError
+from pydantic_core import to_json
+
 from app.schemas.metadata import (
     MetadataSchemaCIOOS, FullMetadataSchema,
-    DescriptionWithTranslations, Translation
+    DescriptionWithTranslations, LimitationsWithTranslations, Translation, TranslatedText
 )
 
+# Longest accepted NDJSON line, in bytes (a metadata record is a few KB)
+MAX_RECORD_BYTES = 1024 * 1024
+# Output lines are sent in chunks of about this size
+OUTPUT_CHUNK_BYTES = 64 * 1024
 
-def transform_metadata_to_full(metadata: MetadataSchemaCIOOS) -> FullMetadataSchema:
-    return FullMetadataSchema(
-        abstract=DescriptionWithTranslations(
-            en=metadata.summary_translated.en,
-            fr=metadata.summary,
-            translations={
-                "fr": Translation(
-                    message=metadata.summary,
-                    verified=False
-                )
-            }
-        ),
-        associated_resources=[],
-        category="",
-        comment="",
-        contacts=[],
-        created="",
-        datasetIdentifier="",
-        dateEnd=metadata.date_fin,
-        datePublished="",
-        dateRevised="",
-        dateStart=metadata.date_debut,
-        distribution=[],
-        doiCreationStatus="",
-        edition="",
-        eov=[""],
-        filename="",
-        history=[],
-        identifier="",
-        instruments=[],
-        keywords=metadata.mots_cles,
-        language=metadata.langue,
-        lastEditedBy={"displayName": "", "email": ""},
-        license="",
-        limitations=DescriptionWithTranslations(
-            en="",
-            fr="",
-            translations={
-                "fr": Translation(
-                    message="",
-                    verified=True
-                )
-            }
-        ),
-        map={
-            "description": {
-                "en": "",
-                "fr": "",
-                "translations": {
-                    "fr": {
-                        "message": "",
-                        "verified": False
-                    }
-                }
-            },
-            "east": "",
-            "north": "",
-            "polygon": "",
-            "south": "",
-            "west": ""
-        },
-        metadataScope="",
-        noPlatform=True,
-        noTaxa=True,
-        noVerticalExtent=False,
-        organization="",
-        progress="",
-        recordID="",
-        region="",
-        resourceType=[metadata.resource_type],
-        sharedWith={"": True, "": True},
-        status="",
-        timeFirstPublished="",
-        title={
-            "en": metadata.title_translated,
-            "fr": metadata.title,
+
+# =============================================================================
+# TEMPLATE
+# =============================================================================
+
+# Everything that does not come from the extracted metadata, validated once at import.
+# The record fields below are placeholders, replaced for each record.
+FULL_METADATA_TEMPLATE = FullMetadataSchema(
+    abstract=DescriptionWithTranslations(en="", fr="", translations={"fr": Translation(message="", verified=False)}),
+    associated_resources=[],
+    category="",
+    comment="",
+    contacts=[],
+    created="",
+    datasetIdentifier="",
+    dateEnd="",
+    datePublished="",
+    dateRevised="",
+    dateStart="",
+    distribution=[],
+    doiCreationStatus="",
+    edition="",
+    eov=[""],
+    filename="",
+    history=[],
+    identifier="",
+    instruments=[],
+    keywords={"en": [], "fr": []},
+    language="",
+    lastEditedBy={"displayName": "", "email": ""},
+    license="",
+    limitations=LimitationsWithTranslations(
+        en="",
+        fr="",
+        translations={
+            "fr": Translation(
+                message="",
+                verified=True
+            )
+        }
+    ),
+    map={
+        "description": {
+            "en": "",
+            "fr": "",
             "translations": {
                 "fr": {
-                    "message": metadata.title,
+                    "message": "",
                     "verified": False
                 }
             }
         },
-        userID="",
-        verticalExtentDirection="",
-        verticalExtentEPSG="",
-        verticalExtentMax="",
-        verticalExtentMin=""
-    )
+        "east": "",
+        "north": "",
+        "polygon": "",
+        "south": "",
+        "west": ""
+    },
+    metadataScope="",
+    noPlatform=True,
+    noTaxa=True,
+    noVerticalExtent=False,
+    organization="",
+    progress="",
+    recordID="",
+    region="",
+    resourceType=[],
+    sharedWith={"": True},
+    status="",
+    timeFirstPublished="",
+    title={"en": "", "fr": "", "translations": {"fr": {"message": "", "verified": False}}},
+    userID="",
+    verticalExtentDirection="",
+    verticalExtentEPSG="",
+    verticalExtentMax="",
+    verticalExtentMin=""
+)
+
+# JSON-compatible form of the template, for the bulk export
+_TEMPLATE_DICT = FULL_METADATA_TEMPLATE.model_dump(mode="json")
+
+
+def _translated(en: str, fr: str) -> Dict[str, Any]:
+    return {"en": en, "fr": fr, "translations": {"fr": {"message": fr, "verified": False}}}
+
+
+def _patch_translated(template: TranslatedText, en: str, fr: str) -> TranslatedText:
+    translation = template.translations["fr"].model_copy(update={"message": fr})
+    return template.model_copy(update={"en": en, "fr": fr, "translations": {"fr": translation}})
+
+
+def transform_metadata_to_full(metadata: MetadataSchemaCIOOS) -> FullMetadataSchema:
+    """
+    Fill the full metadata schema from extracted metadata.
+
+    The template is copied and patched with the record fields; only those are built per
+    record. The constant parts are shared between results and must not be modified.
+    """
+    return FULL_METADATA_TEMPLATE.model_copy(update={
+        "abstract": _patch_translated(FULL_METADATA_TEMPLATE.abstract, metadata.summary_translated.en, metadata.summary),
+        "dateEnd": metadata.date_fin,
+        "dateStart": metadata.date_debut,
+        "keywords": metadata.mots_cles,
+        "language": metadata.langue,
+        "resourceType": [metadata.resource_type],
+        "title": _patch_translated(FULL_METADATA_TEMPLATE.title, metadata.title_translated, metadata.title),
+    })
+
+
+def full_metadata_dict(metadata: MetadataSchemaCIOOS) -> Dict[str, Any]:
+    """Same content as `transform_metadata_to_full(metadata).model_dump()`, without building models."""
+    return {
+        **_TEMPLATE_DICT,
+        "abstract": _translated(metadata.summary_translated.en, metadata.summary),
+        "dateEnd": metadata.date_fin,
+        "dateStart": metadata.date_debut,
+        "keywords": {"en": metadata.mots_cles.en, "fr": metadata.mots_cles.fr},
+        "language": metadata.langue,
+        "resourceType": [metadata.resource_type],
+        "title": _translated(metadata.title_translated, metadata.title),
+    }
+
+
+# =============================================================================
+# NDJSON STREAMING
+# =============================================================================
+
+async def iter_lines(chunks: AsyncIterable[bytes], max_line_bytes: int = MAX_RECORD_BYTES) -> AsyncIterator[bytes]:
+    """Split a byte stream into lines, holding at most one line in memory."""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+        if len(buffer) > max_line_bytes:
+            raise ValueError(f"NDJSON line longer than {max_line_bytes} bytes")
+    if buffer:
+        yield buffer
+
+
+async def transform_ndjson(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """
+    Transform an NDJSON stream of `MetadataSchemaCIOOS` records into full metadata records.
+
+    Output lines follow the input order. An invalid line gives
+    {"line": <line number>, "error": ...} instead of stopping the stream.
+    Lines are buffered up to OUTPUT_CHUNK_BYTES before being sent.
+    """
+    output = []
+    size = 0
+    number = 0
+    try:
+        async for line in iter_lines(chunks):
+            number += 1
+            if not line.strip():
+                continue
+            try:
+                record = full_metadata_dict(MetadataSchemaCIOOS.model_validate_json(line))
+            except ValidationError as e:
+                record = {"line": number, "error": e.errors(include_url=False, include_context=False, include_input=False)}
+            encoded = to_json(record) + b"\n"
+            output.append(encoded)
+            size += len(encoded)
+            if size >= OUTPUT_CHUNK_BYTES:
+                yield b"".join(output)
+                output, size = [], 0
+    except ValueError as e:
+        output.append(to_json({"line": number + 1, "error": str(e)}) + b"\n")
+    if output:
+        yield b"".join(output)
@@ -0,0 +1,423 @@
+import bisect
+import contextvars
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from starlette.routing import Match
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+# SQLite file where each worker process publishes its metrics; /metrics sums all workers.
+# Empty keeps the metrics of the serving process only.
+METRICS_PATH = os.getenv("METRICS_PATH", "data/metrics.sqlite3")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", 2))
+# Snapshots not updated for this long (or whose process is gone) are merged into one row at startup
+METRICS_STALE_SECONDS = float(os.getenv("METRICS_STALE_SECONDS", 3600))
+
+# Row holding the merged snapshots of the workers that stopped
+RETIRED_WORKERS = "retired"
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# USD per million tokens (prompt, completion); models missing here are not costed
+MODEL_PRICES_PER_MILLION: Dict[str, Tuple[float, float]] = {
+    "gpt-4o-2024-08-06": (2.50, 10.00),
+    "gpt-4o-2024-11-20": (2.50, 10.00),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini-2024-07-18": (0.15, 0.60),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+# LLM calls routinely take tens of seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+# name: (type, help, histogram buckets)
+METRICS: Dict[str, Tuple[str, str, Tuple[float, ...]]] = {
+    "http_requests_total": ("counter", "HTTP requests by route, method and status code.", ()),
+    "http_request_duration_seconds": ("histogram", "HTTP request latency, including streamed bodies.", LATENCY_BUCKETS),
+    "llm_requests_total": ("counter", "Chat model calls by route, chain and model.", ()),
+    "llm_errors_total": ("counter", "Chat model calls that raised an error.", ()),
+    "llm_request_duration_seconds": ("histogram", "Time spent waiting on the chat model.", LATENCY_BUCKETS),
+    "llm_tokens_total": ("counter", "Tokens reported by the chat model, by type (prompt or completion).", ()),
+    "llm_cost_usd_total": ("counter", "Estimated spend from token usage and MODEL_PRICES_PER_MILLION.", ()),
+    "chain_cache_lookups_total": ("counter", "Chain result cache lookups by result (per worker, summed).", ()),
+    "eov_cascade_answers_total": ("counter", "EOV answers by cascade tier and escalation reason (per worker, summed).", ()),
+}
+
+# Path of the HTTP request being served, used to label the LLM calls it triggers
+current_route: contextvars.ContextVar[str] = contextvars.ContextVar("current_route", default="")
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+# =============================================================================
+# REGISTRY
+# =============================================================================
+
+class MetricsRegistry:
+    """
+    In-process counters and histograms, shared between worker processes through SQLite.
+
+    Each process keeps its own cumulative values and periodically publishes a snapshot
+    (one row per process). Rendering sums the snapshots of every process that ever
+    published, so counters stay monotonic when workers restart. At startup, the rows
+    of stopped workers are merged into a single row so the file does not grow with
+    every restart.
+    """
+
+    def __init__(self, path: Optional[str] = METRICS_PATH, flush_seconds: float = METRICS_FLUSH_SECONDS,
+                 stale_seconds: float = METRICS_STALE_SECONDS):
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self.stale_seconds = stale_seconds
+        self._counters: Dict[Tuple[str, LabelKey], float] = {}
+        # name, labels -> [count per bucket (last one +Inf)..., sum, count]
+        self._histograms: Dict[Tuple[str, LabelKey], List[float]] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, Dict[str, str], float]]]] = []
+        self._lock = threading.Lock()
+        self._worker_id = None
+        self._flusher_pid = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS metrics_snapshot ("
+                    " worker TEXT PRIMARY KEY, updated_at REAL NOT NULL, data TEXT NOT NULL)"
+                )
+            self.retire_stale_workers()
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # -- recording -----------------------------------------------------------
+
+    def inc(self, name: str, labels: Dict[str, str], value: float = 1.0) -> None:
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+        self._ensure_flusher()
+
+    def observe(self, name: str, labels: Dict[str, str], value: float) -> None:
+        buckets = METRICS[name][2]
+        key = (name, _label_key(labels))
+        with self._lock:
+            values = self._histograms.get(key)
+            if values is None:
+                values = self._histograms[key] = [0.0] * (len(buckets) + 3)
+            values[bisect.bisect_left(buckets, value)] += 1
+            values[-2] += value
+            values[-1] += 1
+        self._ensure_flusher()
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, Dict[str, str], float]]]) -> None:
+        """Add a callable returning (counter name, labels, cumulative value) read at each snapshot."""
+        self._collectors.append(collector)
+
+    # -- publishing ----------------------------------------------------------
+
+    def snapshot(self) -> Dict[str, List[Any]]:
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = [[name, dict(labels), list(values)] for (name, labels), values in self._histograms.items()]
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                counters[(name, _label_key(labels))] = value
+        return {
+            "counters": [[name, dict(labels), value] for (name, labels), value in counters.items()],
+            "histograms": histograms,
+        }
+
+    def flush(self) -> None:
+        """Publish this process's snapshot to the shared file."""
+        if not self.path:
+            return
+        if self._worker_id is None or not self._worker_id.endswith(f"-{os.getpid()}"):
+            self._worker_id = f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}-{os.getpid()}"
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO metrics_snapshot (worker, updated_at, data) VALUES (?, ?, ?)",
+                (self._worker_id, time.time(), json.dumps(self.snapshot())),
+            )
+
+    def retire_stale_workers(self) -> int:
+        """
+        Merge the snapshots of stopped workers into the RETIRED_WORKERS row.
+
+        A worker is stopped when its process no longer exists on this host, or when its
+        snapshot is older than `stale_seconds` (running workers publish every
+        `flush_seconds`). The totals are unchanged.
+
+        Returns:
+            int: Number of worker rows merged.
+        """
+        if not self.path:
+            return 0
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute("SELECT worker, updated_at, data FROM metrics_snapshot").fetchall()
+            stale = [(worker, data) for worker, updated_at, data in rows if worker != RETIRED_WORKERS
+                     and (now - updated_at > self.stale_seconds or not _process_alive(worker))]
+            if not stale:
+                return 0
+            retired = [data for worker, _, data in rows if worker == RETIRED_WORKERS]
+            counters, histograms = _merge(json.loads(data) for data in retired + [data for _, data in stale])
+            conn.executemany("DELETE FROM metrics_snapshot WHERE worker = ?", [(worker,) for worker, _ in stale])
+            conn.execute(
+                "INSERT OR REPLACE INTO metrics_snapshot (worker, updated_at, data) VALUES (?, ?, ?)",
+                (RETIRED_WORKERS, now, json.dumps({
+                    "counters": [[name, dict(labels), value] for (name, labels), value in counters.items()],
+                    "histograms": [[name, dict(labels), values] for (name, labels), values in histograms.items()],
+                })),
+            )
+        return len(stale)
+
+    def _ensure_flusher(self) -> None:
+        # One daemon thread per process (started again in forked workers)
+        if not self.path or self._flusher_pid == os.getpid():
+            return
+        self._flusher_pid = os.getpid()
+
+        def _run():
+            while True:
+                time.sleep(self.flush_seconds)
+                # Also when nothing changed: the update time tells the worker is still running
+                try:
+                    self.flush()
+                except sqlite3.Error as e:
+                    print(f"Metrics flush failed: {e}")
+
+        threading.Thread(target=_run, name="metrics-flush", daemon=True).start()
+
+    def _snapshots(self) -> List[Dict[str, List[Any]]]:
+        if not self.path:
+            return [self.snapshot()]
+        self.flush()
+        with self._connect() as conn:
+            rows = conn.execute("SELECT data FROM metrics_snapshot").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    # -- exposition ----------------------------------------------------------
+
+    def collect(self) -> Tuple[Dict[Tuple[str, LabelKey], float], Dict[Tuple[str, LabelKey], List[float]]]:
+        """Sum the snapshots of all workers."""
+        return _merge(self._snapshots())
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text exposition format."""
+        counters, histograms = self.collect()
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+                continue
+            for (metric, labels), values in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0.0
+                for bound, count in zip(list(buckets) + ["+Inf"], values[:-2]):
+                    cumulative += count
+                    le = bound if bound == "+Inf" else _format_value(bound)
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {_format_value(cumulative)}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(values[-2])}")
+                lines.append(f"{name}_count{_format_labels(labels)} {_format_value(values[-1])}")
+        return "\n".join(lines) + "\n"
+
+
+def _merge(snapshots: Iterable[Dict[str, List[Any]]]) -> Tuple[Dict[Tuple[str, LabelKey], float],
+                                                                 Dict[Tuple[str, LabelKey], List[float]]]:
+    counters: Dict[Tuple[str, LabelKey], float] = {}
+    histograms: Dict[Tuple[str, LabelKey], List[float]] = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot["counters"]:
+            key = (name, _label_key(labels))
+            counters[key] = counters.get(key, 0.0) + value
+        for name, labels, values in snapshot["histograms"]:
+            key = (name, _label_key(labels))
+            total = histograms.setdefault(key, [0.0] * len(values))
+            for i, value in enumerate(values):
+                total[i] += value
+    return counters, histograms
+
+
+def _process_alive(worker: str) -> bool:
+    # Worker IDs are "<hostname>-<random>-<pid>"; processes of other hosts cannot be checked
+    parts = worker.rsplit("-", 2)
+    if len(parts) != 3 or parts[0] != socket.gethostname():
+        return True
+    pid = parts[2]
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError):
+        pass
+    return True
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: LabelKey) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value))
+
+
+# =============================================================================
+# LANGCHAIN CALLBACK
+# =============================================================================
+
+def token_cost(model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    """Estimated USD cost of a call, or None for models without a known price."""
+    prices = MODEL_PRICES_PER_MILLION.get(model)
+    if prices is None:
+        return None
+    return (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1e6
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """
+    Record latency, token usage, cost and errors of the chat model calls of a chain.
+
+    Attach it with `chain.with_config(callbacks=[LLMMetricsHandler(registry, "chain_eov")])`.
+    Calls are labeled with the chain name, the model and the HTTP route being served.
+    """
+
+    def __init__(self, registry: "MetricsRegistry", chain: str):
+        self.registry = registry
+        self.chain = chain
+        self._runs: Dict[Any, Tuple[float, Dict[str, str]]] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, kwargs: Dict[str, Any]) -> None:
+        params = kwargs.get("invocation_params") or {}
+        metadata = kwargs.get("metadata") or {}
+        model = params.get("model_name") or params.get("model") or metadata.get("ls_model_name") or "unknown"
+        labels = {"route": current_route.get() or "none", "chain": self.chain, "model": model}
+        with self._lock:
+            self._runs[run_id] = (time.perf_counter(), labels)
+
+    def _finish(self, run_id) -> Optional[Tuple[float, Dict[str, str]]]:
+        with self._lock:
+            started = self._runs.pop(run_id, None)
+        if started is None:
+            return None
+        start, labels = started
+        self.registry.inc("llm_requests_total", labels)
+        self.registry.observe("llm_request_duration_seconds", labels, time.perf_counter() - start)
+        return start, labels
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs: Any) -> None:
+        self._start(run_id, kwargs)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs: Any) -> None:
+        self._start(run_id, kwargs)
+
+    def on_llm_end(self, response: LLMResult, *, run_id, **kwargs: Any) -> None:
+        finished = self._finish(run_id)
+        if finished is None:
+            return
+        labels = finished[1]
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens")
+        completion_tokens = usage.get("completion_tokens")
+        if prompt_tokens is None:
+            # Streaming responses only carry usage on the message
+            message = getattr(response.generations[0][0], "message", None) if response.generations else None
+            usage_metadata = getattr(message, "usage_metadata", None) or {}
+            prompt_tokens = usage_metadata.get("input_tokens", 0)
+            completion_tokens = usage_metadata.get("output_tokens", 0)
+        self.registry.inc("llm_tokens_total", {**labels, "type": "prompt"}, prompt_tokens or 0)
+        self.registry.inc("llm_tokens_total", {**labels, "type": "completion"}, completion_tokens or 0)
+        cost = token_cost(labels["model"], prompt_tokens or 0, completion_tokens or 0)
+        if cost is not None:
+            self.registry.inc("llm_cost_usd_total", labels, cost)
+
+    def on_llm_error(self, error: BaseException, *, run_id, **kwargs: Any) -> None:
+        finished = self._finish(run_id)
+        if finished is not None:
+            self.registry.inc("llm_errors_total", {**finished[1], "error": type(error).__name__})
+
+
+# =============================================================================
+# ASGI MIDDLEWARE
+# =============================================================================
+
+def _route_template(scope) -> str:
+    """Path template of the application route matching a request, or "unmatched"."""
+    router = getattr(scope.get("app"), "router", None)
+    for route in getattr(router, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "unmatched")
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting HTTP requests and timing them until the body is fully sent.
+
+    Requests are labeled with the matched route template (e.g. /feedback/{feedback_id}),
+    so path parameters do not create new series. The template is resolved before the
+    request is routed so that the LLM calls it triggers carry the same route label.
+    """
+
+    def __init__(self, app, registry: "MetricsRegistry"):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = {"code": 500}
+        template = _route_template(scope)
+        token = current_route.set(template)
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            current_route.reset(token)
+            labels = {"route": getattr(scope.get("route"), "path", template), "method": scope["method"]}
+            self.registry.observe("http_request_duration_seconds", labels, time.perf_counter() - start)
+            self.registry.inc("http_requests_total", {**labels, "status": str(status["code"])})
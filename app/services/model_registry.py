@@ -0,0 +1,91 @@
+import hashlib
+import os
+import threading
+from typing import Any, Dict
+
+import mlflow
+import mlflow.langchain
+
+from app.services.tracking import experiment_cache
+
+
+# Experiment holding one run per distinct version of each chain
+MODEL_REGISTRY_EXPERIMENT = os.getenv("MODEL_REGISTRY_EXPERIMENT", "LangChain Models")
+
+
+def chain_version(chain_path: str, prompt: str, model: Any) -> str:
+    """
+    Hash the source, prompt and model configuration of a chain.
+
+    Args:
+        chain_path (str): Path of the chain module (models-from-code file).
+        prompt (str): System prompt of the chain.
+        model (ChatOpenAI): The chat model the chain calls.
+
+    Returns:
+        str: Hex digest identifying this version of the chain.
+    """
+    digest = hashlib.sha256()
+    with open(chain_path, "rb") as f:
+        digest.update(f.read())
+    for part in (prompt, getattr(model, "model_name", ""), getattr(model, "temperature", ""), getattr(model, "seed", "")):
+        digest.update(b"\x1f")
+        digest.update(str(part).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ChainModelRegistry:
+    """
+    Log each chain to MLflow once per version and hand out its model URI.
+
+    Versions already logged (by this or any other process) are found through the
+    `chain_name` and `chain_version` tags of the runs in `MODEL_REGISTRY_EXPERIMENT`.
+    """
+
+    def __init__(self, experiment_name: str = MODEL_REGISTRY_EXPERIMENT):
+        self.experiment_name = experiment_name
+        self._uris: Dict[tuple, str] = {}
+        self._lock = threading.Lock()
+
+    def model_uri(self, chain_name: str, chain_path: str, version: str) -> str:
+        """
+        Return the model URI of this chain version, logging the model first if needed.
+
+        Must be called outside of any active MLflow run.
+        """
+        key = (chain_name, version)
+        with self._lock:
+            if key in self._uris:
+                return self._uris[key]
+
+            experiment_id = experiment_cache.resolve(self.experiment_name)
+            runs = mlflow.search_runs(
+                experiment_ids=[experiment_id],
+                filter_string=(
+                    f"tags.chain_name = '{chain_name}' AND tags.chain_version = '{version}'"
+                    " AND attributes.status = 'FINISHED'"
+                ),
+                max_results=1,
+                output_format="list",
+            )
+            if runs:
+                uri = f"runs:/{runs[0].info.run_id}/langchain_model"
+            else:
+                with mlflow.start_run(
+                    experiment_id=experiment_id,
+                    run_name=f"{chain_name} {version[:12]}",
+                    tags={"chain_name": chain_name, "chain_version": version},
+                ):
+                    model_info = mlflow.langchain.log_model(
+                        lc_model=chain_path,
+                        artifact_path="langchain_model",
+                    )
+                    uri = model_info.model_uri
+                print(f"LangChain model {chain_name} logged once for version {version[:12]}: {uri}")
+
+            self._uris[key] = uri
+            return uri
+
+
+# Registry shared by the feedback logging functions
+chain_model_registry = ChainModelRegistry()
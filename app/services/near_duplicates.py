@@ -0,0 +1,312 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from pydantic import BaseModel
+
+from app.services.result_cache import RESULT_CACHE_PURGE_SECONDS, RESULT_CACHE_TTL_SECONDS, normalize_text
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+# Reuse the result of a prior document when the new one is nearly identical (new revision, light edits)
+NEAR_DUPLICATE_ENABLED = os.getenv("NEAR_DUPLICATE_ENABLED", "false").lower() in ("1", "true", "yes")
+NEAR_DUPLICATE_PATH = os.getenv("NEAR_DUPLICATE_PATH", "cache/near_duplicates.sqlite3")
+# Estimated Jaccard similarity of the word 5-grams above which a prior result is reused
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", 0.9))
+# Documents are kept for RESULT_CACHE_TTL_SECONDS like the exact cache, and the oldest are evicted past this count
+NEAR_DUPLICATE_MAX_DOCUMENTS = int(os.getenv("NEAR_DUPLICATE_MAX_DOCUMENTS", 50000))
+
+SHINGLE_WORDS = 5
+# Signature of NUM_HASHES values, split into LSH_BANDS bands of NUM_HASHES / LSH_BANDS rows: two
+# documents are compared when a band matches, i.e. almost always above ~0.8 similarity
+NUM_HASHES = 128
+LSH_BANDS = 16
+# Candidates sharing the most bands are compared, at most this many
+MAX_CANDIDATES = 32
+
+_ROWS = NUM_HASHES // LSH_BANDS
+_VALUE_BITS = 64 - (NUM_HASHES - 1).bit_length()
+_EMPTY = (1 << 64) - 1
+
+
+# =============================================================================
+# MINHASH
+# =============================================================================
+
+def _hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+def shingles(text: str, size: int = SHINGLE_WORDS) -> set:
+    """Distinct word n-grams of the normalized, lowercased text."""
+    words = normalize_text(text).lower().split()
+    if len(words) <= size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash_signature(text: str) -> Optional[array]:
+    """
+    MinHash signature of the word 5-grams of a text, or None if it has no words.
+
+    Uses one-permutation hashing: each shingle is hashed once, the low bits choose one of
+    NUM_HASHES bins and each bin keeps its minimum. Empty bins (short texts) borrow the
+    value of the next filled bin so that the signatures stay comparable. The fraction of
+    equal values estimates the Jaccard similarity of two texts.
+    """
+    items = shingles(text)
+    if not items:
+        return None
+    mins = [_EMPTY] * NUM_HASHES
+    for shingle in items:
+        h = _hash64(shingle.encode("utf-8"))
+        index = h & (NUM_HASHES - 1)
+        value = h >> (64 - _VALUE_BITS)
+        if value < mins[index]:
+            mins[index] = value
+    if _EMPTY in mins:
+        # Rotation densification: an empty bin takes the value of the next filled bin, offset
+        # by the distance to it so that it does not repeat that bin's own value
+        filled = list(mins)
+        for i in range(NUM_HASHES):
+            distance = 1
+            while filled[i] == _EMPTY and filled[(i + distance) % NUM_HASHES] == _EMPTY:
+                distance += 1
+            if filled[i] == _EMPTY:
+                mins[i] = filled[(i + distance) % NUM_HASHES] + (distance << _VALUE_BITS)
+    return array("Q", mins)
+
+
+def similarity(a: array, b: array) -> float:
+    return sum(1 for x, y in zip(a, b) if x == y) / NUM_HASHES
+
+
+def band_keys(scope: str, signature: array) -> List[int]:
+    """One bucket per band, as signed 64-bit integers (SQLite INTEGER keys)."""
+    prefix = scope.encode("utf-8") + b"\x00"
+    return [
+        int.from_bytes(hashlib.blake2b(prefix + bytes([band]) + signature[band * _ROWS:(band + 1) * _ROWS].tobytes(),
+                                       digest_size=8).digest(), "little", signed=True)
+        for band in range(LSH_BANDS)
+    ]
+
+
+# =============================================================================
+# INDEX
+# =============================================================================
+
+class NearDuplicateIndex:
+    """
+    Persistent MinHash/LSH index of processed documents and their chain results.
+
+    Documents are indexed per scope (chain namespace and fingerprint, so a prompt or
+    model change starts a new index). A lookup reads the LSH_BANDS buckets of the
+    query signature, compares the signatures of the candidates and returns the stored
+    result of the most similar one above the threshold. Shared by every worker on the
+    host through a local SQLite file.
+
+    As in `ResultCache`, documents expire `ttl_seconds` after being indexed and are
+    deleted at startup, then on a write at most every `purge_seconds`; the oldest
+    documents beyond `max_documents` are deleted at the same time.
+    """
+
+    def __init__(self, path: str = NEAR_DUPLICATE_PATH, threshold: float = NEAR_DUPLICATE_THRESHOLD,
+                 ttl_seconds: float = RESULT_CACHE_TTL_SECONDS,
+                 max_documents: int = NEAR_DUPLICATE_MAX_DOCUMENTS,
+                 purge_seconds: float = RESULT_CACHE_PURGE_SECONDS):
+        self.path = path
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_documents = max_documents
+        self.purge_seconds = purge_seconds
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._counters = {"hits": 0, "misses": 0, "indexed": 0, "purged": 0}
+        self._lock = threading.Lock()
+        self._next_purge = 0.0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS near_duplicate_documents ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " scope TEXT NOT NULL,"
+                " signature BLOB NOT NULL,"
+                " result BLOB NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS near_duplicate_bands ("
+                " bucket INTEGER NOT NULL,"
+                " document_id INTEGER NOT NULL,"
+                " PRIMARY KEY (bucket, document_id)) WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_near_duplicate_documents_created"
+                         " ON near_duplicate_documents (created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_near_duplicate_bands_document"
+                         " ON near_duplicate_bands (document_id)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def add(self, scope: str, signature: array, result: bytes) -> int:
+        with self._connect() as conn:
+            document_id = conn.execute(
+                "INSERT INTO near_duplicate_documents (scope, signature, result, created_at) VALUES (?, ?, ?, ?)",
+                (scope, signature.tobytes(), result, time.time()),
+            ).lastrowid
+            conn.executemany(
+                "INSERT OR IGNORE INTO near_duplicate_bands (bucket, document_id) VALUES (?, ?)",
+                [(bucket, document_id) for bucket in band_keys(scope, signature)],
+            )
+        self._count("indexed")
+        if time.time() >= self._next_purge:
+            self.purge_expired()
+        return document_id
+
+    def lookup(self, scope: str, signature: array) -> Optional[Tuple[int, float, bytes]]:
+        """Most similar indexed document at or above the threshold: (id, similarity, result), or None."""
+        conn = self._connect()
+        buckets = band_keys(scope, signature)
+        candidates = [row[0] for row in conn.execute(
+            f"SELECT document_id FROM near_duplicate_bands WHERE bucket IN ({', '.join('?' * len(buckets))})"
+            " GROUP BY document_id ORDER BY COUNT(*) DESC, document_id DESC LIMIT ?",
+            (*buckets, MAX_CANDIDATES),
+        )]
+        best = None
+        if candidates:
+            rows = conn.execute(
+                f"SELECT id, signature FROM near_duplicate_documents WHERE id IN ({', '.join('?' * len(candidates))})"
+                " AND scope = ? AND created_at >= ?",
+                (*candidates, scope, time.time() - self.ttl_seconds),
+            )
+            for document_id, blob in rows:
+                score = similarity(signature, array("Q", bytes(blob)))
+                if score >= self.threshold and (best is None or score > best[1]):
+                    best = (document_id, score)
+        if best is None:
+            self._count("misses")
+            return None
+        self._count("hits")
+        result = conn.execute("SELECT result FROM near_duplicate_documents WHERE id = ?", (best[0],)).fetchone()[0]
+        return best[0], best[1], bytes(result)
+
+    def purge_expired(self) -> int:
+        """Delete the expired documents and the oldest ones beyond `max_documents`; return how many were deleted."""
+        with self._lock:
+            self._next_purge = time.time() + self.purge_seconds
+        with self._connect() as conn:
+            ids = [row[0] for row in conn.execute(
+                "SELECT id FROM near_duplicate_documents WHERE created_at < ?"
+                " UNION SELECT id FROM (SELECT id FROM near_duplicate_documents ORDER BY id DESC LIMIT -1 OFFSET ?)",
+                (time.time() - self.ttl_seconds, self.max_documents),
+            )]
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                conn.execute(f"DELETE FROM near_duplicate_bands WHERE document_id IN ({placeholders})", chunk)
+                conn.execute(f"DELETE FROM near_duplicate_documents WHERE id IN ({placeholders})", chunk)
+        with self._lock:
+            self._counters["purged"] += len(ids)
+        if ids:
+            print(f"Near-duplicate index: {len(ids)} expired or evicted documents purged")
+        return len(ids)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counters)
+        stats["documents"] = self._connect().execute("SELECT COUNT(*) FROM near_duplicate_documents").fetchone()[0]
+        stats["threshold"] = self.threshold
+        stats["ttl_seconds"] = self.ttl_seconds
+        stats["max_documents"] = self.max_documents
+        return stats
+
+
+# =============================================================================
+# CHAIN WRAPPER
+# =============================================================================
+
+# Run metadata key of a dict the wrapper fills with {namespace: {"document_id", "similarity"}}
+NEAR_DUPLICATE_REPORT = "near_duplicates"
+
+
+def with_near_duplicate_reuse(chain: Runnable, *, index: NearDuplicateIndex, namespace: str,
+                              fingerprint: str, output_schema: Type[BaseModel]) -> Runnable:
+    """
+    Wrap a structured-output chain so nearly identical documents reuse a prior result.
+
+    Meant to sit inside `with_result_cache`: only documents missing from the exact cache
+    are looked up. Computed results are indexed; reused ones are not. The match is
+    reported in the run metadata dict NEAR_DUPLICATE_REPORT when the caller provides
+    one. The cache bypass header skips the lookup as well.
+
+    Args:
+        chain (Runnable): Chain taking {"text": ...} and returning an `output_schema` instance.
+        index (NearDuplicateIndex): Index shared by the wrapped chains.
+        namespace (str): Distinguishes chains sharing the same index.
+        fingerprint (str): See `chain_fingerprint`.
+        output_schema (Type[BaseModel]): Pydantic model the chain returns.
+
+    Returns:
+        Runnable: A runnable exposing the same input/output schemas as `chain`.
+    """
+    scope = f"{namespace}:{fingerprint}"
+
+    def _lookup(inputs: Dict[str, Any], config: RunnableConfig):
+        signature = minhash_signature(inputs["text"])
+        metadata = config.get("metadata") or {}
+        if signature is None or metadata.get("cache_bypass"):
+            return signature, None
+        match = index.lookup(scope, signature)
+        if match is None:
+            return signature, None
+        document_id, score, payload = match
+        print(f"{namespace}: reusing the result of near-duplicate document {document_id} (similarity {score:.3f})")
+        report = metadata.get(NEAR_DUPLICATE_REPORT)
+        if isinstance(report, dict):
+            report[namespace] = {"document_id": document_id, "similarity": round(score, 4)}
+        return signature, output_schema.model_validate_json(payload)
+
+    def _store(signature: Optional[array], result: BaseModel) -> None:
+        if signature is not None:
+            index.add(scope, signature, result.model_dump_json().encode("utf-8"))
+
+    def _invoke(inputs: Dict[str, Any], config: RunnableConfig):
+        signature, reused = _lookup(inputs, config)
+        if reused is not None:
+            return reused
+        result = chain.invoke(inputs, config)
+        _store(signature, result)
+        return result
+
+    async def _ainvoke(inputs: Dict[str, Any], config: RunnableConfig):
+        signature, reused = await asyncio.to_thread(_lookup, inputs, config)
+        if reused is not None:
+            return reused
+        result = await chain.ainvoke(inputs, config)
+        await asyncio.to_thread(_store, signature, result)
+        return result
+
+    return RunnableLambda(_invoke, afunc=_ainvoke, name=f"near_duplicate_{namespace}").with_types(
+        input_type=chain.get_input_schema(),
+        output_type=output_schema,
+    )
@@ -0,0 +1,426 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, Iterator, List, Optional
+
+from langchain_core.messages import BaseMessage
+from langchain_openai import ChatOpenAI
+
+from app.utils.tokens import estimate_tokens
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+# Account limits for the model, per API process (divide the account limits by the number
+# of uvicorn workers). 0 disables the corresponding bucket.
+OPENAI_TPM_LIMIT = int(os.getenv("OPENAI_TPM_LIMIT", 800000))
+OPENAI_RPM_LIMIT = int(os.getenv("OPENAI_RPM_LIMIT", 5000))
+# Bounds of the adaptive number of concurrent calls
+OPENAI_MIN_CONCURRENCY = int(os.getenv("OPENAI_MIN_CONCURRENCY", 1))
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", 16))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", 6))
+# Completion tokens counted against the TPM bucket before the real usage is known
+OPENAI_COMPLETION_TOKENS_ESTIMATE = int(os.getenv("OPENAI_COMPLETION_TOKENS_ESTIMATE", 1000))
+
+# The limit is lowered when recent latency exceeds this multiple of the long-run latency
+LATENCY_TOLERANCE = 2.0
+# Multiplicative decreases (on 429 and on latency) and their minimum spacing
+THROTTLE_DECREASE = 0.5
+LATENCY_DECREASE = 0.9
+DECREASE_COOLDOWN_SECONDS = 2.0
+RETRY_BASE_SECONDS = 1.0
+RETRY_MAX_SECONDS = 60.0
+# Upper bound of a wait before a waiter re-checks the limits
+MAX_WAIT_SECONDS = 1.0
+
+
+# =============================================================================
+# ERROR CLASSIFICATION
+# =============================================================================
+
+def _status_code(error: BaseException) -> Optional[int]:
+    return getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    # An exhausted quota is also a 429, but waiting does not help
+    return _status_code(error) == 429 and getattr(error, "code", None) != "insufficient_quota"
+
+
+def is_transient(error: BaseException) -> bool:
+    status = _status_code(error)
+    return (status is not None and status >= 500) or type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Delay requested by the server in `retry-after-ms` or `retry-after`, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+# =============================================================================
+# LIMITERS
+# =============================================================================
+
+class TokenBucket:
+    """Refills at `per_minute` / 60 units per second, up to one minute of capacity."""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60
+        self.capacity = per_minute
+        self.tokens = float(per_minute)
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, cost: float, now: float) -> float:
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        cost = min(cost, self.capacity)
+        return 0.0 if self.tokens >= cost else (cost - self.tokens) / self.rate
+
+    def take(self, cost: float) -> None:
+        if self.rate > 0:
+            self.tokens -= min(cost, self.capacity)
+
+    def adjust(self, delta: float) -> None:
+        """Charge (positive) or refund (negative) the difference with the estimated cost."""
+        if self.rate > 0:
+            self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class _Waiter:
+    __slots__ = ("cost", "event", "loop")
+
+    def __init__(self, cost: float, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.cost = cost
+        self.loop = loop
+        self.event = asyncio.Event() if loop is not None else threading.Event()
+
+    def wake(self) -> None:
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.event.set)
+        else:
+            self.event.set()
+
+
+class AdaptiveRateController:
+    """
+    Client-side admission control for the calls to one OpenAI model.
+
+    Calls wait in a single FIFO queue shared by threads and event loops, and are
+    admitted when:
+    - fewer than `limit` calls are in flight. The limit follows AIMD: +1/limit per
+      successful call, halved on a 429 and lowered by 10% when recent latency
+      exceeds LATENCY_TOLERANCE times the long-run latency;
+    - the requests-per-minute and tokens-per-minute buckets cover the call
+      (estimated prompt tokens plus OPENAI_COMPLETION_TOKENS_ESTIMATE, corrected
+      with the reported usage);
+    - no Retry-After pause is in effect. A 429 pauses every caller, not just the
+      one that received it, which avoids retry storms.
+
+    Rate-limited and transient failures are retried with jittered backoff, ahead of
+    newer calls.
+    """
+
+    def __init__(self, tpm: int = OPENAI_TPM_LIMIT, rpm: int = OPENAI_RPM_LIMIT,
+                 min_concurrency: int = OPENAI_MIN_CONCURRENCY, max_concurrency: int = OPENAI_MAX_CONCURRENCY,
+                 max_retries: int = OPENAI_MAX_RETRIES, initial_concurrency: Optional[int] = None):
+        self.tokens = TokenBucket(tpm)
+        self.requests = TokenBucket(rpm)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.limit = float(initial_concurrency or max(min_concurrency, max_concurrency // 2))
+        self.in_flight = 0
+        self._waiters: Deque[_Waiter] = deque()
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._latency_fast: Optional[float] = None
+        self._latency_slow: Optional[float] = None
+        self._counters = {"calls": 0, "throttled": 0, "retries": 0, "errors": 0}
+
+    # -- admission -----------------------------------------------------------
+
+    def _admit(self, waiter: _Waiter) -> Optional[float]:
+        """Under the lock: admit `waiter` (0.0), or return how long to wait (None: until woken)."""
+        if self._waiters[0] is not waiter or self.in_flight >= int(self.limit):
+            return None
+        now = time.monotonic()
+        delay = max(self._paused_until - now, self.requests.wait_time(1, now), self.tokens.wait_time(waiter.cost, now))
+        if delay > 0:
+            return delay
+        self.requests.take(1)
+        self.tokens.take(waiter.cost)
+        self.in_flight += 1
+        self._waiters.popleft()
+        self._wake_head()
+        return 0.0
+
+    def _wake_head(self) -> None:
+        if self._waiters:
+            self._waiters[0].wake()
+
+    def _enqueue(self, waiter: _Waiter, retry: bool) -> None:
+        # Retries go first: they have already waited once
+        with self._lock:
+            if retry:
+                self._waiters.appendleft(waiter)
+            else:
+                self._waiters.append(waiter)
+            self._wake_head()
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        with self._lock:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+                self._wake_head()
+
+    def acquire(self, cost: float, retry: bool = False) -> None:
+        waiter = _Waiter(cost)
+        self._enqueue(waiter, retry)
+        try:
+            while True:
+                with self._lock:
+                    delay = self._admit(waiter)
+                if delay == 0:
+                    return
+                waiter.event.wait(min(delay or MAX_WAIT_SECONDS, MAX_WAIT_SECONDS))
+                waiter.event.clear()
+        except BaseException:
+            self._abandon(waiter)
+            raise
+
+    async def aacquire(self, cost: float, retry: bool = False) -> None:
+        waiter = _Waiter(cost, asyncio.get_running_loop())
+        self._enqueue(waiter, retry)
+        try:
+            while True:
+                with self._lock:
+                    delay = self._admit(waiter)
+                if delay == 0:
+                    return
+                try:
+                    await asyncio.wait_for(waiter.event.wait(), min(delay or MAX_WAIT_SECONDS, MAX_WAIT_SECONDS))
+                except asyncio.TimeoutError:
+                    pass
+                waiter.event.clear()
+        except BaseException:
+            self._abandon(waiter)
+            raise
+
+    def release(self, latency: float, error: Optional[BaseException] = None,
+                token_delta: float = 0.0) -> None:
+        """Record the outcome of an admitted call and adapt the concurrency limit."""
+        with self._lock:
+            self.in_flight -= 1
+            self._counters["calls"] += 1
+            self.tokens.adjust(token_delta)
+            now = time.monotonic()
+            if error is not None and is_rate_limited(error):
+                self._counters["throttled"] += 1
+                pause = retry_after_seconds(error) or RETRY_BASE_SECONDS
+                self._paused_until = max(self._paused_until, now + pause)
+                self._decrease(THROTTLE_DECREASE, now)
+                print(f"OpenAI rate limit hit: pausing {pause:.1f}s, concurrency limit {self.limit:.1f}")
+            elif error is not None:
+                self._counters["errors"] += 1
+            else:
+                self._observe_latency(latency, now)
+            self._wake_head()
+
+    def _decrease(self, factor: float, now: float) -> None:
+        # Calls that were already in flight report the same congestion: decrease once per cooldown
+        if now - self._last_decrease >= DECREASE_COOLDOWN_SECONDS:
+            self.limit = max(float(self.min_concurrency), self.limit * factor)
+            self._last_decrease = now
+
+    def _observe_latency(self, latency: float, now: float) -> None:
+        if self._latency_slow is None:
+            self._latency_fast = self._latency_slow = latency
+        else:
+            self._latency_fast += 0.3 * (latency - self._latency_fast)
+            self._latency_slow += 0.02 * (latency - self._latency_slow)
+        if self._latency_fast > LATENCY_TOLERANCE * self._latency_slow:
+            self._decrease(LATENCY_DECREASE, now)
+        else:
+            self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._counters,
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "waiting": len(self._waiters),
+                "paused_seconds": round(max(self._paused_until - time.monotonic(), 0.0), 3),
+            }
+
+    # -- calls ---------------------------------------------------------------
+
+    def _should_retry(self, error: BaseException, attempt: int) -> bool:
+        if attempt >= self.max_retries or not (is_rate_limited(error) or is_transient(error)):
+            return False
+        with self._lock:
+            self._counters["retries"] += 1
+        return True
+
+    @staticmethod
+    def _backoff(error: BaseException, attempt: int) -> float:
+        # Rate-limited calls already wait for the shared pause when they are re-admitted
+        if is_rate_limited(error):
+            return 0.0
+        return random.uniform(0.5, 1.0) * min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt)
+
+    def call(self, fn: Callable[[], Any], cost: float, usage: Callable[[Any], Optional[int]] = lambda _: None) -> Any:
+        """Run `fn` once admitted, retrying rate-limited and transient failures."""
+        for attempt in range(self.max_retries + 1):
+            self.acquire(cost, retry=attempt > 0)
+            start = time.monotonic()
+            try:
+                result = fn()
+            except Exception as e:
+                self.release(time.monotonic() - start, error=e)
+                if not self._should_retry(e, attempt):
+                    raise
+                time.sleep(self._backoff(e, attempt))
+                continue
+            used = usage(result)
+            self.release(time.monotonic() - start, token_delta=used - cost if used else 0.0)
+            return result
+
+    async def acall(self, fn: Callable[[], Awaitable[Any]], cost: float,
+                    usage: Callable[[Any], Optional[int]] = lambda _: None) -> Any:
+        for attempt in range(self.max_retries + 1):
+            await self.aacquire(cost, retry=attempt > 0)
+            start = time.monotonic()
+            try:
+                result = await fn()
+            except Exception as e:
+                self.release(time.monotonic() - start, error=e)
+                if not self._should_retry(e, attempt):
+                    raise
+                await asyncio.sleep(self._backoff(e, attempt))
+                continue
+            used = usage(result)
+            self.release(time.monotonic() - start, token_delta=used - cost if used else 0.0)
+            return result
+
+    def stream(self, open_stream: Callable[[], Iterator[Any]], cost: float) -> Iterator[Any]:
+        """Like `call` for a streamed response; only failures before the first chunk are retried."""
+        for attempt in range(self.max_retries + 1):
+            self.acquire(cost, retry=attempt > 0)
+            start, started, released = time.monotonic(), False, False
+            try:
+                for chunk in open_stream():
+                    started = True
+                    yield chunk
+            except Exception as e:
+                released = True
+                self.release(time.monotonic() - start, error=e)
+                if started or not self._should_retry(e, attempt):
+                    raise
+                time.sleep(self._backoff(e, attempt))
+                continue
+            finally:
+                if not released:
+                    self.release(time.monotonic() - start)
+            return
+
+    async def astream(self, open_stream: Callable[[], AsyncIterator[Any]], cost: float) -> AsyncIterator[Any]:
+        for attempt in range(self.max_retries + 1):
+            await self.aacquire(cost, retry=attempt > 0)
+            start, started, released = time.monotonic(), False, False
+            try:
+                async for chunk in open_stream():
+                    started = True
+                    yield chunk
+            except Exception as e:
+                released = True
+                self.release(time.monotonic() - start, error=e)
+                if started or not self._should_retry(e, attempt):
+                    raise
+                await asyncio.sleep(self._backoff(e, attempt))
+                continue
+            finally:
+                if not released:
+                    self.release(time.monotonic() - start)
+            return
+
+
+# =============================================================================
+# CHAT MODEL
+# =============================================================================
+
+_controllers: Dict[str, AdaptiveRateController] = {}
+_controllers_lock = threading.Lock()
+
+
+def controller_for(model_name: str) -> AdaptiveRateController:
+    """Return the controller shared by every chat model instance of `model_name` in this process."""
+    with _controllers_lock:
+        if model_name not in _controllers:
+            _controllers[model_name] = AdaptiveRateController()
+        return _controllers[model_name]
+
+
+def _total_tokens(result) -> Optional[int]:
+    return ((getattr(result, "llm_output", None) or {}).get("token_usage") or {}).get("total_tokens")
+
+
+class RateControlledChatOpenAI(ChatOpenAI):
+    """
+    `ChatOpenAI` whose calls are admitted by the `AdaptiveRateController` of its model.
+
+    Retries are done by the controller, so the OpenAI client's own retries are off.
+    """
+
+    max_retries: int = 0
+
+    def _call_cost(self, messages: List[BaseMessage]) -> float:
+        prompt = sum(estimate_tokens(m.content if isinstance(m.content, str) else str(m.content)) for m in messages)
+        return prompt + (self.max_tokens or OPENAI_COMPLETION_TOKENS_ESTIMATE)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return controller_for(self.model_name).call(
+            lambda: ChatOpenAI._generate(self, messages, stop, run_manager, **kwargs),
+            self._call_cost(messages), usage=_total_tokens,
+        )
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        return await controller_for(self.model_name).acall(
+            lambda: ChatOpenAI._agenerate(self, messages, stop, run_manager, **kwargs),
+            self._call_cost(messages), usage=_total_tokens,
+        )
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        yield from controller_for(self.model_name).stream(
+            lambda: ChatOpenAI._stream(self, messages, stop, run_manager, **kwargs), self._call_cost(messages),
+        )
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        async for chunk in controller_for(self.model_name).astream(
+            lambda: ChatOpenAI._astream(self, messages, stop, run_manager, **kwargs), self._call_cost(messages),
+        ):
+            yield chunk
@@ -0,0 +1,314 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Type
+
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+from pydantic import BaseModel
+
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "cache/result_cache.sqlite3")
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+RESULT_CACHE_MEMORY_BYTES = int(os.getenv("RESULT_CACHE_MEMORY_BYTES", 64 * 1024 * 1024))
+# Expired rows are deleted from the SQLite file at startup, then on a write at most this often
+RESULT_CACHE_PURGE_SECONDS = float(os.getenv("RESULT_CACHE_PURGE_SECONDS", 3600))
+
+# Header a client can send to force a fresh LLM call (the result is still stored)
+CACHE_BYPASS_HEADER = "X-Cache-Bypass"
+
+
+# =============================================================================
+# KEY HELPERS
+# =============================================================================
+
+def normalize_text(text: str) -> str:
+    """
+    Normalize document text so trivially different submissions share a cache key.
+
+    Applies Unicode NFC normalization and collapses every whitespace run to a single space.
+    """
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def chain_fingerprint(prompt: str, model: Any) -> str:
+    """
+    Hash everything about a chain that changes its output for a given text.
+
+    Args:
+        prompt (str): The system prompt of the chain.
+        model (ChatOpenAI): The chat model the chain calls.
+
+    Returns:
+        str: Hex digest of the prompt, model name, temperature and seed.
+    """
+    parts = [
+        prompt,
+        str(getattr(model, "model_name", "")),
+        str(getattr(model, "temperature", "")),
+        str(getattr(model, "seed", "")),
+    ]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+def cache_key(namespace: str, fingerprint: str, text: str) -> str:
+    digest = hashlib.sha256()
+    for part in (namespace, fingerprint, normalize_text(text)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+# =============================================================================
+# CACHE TIERS
+# =============================================================================
+
+class MemoryTier:
+    """In-process LRU keyed by cache key, evicting by total payload size."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, payload = entry
+            if expires_at < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    def set(self, key: str, payload: bytes, expires_at: float) -> None:
+        if len(payload) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, payload)
+            self.current_bytes += len(payload)
+            while self.current_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key: str) -> None:
+        _, payload = self._entries.pop(key)
+        self.current_bytes -= len(payload)
+
+
+class SQLiteTier:
+    """Persistent tier in a local SQLite file, shared by every worker on the host."""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS result_cache ("
+                " key TEXT PRIMARY KEY,"
+                " payload BLOB NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_result_cache_expires ON result_cache (expires_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[tuple]:
+        row = self._connect().execute(
+            "SELECT payload, expires_at FROM result_cache WHERE key = ? AND expires_at >= ?",
+            (key, time.time()),
+        ).fetchone()
+        return (bytes(row[0]), row[1]) if row else None
+
+    def set(self, key: str, payload: bytes, expires_at: float) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO result_cache (key, payload, created_at, expires_at) VALUES (?, ?, ?, ?)",
+                (key, payload, time.time(), expires_at),
+            )
+
+    def purge_expired(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM result_cache WHERE expires_at < ?", (time.time(),)).rowcount
+
+    def clear(self) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM result_cache")
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM result_cache").fetchone()[0]
+
+
+class ResultCache:
+    """
+    Two-tier cache for chain results: an in-process LRU in front of a shared SQLite file.
+
+    Values are opaque bytes; callers are responsible for serialization.
+    """
+
+    def __init__(self, path: Optional[str] = RESULT_CACHE_PATH,
+                 ttl_seconds: float = RESULT_CACHE_TTL_SECONDS,
+                 memory_bytes: int = RESULT_CACHE_MEMORY_BYTES,
+                 purge_seconds: float = RESULT_CACHE_PURGE_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.purge_seconds = purge_seconds
+        self.memory = MemoryTier(memory_bytes)
+        self.disk = SQLiteTier(path) if path else None
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bypasses": 0, "writes": 0, "purged": 0}
+        self._lock = threading.Lock()
+        self._next_purge = 0.0
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def count_bypass(self) -> None:
+        self._count("bypasses")
+
+    def get(self, key: str) -> Optional[bytes]:
+        payload = self.memory.get(key)
+        if payload is not None:
+            self._count("memory_hits")
+            return payload
+        if self.disk is not None:
+            row = self.disk.get(key)
+            if row is not None:
+                payload, expires_at = row
+                self.memory.set(key, payload, expires_at)
+                self._count("disk_hits")
+                return payload
+        self._count("misses")
+        return None
+
+    def set(self, key: str, payload: bytes) -> None:
+        expires_at = time.time() + self.ttl_seconds
+        self.memory.set(key, payload, expires_at)
+        if self.disk is not None:
+            self.disk.set(key, payload, expires_at)
+        self._count("writes")
+        if time.time() >= self._next_purge:
+            self.purge_expired()
+
+    def purge_expired(self) -> int:
+        """Delete the expired rows of the SQLite file and return how many were deleted."""
+        with self._lock:
+            self._next_purge = time.time() + self.purge_seconds
+        if self.disk is None:
+            return 0
+        purged = self.disk.purge_expired()
+        with self._lock:
+            self._counters["purged"] += purged
+        if purged:
+            print(f"Result cache: {purged} expired entries purged")
+        return purged
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def counters(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.counters()
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0
+        stats["memory_entries"] = len(self.memory)
+        stats["memory_bytes"] = self.memory.current_bytes
+        stats["memory_evictions"] = self.memory.evictions
+        stats["disk_entries"] = len(self.disk) if self.disk is not None else 0
+        stats["ttl_seconds"] = self.ttl_seconds
+        return stats
+
+
+# =============================================================================
+# CHAIN WRAPPER
+# =============================================================================
+
+def with_result_cache(chain: Runnable, *, cache: ResultCache, namespace: str,
+                      fingerprint: str, output_schema: Type[BaseModel]) -> Runnable:
+    """
+    Wrap a structured-output chain so identical documents are answered from the cache.
+
+    Args:
+        chain (Runnable): Chain taking {"text": ...} and returning an `output_schema` instance.
+        cache (ResultCache): Cache shared by the wrapped chains.
+        namespace (str): Distinguishes chains sharing the same cache.
+        fingerprint (str): See `chain_fingerprint`.
+        output_schema (Type[BaseModel]): Pydantic model the chain returns.
+
+    Returns:
+        Runnable: A runnable exposing the same input/output schemas as `chain`.
+    """
+
+    def _lookup(inputs: Dict[str, Any], config: RunnableConfig):
+        key = cache_key(namespace, fingerprint, inputs["text"])
+        if (config.get("metadata") or {}).get("cache_bypass"):
+            cache.count_bypass()
+            return key, None
+        payload = cache.get(key)
+        return key, (output_schema.model_validate_json(payload) if payload is not None else None)
+
+    def _invoke(inputs: Dict[str, Any], config: RunnableConfig):
+        key, cached = _lookup(inputs, config)
+        if cached is not None:
+            return cached
+        result = chain.invoke(inputs, config)
+        cache.set(key, result.model_dump_json().encode("utf-8"))
+        return result
+
+    async def _ainvoke(inputs: Dict[str, Any], config: RunnableConfig):
+        key, cached = await asyncio.to_thread(_lookup, inputs, config)
+        if cached is not None:
+            return cached
+        result = await chain.ainvoke(inputs, config)
+        await asyncio.to_thread(cache.set, key, result.model_dump_json().encode("utf-8"))
+        return result
+
+    return RunnableLambda(_invoke, afunc=_ainvoke, name=f"cached_{namespace}").with_types(
+        input_type=chain.get_input_schema(),
+        output_type=output_schema,
+    )
+
+
+def cache_bypass_modifier(config: Dict[str, Any], request) -> Dict[str, Any]:
+    """LangServe `per_req_config_modifier` turning the bypass header into run metadata."""
+    if request.headers.get(CACHE_BYPASS_HEADER, "").lower() in ("1", "true", "yes"):
+        config.setdefault("metadata", {})["cache_bypass"] = True
+    return config
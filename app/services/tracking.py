@@ -0,0 +1,249 @@
+import csv
+import io
+import json
+import os
+import posixpath
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import yaml
+from mlflow.entities import Metric, Param, RunTag
+from mlflow.exceptions import MlflowException
+from mlflow.tracking import MlflowClient
+from mlflow.utils.mlflow_tags import MLFLOW_LOGGED_ARTIFACTS
+
+
+# =============================================================================
+# EXPERIMENT RESOLUTION
+# =============================================================================
+
+class ExperimentCache:
+    """
+    Resolve experiment names to IDs once per process.
+
+    Deleted experiments are restored and missing ones created, as the feedback
+    endpoints always did. Call `invalidate` when an ID stops working.
+    """
+
+    def __init__(self, client: Optional[MlflowClient] = None):
+        self._client = client
+        self._lazy_client = client is None
+        self._ids: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> MlflowClient:
+        # Created lazily so the tracking URI set at startup is picked up
+        if self._client is None:
+            self._client = MlflowClient()
+        return self._client
+
+    def resolve(self, name: str) -> str:
+        with self._lock:
+            if name in self._ids:
+                return self._ids[name]
+            experiment = self.client.get_experiment_by_name(name)
+            if experiment and experiment.lifecycle_stage == "deleted":
+                self.client.restore_experiment(experiment.experiment_id)
+                experiment_id = experiment.experiment_id
+            elif experiment:
+                experiment_id = experiment.experiment_id
+            else:
+                experiment_id = self.client.create_experiment(name)
+            self._ids[name] = experiment_id
+            return experiment_id
+
+    def invalidate(self, name: str) -> None:
+        with self._lock:
+            self._ids.pop(name, None)
+
+    def clear(self) -> None:
+        """Forget all IDs, and the lazily created client so the current tracking URI is used again."""
+        with self._lock:
+            self._ids.clear()
+            if self._lazy_client:
+                self._client = None
+
+
+# =============================================================================
+# BATCHED RUN
+# =============================================================================
+
+class BatchedRun:
+    """
+    Collect the params, metrics and tags of a run and send them in one `log_batch`.
+
+    Mirrors the `mlflow.log_*` names used by the endpoints. Artifacts (`log_dict`,
+    `log_text`, `log_csv`, `log_table`) are serialized in memory and uploaded together
+    on flush, from a directory private to the run: concurrent runs never share a file.
+    """
+
+    def __init__(self, client: MlflowClient, run_id: str):
+        self.client = client
+        self.run_id = run_id
+        self._params: Dict[str, str] = {}
+        self._metrics: Dict[str, float] = {}
+        self._tags: Dict[str, str] = {}
+        self._artifacts: Dict[str, bytes] = {}
+        self._tables: List[str] = []
+
+    def log_param(self, key: str, value: Any) -> None:
+        self._params[key] = str(value)
+
+    def log_params(self, params: Dict[str, Any]) -> None:
+        for key, value in params.items():
+            self.log_param(key, value)
+
+    def log_metric(self, key: str, value: float) -> None:
+        self._metrics[key] = float(value)
+
+    def log_metrics(self, metrics: Dict[str, float]) -> None:
+        for key, value in metrics.items():
+            self.log_metric(key, value)
+
+    def set_tag(self, key: str, value: Any) -> None:
+        self._tags[key] = str(value)
+
+    def set_tags(self, tags: Dict[str, Any]) -> None:
+        for key, value in tags.items():
+            self.set_tag(key, value)
+
+    def log_text(self, text: str, artifact_file: str) -> None:
+        self._artifacts[_artifact_key(artifact_file)] = text.encode("utf-8")
+
+    def log_dict(self, dictionary: Any, artifact_file: str) -> None:
+        """Same file content as `mlflow.log_dict` (YAML for .yml/.yaml files, indented JSON otherwise)."""
+        if os.path.splitext(artifact_file)[1] in (".yml", ".yaml"):
+            text = yaml.dump(dictionary, indent=2, default_flow_style=False)
+        else:
+            text = json.dumps(dictionary, indent=2, default=str)
+        self.log_text(text, artifact_file)
+
+    def log_csv(self, rows: List[Dict[str, Any]], artifact_file: str) -> None:
+        """Log records as a CSV file, with one column per key in order of appearance."""
+        columns = list(dict.fromkeys(key for row in rows for key in row))
+        buffer = io.StringIO(newline="")
+        if columns:
+            writer = csv.DictWriter(buffer, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(rows)
+        self.log_text(buffer.getvalue(), artifact_file)
+
+    def log_table(self, data: Dict[str, List[Any]], artifact_file: str) -> None:
+        """Log columns as a table readable by `mlflow.load_table` (pandas "split" JSON)."""
+        if not artifact_file.endswith(".json"):
+            raise ValueError(f"Tables are logged as JSON, got '{artifact_file}'")
+        table = {"columns": list(data), "data": [list(row) for row in zip(*data.values())]}
+        self.log_text(json.dumps(table, default=str), artifact_file)
+        path = _artifact_key(artifact_file)
+        if path not in self._tables:
+            self._tables.append(path)
+
+    def log_artifact(self, local_path: str, artifact_path: Optional[str] = None) -> None:
+        """Upload an existing file now (prefer the in-memory methods above)."""
+        self.client.log_artifact(self.run_id, local_path, artifact_path)
+
+    def flush(self) -> None:
+        """Upload the artifacts in one call, then send the params, metrics and tags in one request."""
+        self._flush_artifacts()
+        if not (self._params or self._metrics or self._tags):
+            return
+        timestamp = int(time.time() * 1000)
+        self.client.log_batch(
+            self.run_id,
+            metrics=[Metric(key, value, timestamp, 0) for key, value in self._metrics.items()],
+            params=[Param(key, value) for key, value in self._params.items()],
+            tags=[RunTag(key, value) for key, value in self._tags.items()],
+        )
+        self._params, self._metrics, self._tags = {}, {}, {}
+
+    def _flush_artifacts(self) -> None:
+        if not self._artifacts:
+            return
+        # The artifact repositories upload local files: lay them out in a directory private to this run
+        with tempfile.TemporaryDirectory(prefix="mlflow_artifacts_") as directory:
+            for artifact_file, content in self._artifacts.items():
+                path = os.path.join(directory, *artifact_file.split("/"))
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "wb") as f:
+                    f.write(content)
+            self.client.log_artifacts(self.run_id, directory)
+        if self._tables:
+            # What `MlflowClient.log_table` records, so the tables show in the MLflow UI evaluation view
+            self.set_tag(MLFLOW_LOGGED_ARTIFACTS, json.dumps([{"path": path, "type": "table"} for path in self._tables]))
+        self._artifacts, self._tables = {}, []
+
+
+def _artifact_key(artifact_file: str) -> str:
+    path = posixpath.normpath(artifact_file)
+    if path.startswith(("/", "../")) or path in ("", ".", ".."):
+        raise ValueError(f"Invalid artifact file path '{artifact_file}'")
+    return path
+
+
+# =============================================================================
+# ENTRY POINT
+# =============================================================================
+
+experiment_cache = ExperimentCache()
+
+# Tag holding the idempotency key of a run (see `batched_run`)
+IDEMPOTENCY_KEY_TAG = "idempotency_key"
+
+
+@contextmanager
+def batched_run(experiment_name: str, run_name: str, tags: Optional[Dict[str, Any]] = None,
+                cache: ExperimentCache = experiment_cache,
+                idempotency_key: Optional[str] = None) -> Iterator[BatchedRun]:
+    """
+    Start a run in `experiment_name` and log everything collected in it on exit.
+
+    Unlike `mlflow.start_run`, this does not touch the process-wide active
+    experiment, so concurrent feedback workers cannot log into each other's
+    experiments. A cached experiment ID that no longer works is resolved again once.
+
+    With an `idempotency_key`, a run of the experiment already tagged with that key is
+    resumed instead of creating another one, so retrying a failed or interrupted log
+    (same params, artifacts overwritten) still leaves a single run.
+
+    Args:
+        experiment_name (str): Experiment to log into; created or restored if needed.
+        run_name (str): Display name of the run.
+        tags (dict, optional): Tags set when the run is created.
+        idempotency_key (str, optional): Identifies the logged item across retries.
+
+    Yields:
+        BatchedRun: Collects params, metrics and tags for the run.
+    """
+    client = cache.client
+    run_tags = {key: str(value) for key, value in (tags or {}).items()}
+    if idempotency_key is not None:
+        run_tags[IDEMPOTENCY_KEY_TAG] = idempotency_key
+
+    def _start_run(experiment_id: str):
+        if idempotency_key is not None:
+            runs = client.search_runs([experiment_id], f"tags.{IDEMPOTENCY_KEY_TAG} = '{idempotency_key}'",
+                                      max_results=1)
+            if runs:
+                print(f"Resuming MLflow run {runs[0].info.run_id} of {idempotency_key}")
+                client.update_run(runs[0].info.run_id, "RUNNING")
+                return runs[0].info
+        return client.create_run(experiment_id, run_name=run_name, tags=run_tags).info
+
+    try:
+        run_info = _start_run(cache.resolve(experiment_name))
+    except MlflowException:
+        cache.invalidate(experiment_name)
+        run_info = _start_run(cache.resolve(experiment_name))
+
+    run = BatchedRun(client, run_info.run_id)
+    try:
+        yield run
+        run.flush()
+    except Exception:
+        client.set_terminated(run_info.run_id, "FAILED")
+        raise
+    client.set_terminated(run_info.run_id, "FINISHED")
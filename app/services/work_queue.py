@@ -0,0 +1,228 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sentry_sdk import capture_exception
+
+
+# =============================================================================
+# LEASED QUEUE
+# =============================================================================
+
+class LeasedWorkQueue:
+    """
+    Work items in a table of a local SQLite file, claimed atomically with a lease.
+
+    Safe to share between threads and between uvicorn workers on the same host: a
+    claimed item stays 'processing' until its lease expires, then it is handed out
+    again, so the work held by a stopped worker is resumed. A failed item is retried
+    with a jittered exponential backoff, then parked as failed after `max_attempts`.
+
+    Subclasses create `table` in `_create_schema`, with the columns status, attempts,
+    available_at, finished_at and `error_column`, and identify an item by the values
+    of its `key_columns`.
+    """
+
+    table: str
+    key_columns: Tuple[str, ...]
+    error_column = "error"
+    retry_base_seconds = 2.0
+    retry_max_seconds = 300.0
+
+    def __init__(self, path: str, max_attempts: int, lease_seconds: float):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.available = threading.Event()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._create_schema(conn)
+
+    def _create_schema(self, conn: sqlite3.Connection) -> None:
+        raise NotImplementedError
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Take the next item with `claim_item` and return it as the workers expect it, or None."""
+        raise NotImplementedError
+
+    def _where_key(self) -> str:
+        return " AND ".join(f"{column} = ?" for column in self.key_columns)
+
+    def claim_item(self, columns: Sequence[str]) -> Optional[Dict[str, Any]]:
+        """Take the oldest available item (or one whose lease expired): its `columns` and attempt number, or None."""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                f"SELECT rowid, {', '.join(columns)}, attempts FROM {self.table}"
+                " WHERE status IN ('pending', 'processing') AND available_at <= ?"
+                " ORDER BY available_at, rowid LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                f"UPDATE {self.table} SET status = 'processing', attempts = attempts + 1, available_at = ?"
+                " WHERE rowid = ?",
+                (now + self.lease_seconds, row[0]),
+            )
+        return {**dict(zip(columns, row[1:-1])), "attempts": row[-1] + 1}
+
+    def renew_lease(self, key: Tuple[Any, ...]) -> None:
+        """Push back the lease of an item still being processed."""
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE {self.table} SET available_at = ? WHERE {self._where_key()} AND status = 'processing'",
+                (time.time() + self.lease_seconds, *key),
+            )
+
+    def complete_item(self, key: Tuple[Any, ...], values: Optional[Dict[str, Any]] = None) -> None:
+        """Mark an item done and store `values` in its columns. An item no longer processing (cancelled) is left as is."""
+        values = values or {}
+        assignments = "".join(f", {column} = ?" for column in values)
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE {self.table} SET status = 'done', finished_at = ?, {self.error_column} = NULL{assignments}"
+                f" WHERE {self._where_key()} AND status = 'processing'",
+                (time.time(), *values.values(), *key),
+            )
+
+    def fail_item(self, key: Tuple[Any, ...], attempts: int, error: str) -> None:
+        """Schedule a jittered exponential retry, or park the item as failed after `max_attempts`."""
+        with self._connect() as conn:
+            if attempts >= self.max_attempts:
+                conn.execute(
+                    f"UPDATE {self.table} SET status = 'failed', finished_at = ?, {self.error_column} = ?"
+                    f" WHERE {self._where_key()} AND status = 'processing'",
+                    (time.time(), error, *key),
+                )
+                return
+            delay = min(self.retry_max_seconds, self.retry_base_seconds * 2 ** (attempts - 1))
+            conn.execute(
+                f"UPDATE {self.table} SET status = 'pending', available_at = ?, {self.error_column} = ?"
+                f" WHERE {self._where_key()} AND status = 'processing'",
+                (time.time() + random.uniform(0.5, 1.0) * delay, error, *key),
+            )
+
+
+# =============================================================================
+# WORKER POOL
+# =============================================================================
+
+class LeasedWorkerPool:
+    """
+    Background threads draining a `LeasedWorkQueue`.
+
+    The number of threads bounds how many items are processed at once. The lease of an
+    item is renewed while it is processed, so a slow item is not handed out twice.
+    An exception schedules a retry. Subclasses process, complete and fail the items of
+    their queue.
+    """
+
+    # Prefix of the thread names and log messages
+    name = "work"
+
+    def __init__(self, queue: LeasedWorkQueue, workers: int, poll_seconds: float = 1.0):
+        self.queue = queue
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def _key(self, item: Dict[str, Any]) -> Tuple[Any, ...]:
+        raise NotImplementedError
+
+    def _describe(self, item: Dict[str, Any]) -> str:
+        raise NotImplementedError
+
+    def _process(self, item: Dict[str, Any]) -> Any:
+        raise NotImplementedError
+
+    def _complete(self, item: Dict[str, Any], result: Any) -> None:
+        raise NotImplementedError
+
+    def _fail(self, item: Dict[str, Any], error: str) -> None:
+        raise NotImplementedError
+
+    def start(self) -> None:
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"{self.name}-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        self.queue.available.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def run_once(self) -> bool:
+        """Process a single item if one is available. Returns False when there is none."""
+        item = self.queue.claim()
+        if item is None:
+            return False
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._renew_lease, args=(item, done),
+                                     name=f"{self.name}-lease", daemon=True)
+        heartbeat.start()
+        try:
+            result = self._process(item)
+        except Exception as e:
+            print(f"Error while processing {self._describe(item)} (attempt {item['attempts']}): {e}")
+            capture_exception(e)
+            self._fail(item, str(e))
+        else:
+            self._complete(item, result)
+        finally:
+            done.set()
+        return True
+
+    def _renew_lease(self, item: Dict[str, Any], done: threading.Event) -> None:
+        interval = self.queue.lease_seconds / 3
+        if interval <= 0:
+            return
+        while not done.wait(interval):
+            try:
+                self.queue.renew_lease(self._key(item))
+            except sqlite3.Error as e:
+                print(f"Could not renew the lease of {self._describe(item)}: {e}")
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if self.run_once():
+                    continue
+            except Exception as e:
+                # The queue file itself is unavailable (locked, disk full...)
+                print(f"{self.name.capitalize()} worker error: {e}")
+                capture_exception(e)
+            self.queue.available.wait(self.poll_seconds)
+            self.queue.available.clear()
@@ -0,0 +1,119 @@
+import difflib
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+# =============================================================================
+# PREDEFINED KEYWORDS
+# =============================================================================
+
+# (English, French) pairs of the keyword dropdown, in the order shown to reviewers
+PREDEFINED_KEYWORD_PAIRS: List[Tuple[str, str]] = [
+    ("abundance and biomass", "abondance et biomasse"),
+    ("sea access", "accès à la mer"),
+    ("decision making", "aide à la décision"),
+    ("protected areas", "aires protégées"),
+    ("knowledge improvement", "amélioration des connaissances"),
+    ("land-use planning", "aménagement du territoire"),
+    ("water purification", "assainissement des eaux"),
+    ("striped bass", "bar rayé"),
+    ("watershed", "bassin versant"),
+    ("habitat characterization", "caractérisation des habitats"),
+    ("coastal characterization", "caractérisation des rives"),
+    ("climate change", "changement climatique"),
+    ("resource conservation", "conservation des ressources"),
+    ("water consumption", "consommation d'eau"),
+    ("sea currents", "courant marin"),
+    ("crustacean", "crustacé"),
+    ("sustainable development", "développement durable"),
+    ("sampling", "échantillonnage"),
+    ("marine mammal", "mammifères marins"),
+    ("wetlands", "milieux humides"),
+    ("water quality", "qualité de l'eau"),
+    ("remote sensing", "télédétection"),
+    ("water temperature", "température de l'eau"),
+    ("wind", "vents"),
+    ("coastal zone", "zone côtière"),
+]
+
+# Minimum similarity (0-1) for a free-text keyword to be matched to a vocabulary entry
+FUZZY_MATCH_CUTOFF = 0.85
+
+_SEPARATORS = re.compile(r"[\s\-_'’/]+")
+
+
+def normalize_keyword(keyword: str) -> str:
+    """
+    Fold a keyword for comparison: case, accents, separators and plural endings are ignored.
+
+    Example: "Mammifère-Marin" and "mammifères marins" both give "mammifere marin".
+    """
+    folded = unicodedata.normalize("NFKD", keyword.lower()).encode("ascii", "ignore").decode()
+    words = [word[:-1] if len(word) > 3 and word[-1] in "sx" else word for word in _SEPARATORS.split(folded) if word]
+    return " ".join(words)
+
+
+# =============================================================================
+# VOCABULARY
+# =============================================================================
+
+class KeywordEntry(NamedTuple):
+    en: str
+    fr: str
+
+
+class KeywordMatch(NamedTuple):
+    entry: KeywordEntry
+    score: float
+    exact: bool
+
+
+class KeywordVocabulary:
+    """
+    Predefined keywords indexed by their normalized form in both languages.
+
+    Exact lookups are a single dict access; keywords typed by users (other spelling,
+    plural, missing accent, small typo) are matched to the closest entry instead.
+    """
+
+    def __init__(self, pairs: List[Tuple[str, str]] = PREDEFINED_KEYWORD_PAIRS):
+        self.entries = [KeywordEntry(en, fr) for en, fr in pairs]
+        self._index: Dict[str, KeywordEntry] = {}
+        for entry in self.entries:
+            self._index.setdefault(normalize_keyword(entry.en), entry)
+            self._index.setdefault(normalize_keyword(entry.fr), entry)
+        self._keys = list(self._index)
+        # Cached per instance: feedback repeats the same keywords
+        self.match = lru_cache(maxsize=4096)(self._match)
+
+    def terms(self, language: str) -> List[str]:
+        """Keywords of one language ("en" or "fr") in dropdown order."""
+        return [getattr(entry, language) for entry in self.entries]
+
+    def lookup(self, keyword: str) -> Optional[KeywordEntry]:
+        return self._index.get(normalize_keyword(keyword))
+
+    def translate(self, keyword: str, language: str) -> Optional[str]:
+        """Vocabulary equivalent of `keyword` in `language`, or None if it is not in the vocabulary."""
+        match = self.match(keyword)
+        return getattr(match.entry, language) if match else None
+
+    def _match(self, keyword: str, cutoff: float = FUZZY_MATCH_CUTOFF) -> Optional[KeywordMatch]:
+        key = normalize_keyword(keyword)
+        entry = self._index.get(key)
+        if entry is not None:
+            return KeywordMatch(entry, 1.0, True)
+        best = difflib.get_close_matches(key, self._keys, n=1, cutoff=cutoff)
+        if not best:
+            return None
+        score = difflib.SequenceMatcher(None, key, best[0]).ratio()
+        return KeywordMatch(self._index[best[0]], round(score, 3), False)
+
+    def prompt_list(self, indent: str = "        ") -> str:
+        """The EN/FR pairs as listed in the metadata prompt."""
+        return "\n".join(f'{indent}"en": "{entry.en}", "fr": "{entry.fr}"' for entry in self.entries)
+
+
+KEYWORD_VOCABULARY = KeywordVocabulary()
@@ -0,0 +1,121 @@
+"""
+Startup helpers: background warmup of heavy modules and import-time profiling.
+
+Profile the API cold start (import time per top-level package and resident memory):
+
+    python -m app.utils.startup
+    python -m app.utils.startup --json
+"""
+import importlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+# Module whose import makes up the API cold start
+APP_MODULE = "app.api.v1.endpoints"
+
+
+# Function to read the resident memory of the current process
+def current_rss_mb() -> float:
+    """
+    Return the resident set size of the current process in MB (peak RSS where /proc is unavailable).
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+# Function to import heavy modules after the server is up
+def start_warmup(modules: Iterable[str]) -> threading.Thread:
+    """
+    Import `modules` in a daemon thread so the first request using them does not pay for it.
+
+    Args:
+        modules (Iterable[str]): Dotted module names, imported in order.
+
+    Returns:
+        threading.Thread: The started warmup thread.
+    """
+    modules = list(modules)
+
+    def _warmup():
+        for name in modules:
+            start = time.perf_counter()
+            try:
+                importlib.import_module(name)
+            except Exception as e:
+                print(f"Warmup of {name} failed: {e}")
+                continue
+            print(f"Warmup: imported {name} in {time.perf_counter() - start:.2f}s (RSS {current_rss_mb():.0f} MB)")
+
+    thread = threading.Thread(target=_warmup, name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+# Function to profile the import of a module in a fresh interpreter
+def profile_imports(module: str = APP_MODULE, top: int = 25, env: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """
+    Import `module` in a fresh Python process with `-X importtime` and summarize the cost.
+
+    Args:
+        module (str): Module to import.
+        top (int): Number of most expensive top-level packages to report.
+        env (dict, optional): Extra environment variables for the child process.
+
+    Returns:
+        dict: "total_seconds" (wall time of the import), "rss_mb" (resident memory after
+        it), "packages" (import seconds spent in each top-level package, most expensive
+        first) and "loaded" (every module name that was imported).
+    """
+    script = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "elapsed = time.perf_counter() - start\n"
+        "from app.utils.startup import current_rss_mb\n"
+        "print(json.dumps({'total_seconds': elapsed, 'rss_mb': current_rss_mb(), 'loaded': sorted(sys.modules)}))\n"
+    )
+    child_env = {**os.environ, "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "sk-startup-profile"), **(env or {})}
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script],
+        capture_output=True, text=True, env=child_env, check=True,
+    )
+    report = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    # Lines look like "import time: self [us] | cumulative | imported package".
+    # Summing the self time per top-level package attributes every microsecond exactly once.
+    packages: Dict[str, float] = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        root = name.strip().split(".")[0]
+        packages[root] = packages.get(root, 0) + int(self_us) / 1e6
+    report["packages"] = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return report
+
+
+def _print_report(report: Dict[str, Any]) -> None:
+    print(f"Import of {APP_MODULE}: {report['total_seconds']:.2f}s, RSS {report['rss_mb']:.0f} MB")
+    for name, seconds in report["packages"]:
+        print(f"  {seconds:8.3f}s  {name}")
+
+
+if __name__ == "__main__":
+    result = profile_imports()
+    if "--json" in sys.argv:
+        print(json.dumps({key: value for key, value in result.items() if key != "loaded"}, indent=2))
+    else:
+        _print_report(result)
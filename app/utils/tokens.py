@@ -0,0 +1,19 @@
+# Average characters per GPT-4o token on French and English prose
+CHARS_PER_TOKEN = 4
+
+
+# Function to estimate the token count of a text without a tokenizer
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens in a text.
+
+    This avoids loading a tokenizer (and its network download) on the request path.
+    It is only meant for thresholds and reporting, not for billing.
+
+    Args:
+        text (str): Any text.
+
+    Returns:
+        int: Estimated token count.
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
@@ -0,0 +1,82 @@
+"""
+Latency, cost and accuracy of the EOV model cascade against the large model alone.
+
+Runs every reviewed document (see benchmarks/bench_eov_prefilter.py for how feedback
+is matched to TEXTS_DIR) through the cascade and through the large model, one at a
+time, and compares both with the EOVs confirmed by the reviewers. Costs come from the
+token usage and MODEL_PRICES_PER_MILLION. Set LLM_CASSETTE_MODE=record on the first
+run to replay the calls afterwards while tuning the thresholds.
+
+Usage:
+    python -m benchmarks.bench_eov_cascade TEXTS_DIR [--queue data/feedback_queue.sqlite3]
+        [--min-cited-ratio 1.0] [--min-lexicon-agreement 0.5]
+"""
+import argparse
+import statistics
+import time
+from typing import Any, Dict, List, Set, Tuple
+
+from langchain_core.runnables import Runnable
+
+from app.core.chain_setup_eov import chain_eov_large, model_eov_small, prompt_eov_v1, prompt_stage_eov
+from app.schemas.eov import EOVWithCitations
+from app.services.eov_cascade import (
+    CASCADE_REPORT, EOV_CASCADE_MIN_CITED_RATIO, EOV_CASCADE_MIN_LEXICON_AGREEMENT, EOVCascade,
+)
+from app.services.feedback_queue import FEEDBACK_QUEUE_PATH
+from app.services.metrics import LLMMetricsHandler, MetricsRegistry
+from benchmarks.bench_eov_prefilter import load_samples
+
+
+def run(name: str, chain: Runnable, samples: List[Tuple[str, Set[str]]]) -> Dict[str, Any]:
+    registry = MetricsRegistry(path=None)
+    chain = chain.with_config(callbacks=[LLMMetricsHandler(registry, name)])
+    seconds, tiers = [], []
+    found = expected = proposed = 0
+    for text, truth in samples:
+        report: Dict[str, Any] = {}
+        start = time.perf_counter()
+        result = chain.invoke({"text": text}, {"metadata": {CASCADE_REPORT: report}})
+        seconds.append(time.perf_counter() - start)
+        tiers.append(report.get("tier", "large"))
+        answered = {item.eov for item in result.liste_eov}
+        found += len(answered & truth)
+        expected += len(truth)
+        proposed += len(answered)
+    counters, _ = registry.collect()
+    cost = sum(value for (metric, _), value in counters.items() if metric == "llm_cost_usd_total")
+    return {
+        "p50_seconds": statistics.median(seconds) if seconds else 0.0,
+        "cost_usd": cost,
+        "precision": found / proposed if proposed else 1.0,
+        "recall": found / expected if expected else 1.0,
+        "small_tier_share": tiers.count("small") / max(len(tiers), 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("texts_dir")
+    parser.add_argument("--queue", default=FEEDBACK_QUEUE_PATH)
+    parser.add_argument("--min-cited-ratio", type=float, default=EOV_CASCADE_MIN_CITED_RATIO)
+    parser.add_argument("--min-lexicon-agreement", type=float, default=EOV_CASCADE_MIN_LEXICON_AGREEMENT)
+    args = parser.parse_args()
+
+    samples = load_samples(args.texts_dir, args.queue)
+    print(f"{len(samples)} reviewed documents with text")
+    chain_eov_small = prompt_stage_eov | model_eov_small.with_structured_output(
+        schema=EOVWithCitations, method="json_schema")
+    cascade = EOVCascade(chain_eov_small, chain_eov_large, prompt=prompt_eov_v1,
+                         min_cited_ratio=args.min_cited_ratio, min_lexicon_agreement=args.min_lexicon_agreement)
+    for name, chain in (("large model", chain_eov_large), ("cascade", cascade.as_runnable())):
+        result = run(name, chain, samples)
+        print(
+            f"{name:12s} p50 {result['p50_seconds']:5.1f} s  cost ${result['cost_usd']:.4f}  "
+            f"precision={result['precision']:.3f}  recall={result['recall']:.3f}  "
+            f"answered by the small model {result['small_tier_share']:.1%}"
+        )
+    print(f"escalations: {dict(cascade.counters())}")
+
+
+if __name__ == "__main__":
+    main()
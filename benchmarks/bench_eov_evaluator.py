@@ -0,0 +1,79 @@
+"""
+Microbenchmark of the EOV feedback evaluation.
+
+Compares `evaluate_eov_feedback` with the code previously inlined in the
+/submit_feedback_eov endpoint (list membership tests and a pandas DataFrame
+written to CSV).
+
+Usage:
+    python -m benchmarks.bench_eov_evaluator
+"""
+import os
+import random
+import tempfile
+import timeit
+
+import pandas as pd
+
+from app.schemas.feedback import POSSIBLE_EOVS, UserFeedback_EOV
+from app.services.eov_evaluator import evaluate_eov_feedback
+
+
+def legacy_evaluation(feedback: UserFeedback_EOV, eval_table_path: str = None) -> dict:
+    """The endpoint's previous evaluation code, kept here as the baseline."""
+    all_possible_eovs = set(POSSIBLE_EOVS)
+    true_positives = [item.eov for item in feedback.feedback if item.eov in POSSIBLE_EOVS and item.accept.lower() == "yes"]
+    false_negatives = [item.eov for item in feedback.missing_eovs if item.eov in POSSIBLE_EOVS]
+    false_positives = [item.eov for item in feedback.feedback if item.eov in POSSIBLE_EOVS and item.accept.lower() == "no"]
+    true_negatives = list(all_possible_eovs - set(true_positives) - set(false_negatives) - set(false_positives))
+
+    precision = len(true_positives) / (len(true_positives) + len(false_positives)) if (len(true_positives) + len(false_positives)) > 0 else 0
+    recall = len(true_positives) / (len(true_positives) + len(false_negatives)) if (len(true_positives) + len(false_negatives)) > 0 else 0
+    f1_score_val = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
+
+    eval_data = []
+    for eov in POSSIBLE_EOVS:
+        eval_data.append({
+            "EOV Name": eov,
+            "True Positive": eov in true_positives,
+            "False Positive": eov in false_positives,
+            "True Negative": eov in true_negatives,
+            "False Negative": eov in false_negatives,
+        })
+    eval_df = pd.DataFrame(eval_data)
+    if eval_table_path:
+        eval_df.to_csv(eval_table_path, index=False)
+    return {"precision": precision, "recall": recall, "f1_score": f1_score_val, "table": eval_data}
+
+
+def random_feedback(rng: random.Random) -> UserFeedback_EOV:
+    proposed = rng.sample(POSSIBLE_EOVS, 8)
+    missing = rng.sample([eov for eov in POSSIBLE_EOVS if eov not in proposed], 3)
+    return UserFeedback_EOV(
+        file_name="bench.pdf", revision_date="2024-01-01", user_context="benchmark",
+        feedback=[{"eov": eov, "accept": rng.choice(["yes", "no"])} for eov in proposed],
+        missing_eovs=[{"eov": eov} for eov in missing],
+    )
+
+
+def _per_call(func, number: int) -> float:
+    return timeit.timeit(func, number=number) / number
+
+
+def main(number: int = 2000) -> None:
+    rng = random.Random(0)
+    feedbacks = [random_feedback(rng) for _ in range(100)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "evaluation_table.csv")
+        legacy = _per_call(lambda: legacy_evaluation(rng.choice(feedbacks), path), number // 10)
+    legacy_in_memory = _per_call(lambda: legacy_evaluation(rng.choice(feedbacks)), number // 10)
+    indexed = _per_call(lambda: evaluate_eov_feedback(rng.choice(feedbacks)), number)
+
+    print(f"legacy (lists + pandas + CSV):  {legacy * 1e6:9.1f} µs/feedback")
+    print(f"legacy without the CSV write:   {legacy_in_memory * 1e6:9.1f} µs/feedback")
+    print(f"evaluate_eov_feedback:          {indexed * 1e6:9.1f} µs/feedback")
+    print(f"speedup vs legacy:              {legacy / indexed:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Recall and prompt savings of the EOV candidate prefilter on reviewed documents.
+
+The reviewed EOVs of a document are those accepted in its feedback plus those the
+reviewer added as missing. Feedback is read from the feedback queue database (single
+and bulk EOV submissions) and matched by `file_name` to the document text in TEXTS_DIR
+(`<file_name>` or `<file_name>.txt`).
+
+Usage:
+    python -m benchmarks.bench_eov_prefilter TEXTS_DIR [--queue data/feedback_queue.sqlite3] [--top-k 10 15]
+"""
+import argparse
+import json
+import os
+import sqlite3
+from typing import Dict, List, Set, Tuple
+
+from app.core.chain_setup_eov import prompt_eov_v1
+from app.services.eov_prefilter import EOV_PREFILTER_TOP_K, EOVPrefilter, evaluate_prefilter
+from app.services.feedback_queue import FEEDBACK_QUEUE_PATH
+
+
+def reviewed_eovs(queue_path: str) -> Dict[str, Set[str]]:
+    """Return the EOVs confirmed by reviewers for each file name in the feedback queue."""
+    with sqlite3.connect(queue_path) as conn:
+        rows = conn.execute("SELECT kind, payload FROM feedback_queue WHERE kind IN ('eov', 'bulk') ORDER BY id").fetchall()
+    feedbacks = []
+    for kind, payload in rows:
+        payload = json.loads(payload)
+        feedbacks.extend(payload.get("eov_feedback", []) if kind == "bulk" else [payload])
+    eovs: Dict[str, Set[str]] = {}
+    for feedback in feedbacks:
+        # The latest review of a file wins
+        eovs[feedback["file_name"]] = (
+            {item["eov"] for item in feedback["feedback"] if item["accept"].lower() == "yes"}
+            | {item["eov"] for item in feedback["missing_eovs"]}
+        )
+    return eovs
+
+
+def load_samples(texts_dir: str, queue_path: str) -> List[Tuple[str, Set[str]]]:
+    samples = []
+    for file_name, eovs in reviewed_eovs(queue_path).items():
+        for candidate in (file_name, f"{file_name}.txt", f"{os.path.splitext(file_name)[0]}.txt"):
+            path = os.path.join(texts_dir, candidate)
+            if os.path.isfile(path):
+                with open(path, encoding="utf-8") as f:
+                    samples.append((f.read(), eovs))
+                break
+    return samples
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("texts_dir")
+    parser.add_argument("--queue", default=FEEDBACK_QUEUE_PATH)
+    parser.add_argument("--top-k", type=int, nargs="+", default=[EOV_PREFILTER_TOP_K])
+    args = parser.parse_args()
+
+    samples = load_samples(args.texts_dir, args.queue)
+    print(f"{len(samples)} reviewed documents with text")
+    prefilter = EOVPrefilter(prompt_eov_v1)
+    for top_k in args.top_k:
+        result = evaluate_prefilter(prefilter, samples, top_k)
+        print(
+            f"top_k={top_k:3d}  recall={result['recall']:.3f}  "
+            f"full-recall docs={result['documents_with_full_recall']:.1%}  fallback={result['fallback_rate']:.1%}  "
+            f"prompt tokens {result['mean_prompt_tokens_full']:.0f} -> {result['mean_prompt_tokens']:.0f}  "
+            f"selection {result['mean_selection_ms']:.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Throughput and memory of the bulk full-metadata transformation.
+
+Streams N generated `MetadataSchemaCIOOS` records through `transform_ndjson` and
+compares it with the per-record path of /generate_full_metadata_json/, which
+validated the whole `FullMetadataSchema` (constant parts included) for each record.
+The peak traced memory is reported for several input sizes: it should not grow
+with the number of records.
+
+Usage:
+    python -m benchmarks.bench_metadata_transform [--records 10000]
+"""
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+from typing import AsyncIterator, List, Tuple
+
+from app.schemas.metadata import FullMetadataSchema, MetadataSchemaCIOOS
+from app.services.metadata_transform import full_metadata_dict, transform_ndjson
+
+
+def record(i: int) -> bytes:
+    return json.dumps({
+        "title": f"Relevés CTD dans l'estuaire, campagne {i}",
+        "resource_type": "Jeu de données",
+        "theme": "Oceanographic",
+        "title_translated": f"CTD surveys in the estuary, cruise {i}",
+        "auteurs": ["A. Tremblay", "B. Gagnon"],
+        "summary": "Des profils de température et de salinité ont été mesurés chaque mois. " * 10,
+        "summary_translated": {"en": "Temperature and salinity profiles were measured monthly. " * 10},
+        "mots_cles": {"en": ["water temperature", "sampling"], "fr": ["température de l'eau", "échantillonnage"]},
+        "langue": "fr",
+        "date_debut": "01-01-2020",
+        "date_fin": "31-12-2020",
+        "spatial": "Estuaire du Saint-Laurent",
+    }, ensure_ascii=False).encode() + b"\n"
+
+
+async def ndjson_body(records: int, chunk_bytes: int = 64 * 1024) -> AsyncIterator[bytes]:
+    """The request body as received by the endpoint: NDJSON in fixed-size chunks, generated lazily."""
+    buffer = b""
+    for i in range(records):
+        buffer += record(i)
+        if len(buffer) >= chunk_bytes:
+            yield buffer[:chunk_bytes]
+            buffer = buffer[chunk_bytes:]
+    if buffer:
+        yield buffer
+
+
+async def legacy_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Baseline: every record validated as a complete FullMetadataSchema, then serialized."""
+    buffer = b""
+    async for chunk in chunks:
+        *lines, buffer = (buffer + chunk).split(b"\n")
+        for line in lines:
+            metadata = MetadataSchemaCIOOS.model_validate_json(line)
+            yield FullMetadataSchema.model_validate(full_metadata_dict(metadata)).model_dump_json().encode() + b"\n"
+
+
+def run(transform, records: int) -> Tuple[float, int, float]:
+    """Return (records per second, output records, peak MB allocated during the run). Needs tracemalloc running."""
+
+    async def _consume():
+        count = 0
+        async for chunk in transform(ndjson_body(records)):
+            count += chunk.count(b"\n")
+        return count
+
+    baseline = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    count = asyncio.run(_consume())
+    elapsed = time.perf_counter() - start
+    return count / elapsed, count, (tracemalloc.get_traced_memory()[1] - baseline) / 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--records", type=int, default=10000)
+    args = parser.parse_args()
+
+    # Throughput on a body generated beforehand, without tracemalloc (which slows allocations down)
+    body = asyncio.run(_collect(ndjson_body(args.records)))
+    for name, transform in (("legacy (full validation)", legacy_ndjson), ("transform_ndjson", transform_ndjson)):
+        start = time.perf_counter()
+        asyncio.run(_drain(transform(_replay(body))))
+        print(f"{name:26s} {args.records / (time.perf_counter() - start):10.0f} records/s")
+
+    # Memory: a first run fills pydantic's string cache (bounded to 16384 strings)
+    tracemalloc.start()
+    run(transform_ndjson, 20000)
+    for records in (args.records // 10, args.records, args.records * 5):
+        _, count, peak = run(transform_ndjson, records)
+        print(f"transform_ndjson, {count:6d} records: peak memory {peak:6.2f} MB")
+
+
+async def _collect(chunks: AsyncIterator[bytes]) -> List[bytes]:
+    return [chunk async for chunk in chunks]
+
+
+async def _replay(chunks: List[bytes]) -> AsyncIterator[bytes]:
+    for chunk in chunks:
+        yield chunk
+
+
+async def _drain(chunks: AsyncIterator[bytes]) -> None:
+    async for _ in chunks:
+        pass
+
+
+if __name__ == "__main__":
+    main()
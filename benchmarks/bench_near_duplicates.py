@@ -0,0 +1,77 @@
+"""
+Lookup latency of the near-duplicate index with many indexed documents.
+
+Indexes N documents (random signatures, as unrelated documents would give), then
+times lookups of revisions of indexed documents (hits) and of new documents
+(misses). The signature of a query text is timed separately: it grows with the
+text length, the lookup should not grow with the number of documents.
+
+Usage:
+    python -m benchmarks.bench_near_duplicates [--documents 100000]
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from array import array
+
+from app.services.near_duplicates import NUM_HASHES, NearDuplicateIndex, band_keys, minhash_signature
+
+SCOPE = "chain_eov:bench"
+
+
+def random_signature(rng: random.Random) -> array:
+    return array("Q", (rng.getrandbits(57) for _ in range(NUM_HASHES)))
+
+
+def revision_of(signature: array, rng: random.Random, changed: int = 6) -> array:
+    revised = array("Q", signature)
+    for i in rng.sample(range(NUM_HASHES), changed):
+        revised[i] = rng.getrandbits(57)
+    return revised
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documents", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    with tempfile.TemporaryDirectory() as directory:
+        index = NearDuplicateIndex(os.path.join(directory, "near_duplicates.sqlite3"), threshold=0.9)
+        signatures = [random_signature(rng) for _ in range(args.documents)]
+        start = time.perf_counter()
+        with index._connect() as conn:
+            # Same rows as NearDuplicateIndex.add, in one transaction
+            for document_id, signature in enumerate(signatures, 1):
+                conn.execute("INSERT INTO near_duplicate_documents (id, scope, signature, result, created_at)"
+                             " VALUES (?, ?, ?, ?, 0)", (document_id, SCOPE, signature.tobytes(), b"{}"))
+                conn.executemany("INSERT OR IGNORE INTO near_duplicate_bands (bucket, document_id) VALUES (?, ?)",
+                                 [(bucket, document_id) for bucket in band_keys(SCOPE, signature)])
+        print(f"indexed {args.documents} documents in {time.perf_counter() - start:.1f} s")
+
+        for name, queries in (
+            ("lookup, hit", [revision_of(rng.choice(signatures), rng) for _ in range(args.lookups)]),
+            ("lookup, miss", [random_signature(rng) for _ in range(args.lookups)]),
+        ):
+            timings = []
+            found = 0
+            for query in queries:
+                start = time.perf_counter()
+                found += index.lookup(SCOPE, query) is not None
+                timings.append((time.perf_counter() - start) * 1e6)
+            timings.sort()
+            print(f"{name:14s} p50 {statistics.median(timings):6.0f} us  p99 {timings[int(len(timings) * 0.99)]:6.0f} us"
+                  f"  ({found}/{len(queries)} found)")
+
+    text = " ".join(f"Mesure {i} de la température et de la salinité à la station {i % 40}." for i in range(1000))
+    start = time.perf_counter()
+    minhash_signature(text)
+    print(f"signature of a {len(text.split())}-word text: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
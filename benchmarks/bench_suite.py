@@ -0,0 +1,222 @@
+"""
+In-process microbenchmarks of our own overhead around the LLM calls.
+
+The OpenAI models are replaced by `benchmarks.fake_llm` (canned structured outputs,
+optional latency), so the numbers cover what this service adds: prompt formatting,
+structured-output parsing, LangServe routing, citation verification, the metadata
+transformation and the feedback metrics.
+
+For each component the suite reports ops/sec, p50/p99 latency and the memory allocated
+per call (peak traced by tracemalloc). Results can be saved as a JSON baseline and
+compared with a later run:
+
+    python -m benchmarks.bench_suite --save bench_baseline.json
+    python -m benchmarks.bench_suite --compare bench_baseline.json [--fail-on-regression]
+
+Usage:
+    python -m benchmarks.bench_suite [--only chain_eov ...] [--seconds 1.0] [--latency 0.0]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+# A p50 latency or allocation this much above the baseline is reported as a regression
+REGRESSION_THRESHOLD = 0.20
+# Calls traced by tracemalloc per component (tracing slows calls down: done separately)
+ALLOCATION_SAMPLES = 20
+
+
+# =============================================================================
+# MEASUREMENT
+# =============================================================================
+
+def measure(func: Callable[[], Any], seconds: float = 1.0, min_iterations: int = 5,
+            max_iterations: int = 100000) -> Dict[str, float]:
+    """Call `func` repeatedly for about `seconds` and summarize latency and allocations."""
+    for _ in range(3):
+        func()
+
+    durations: List[int] = []
+    deadline = time.perf_counter() + seconds
+    while len(durations) < max_iterations and (len(durations) < min_iterations or time.perf_counter() < deadline):
+        start = time.perf_counter_ns()
+        func()
+        durations.append(time.perf_counter_ns() - start)
+
+    peaks = []
+    tracemalloc.start()
+    for _ in range(min(ALLOCATION_SAMPLES, len(durations))):
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        func()
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+
+    durations.sort()
+    total = sum(durations)
+    return {
+        "iterations": len(durations),
+        "ops_per_sec": round(len(durations) / (total / 1e9), 1),
+        "mean_us": round(total / len(durations) / 1e3, 1),
+        "p50_us": round(durations[len(durations) // 2] / 1e3, 1),
+        "p99_us": round(durations[min(len(durations) - 1, int(len(durations) * 0.99))] / 1e3, 1),
+        "alloc_kb": round(statistics.median(peaks) / 1024, 1),
+    }
+
+
+# =============================================================================
+# COMPONENTS
+# =============================================================================
+
+def components() -> Dict[str, Callable[[], Any]]:
+    """Build the benchmarked callables. The API is imported here, once the environment is set."""
+    from fastapi.testclient import TestClient
+
+    from app.api.v1.endpoints import app
+    from app.core.chain_setup_eov import chain_eov, prompt_stage_eov
+    from app.core.chain_setup_metadata import chain_MetadataSchemaCIOOS, prompt_template_MetadataSchemaCIOOS
+    from app.schemas.feedback import POSSIBLE_EOVS, UserFeedback_EOV
+    from app.services.bulk_feedback import bulk_eov_metrics, eov_feedback_matrices
+    from app.services.citation_verifier import verify_citations
+    from app.services.eov_evaluator import evaluate_eov_feedback
+    from app.services.metadata_transform import transform_metadata_to_full
+    from app.utils.helpers import evaluate_keyword_feedback
+    from benchmarks.fake_llm import SAMPLE_DOCUMENT, SAMPLE_EOV, SAMPLE_METADATA
+
+    rng = random.Random(0)
+    feedbacks = []
+    for _ in range(100):
+        proposed = rng.sample(POSSIBLE_EOVS, 8)
+        feedbacks.append(UserFeedback_EOV(
+            file_name="bench.pdf", revision_date="2024-01-01", user_context="benchmark",
+            feedback=[{"eov": eov, "accept": rng.choice(["yes", "no"])} for eov in proposed],
+            missing_eovs=[{"eov": eov} for eov in rng.sample([e for e in POSSIBLE_EOVS if e not in proposed], 3)],
+        ))
+    keywords = [
+        {"keyword": keyword, "accept": rng.choice(["accept", "reject"]),
+         "justification": rng.choice([None, "added manually by user"])}
+        for keyword in ["température de l'eau", "échantillonnage", "phoques", "Vents", "estuaire"] * 4
+    ]
+
+    client = TestClient(app)
+    text = {"text": SAMPLE_DOCUMENT}
+    # The result cache would answer every call after the first one
+    headers = {"X-Cache-Bypass": "1"}
+
+    def langserve(path: str) -> Callable[[], Any]:
+        def _call():
+            response = client.post(path, json={"input": text}, headers=headers)
+            response.raise_for_status()
+        return _call
+
+    return {
+        "prompt_metadata": lambda: prompt_template_MetadataSchemaCIOOS.invoke(text),
+        "prompt_eov": lambda: prompt_stage_eov.invoke(text),
+        "chain_metadata": lambda: chain_MetadataSchemaCIOOS.invoke(text),
+        "chain_eov": lambda: chain_eov.invoke(text),
+        "chain_eov_async": lambda: asyncio.run(chain_eov.ainvoke(text)),
+        "langserve_metadata": langserve("/chain_MetadataSchemaCIOOS/invoke"),
+        "langserve_eov": langserve("/chain_eov/invoke"),
+        "verify_citations": lambda: verify_citations(SAMPLE_DOCUMENT, SAMPLE_EOV),
+        "transform_metadata_to_full": lambda: transform_metadata_to_full(SAMPLE_METADATA),
+        "evaluate_eov_feedback": lambda: evaluate_eov_feedback(feedbacks[0]),
+        "evaluate_keyword_feedback": lambda: evaluate_keyword_feedback(keywords),
+        "bulk_eov_metrics_100": lambda: bulk_eov_metrics(**eov_feedback_matrices(feedbacks)),
+    }
+
+
+# =============================================================================
+# BASELINES
+# =============================================================================
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "machine": platform.machine(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            threshold: float = REGRESSION_THRESHOLD) -> List[str]:
+    """Print the change against the baseline per component and return the regressed ones."""
+    regressions = []
+    print(f"\n{'component':28s} {'p50 change':>11s} {'alloc change':>13s}")
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:28s} {'new':>11s}")
+            continue
+        changes = {key: result[key] / before[key] - 1 if before[key] else 0.0 for key in ("p50_us", "alloc_kb")}
+        regressed = any(change > threshold for change in changes.values())
+        if regressed:
+            regressions.append(name)
+        print(f"{name:28s} {changes['p50_us']:+10.1%} {changes['alloc_kb']:+12.1%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--only", nargs="*", help="Components to run (default: all)")
+    parser.add_argument("--seconds", type=float, default=1.0, help="Measurement time per component")
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake LLM latency in seconds")
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Compare with the results saved in this JSON file")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+
+    # Local state of the API goes to a temporary directory, and nothing is cached between calls
+    tmp = tempfile.mkdtemp(prefix="bench_suite_")
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+    os.environ["RESULT_CACHE_PATH"] = ""
+    # The fake model answers instantly: the token buckets would only measure the configured limits
+    os.environ["OPENAI_TPM_LIMIT"] = "0"
+    os.environ["OPENAI_RPM_LIMIT"] = "0"
+    for name, file_name in (("FEEDBACK_QUEUE_PATH", "feedback_queue.sqlite3"), ("METRICS_PATH", "metrics.sqlite3"),
+                            ("BATCH_JOBS_PATH", "batch_jobs.sqlite3"), ("FEEDBACK_STORE_PATH", "feedback_store.sqlite3")):
+        os.environ[name] = os.path.join(tmp, file_name)
+
+    from benchmarks.fake_llm import fake_openai
+
+    results = {}
+    with fake_openai(latency=args.latency):
+        for name, func in components().items():
+            if args.only and name not in args.only:
+                continue
+            # The services print progress on each call
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                results[name] = measure(func, seconds=args.seconds)
+            r = results[name]
+            print(f"{name:28s} {r['ops_per_sec']:10.1f} ops/s  p50 {r['p50_us']:10.1f} µs  "
+                  f"p99 {r['p99_us']:10.1f} µs  {r['alloc_kb']:9.1f} KB/op")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"environment": environment(), "latency": args.latency, "results": results}, f, indent=2)
+        print(f"\nResults saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"Baseline: commit {baseline['environment'].get('commit')}, {baseline['environment'].get('created')}")
+        regressions = compare(results, baseline["results"])
+        if regressions and args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+"""
+Deterministic stand-in for the OpenAI chat models.
+
+`fake_openai()` replaces the calls made by every `ChatOpenAI` instance (including the
+rate-controlled models of the chains) with canned structured outputs, returned after a
+configurable latency. Everything around the call still runs: prompt formatting, the rate
+controller, callbacks and the structured-output parsing of the chains.
+"""
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Union
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_openai import ChatOpenAI
+from pydantic import BaseModel
+
+from app.schemas.eov import EOVWithCitations
+from app.schemas.metadata import MetadataSchemaCIOOS
+
+# A short report whose sentences are quoted by the canned EOV output
+SAMPLE_DOCUMENT = (
+    "Rapport de campagne 2021 dans l'estuaire maritime du Saint-Laurent.\n"
+    "Des profils de température et de salinité ont été mesurés chaque mois à 12 stations.\n"
+    "L'oxygène dissous a été mesuré au fond avec une sonde optique.\n"
+    "Des échantillons de phytoplancton ont été prélevés pour estimer la biomasse.\n"
+) * 20
+
+SAMPLE_METADATA = MetadataSchemaCIOOS(
+    title="Profils de température et de salinité dans l'estuaire maritime du Saint-Laurent en 2021",
+    resource_type="Rapport",
+    theme="Oceanographic",
+    title_translated="Temperature and salinity profiles in the Lower St. Lawrence Estuary in 2021",
+    auteurs=["A. Tremblay", "B. Gagnon"],
+    summary="Des profils de température et de salinité ont été mesurés chaque mois à 12 stations. " * 12,
+    summary_translated={"en": "Temperature and salinity profiles were measured monthly at 12 stations. " * 12},
+    mots_cles={"en": ["water temperature", "sampling"], "fr": ["température de l'eau", "échantillonnage"]},
+    langue="fr",
+    date_debut="01-05-2021",
+    date_fin="31-10-2021",
+    spatial="Non disponible",
+)
+
+SAMPLE_EOV = EOVWithCitations(liste_eov=[
+    {"eov": "Température sous la surface", "raison": "Des profils de température sont mesurés.",
+     "citation": [{"citation_texte": "Des profils de température et de salinité ont été mesurés chaque mois à 12 stations."}]},
+    {"eov": "Salinité sous la surface", "raison": "Des profils de salinité sont mesurés.",
+     "citation": [{"citation_texte": "profils de température et de salinité ont été mesurés"}]},
+    {"eov": "Oxygène", "raison": "L'oxygène dissous est mesuré.",
+     "citation": [{"citation_texte": "L'oxygène dissous a été mesuré au fond avec une sonde optique."}]},
+])
+
+# Canned output per structured-output schema name
+DEFAULT_OUTPUTS: Dict[str, BaseModel] = {
+    "MetadataSchemaCIOOS": SAMPLE_METADATA,
+    "EOVWithCitations": SAMPLE_EOV,
+}
+
+# Characters per streamed chunk
+STREAM_CHUNK_CHARS = 20
+
+
+def _schema_name(response_format: Union[type, Dict[str, Any], None]) -> Optional[str]:
+    if isinstance(response_format, type):
+        return response_format.__name__
+    if isinstance(response_format, dict) and response_format.get("type") == "json_schema":
+        return response_format["json_schema"]["name"]
+    return None
+
+
+class FakeOpenAIBackend:
+    """Canned chat completions, looked up by the name of the requested response schema."""
+
+    def __init__(self, outputs: Optional[Dict[str, BaseModel]] = None, latency: float = 0.0):
+        self.outputs = dict(DEFAULT_OUTPUTS if outputs is None else outputs)
+        self.latency = latency
+        self.calls = 0
+
+    def _output(self, model: ChatOpenAI, messages, kwargs):
+        self.calls += 1
+        response_format = kwargs.get("response_format")
+        name = _schema_name(response_format)
+        if name not in self.outputs:
+            raise ValueError(f"No canned output for response format {name!r}")
+        content = self.outputs[name].model_dump_json()
+        prompt_tokens = sum(len(str(message.content)) for message in messages) // 4
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4,
+                 "total_tokens": prompt_tokens + len(content) // 4}
+        # Like the OpenAI client, a Pydantic response format is parsed into the model
+        parsed = response_format.model_validate_json(content) if isinstance(response_format, type) else None
+        return content, parsed, usage
+
+    def generate(self, model: ChatOpenAI, messages, kwargs) -> ChatResult:
+        content, parsed, usage = self._output(model, messages, kwargs)
+        message = AIMessage(
+            content=content,
+            additional_kwargs={"parsed": parsed} if parsed is not None else {},
+            usage_metadata={"input_tokens": usage["prompt_tokens"], "output_tokens": usage["completion_tokens"],
+                            "total_tokens": usage["total_tokens"]},
+            response_metadata={"model_name": model.model_name, "finish_reason": "stop"},
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)],
+                          llm_output={"token_usage": usage, "model_name": model.model_name})
+
+    def stream(self, model: ChatOpenAI, messages, kwargs) -> Iterator[ChatGenerationChunk]:
+        content, _, usage = self._output(model, messages, kwargs)
+        for start in range(0, len(content), STREAM_CHUNK_CHARS):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=content[start:start + STREAM_CHUNK_CHARS]))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata={
+            "input_tokens": usage["prompt_tokens"], "output_tokens": usage["completion_tokens"],
+            "total_tokens": usage["total_tokens"],
+        }))
+
+
+@contextmanager
+def fake_openai(latency: float = 0.0, outputs: Optional[Dict[str, BaseModel]] = None) -> Iterator[FakeOpenAIBackend]:
+    """Route every `ChatOpenAI` call to a `FakeOpenAIBackend` while the context is active."""
+    backend = FakeOpenAIBackend(outputs, latency)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(backend.latency)
+        return backend.generate(self, messages, kwargs)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(backend.latency)
+        return backend.generate(self, messages, kwargs)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(backend.latency)
+        for chunk in backend.stream(self, messages, kwargs):
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(backend.latency)
+        for chunk in backend.stream(self, messages, kwargs):
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    patched = {"_generate": _generate, "_agenerate": _agenerate, "_stream": _stream, "_astream": _astream}
+    # The methods are inherited from BaseChatOpenAI: overriding them on ChatOpenAI is enough
+    original = {name: ChatOpenAI.__dict__.get(name) for name in patched}
+    for name, method in patched.items():
+        setattr(ChatOpenAI, name, method)
+    try:
+        yield backend
+    finally:
+        for name, method in original.items():
+            if method is None:
+                delattr(ChatOpenAI, name)
+            else:
+                setattr(ChatOpenAI, name, method)
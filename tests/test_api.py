@@ -1,16 +1,76 @@
-# Example test file, adjust as needed
+import os
+import tempfile
+
+import pytest
 from fastapi.testclient import TestClient
-from main import app
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+# Keep the stores of the app out of data/ and cache/, as in tests/test_startup.py
+_data_dir = tempfile.TemporaryDirectory(prefix="test_api_")
+for _name, _file in (("RESULT_CACHE_PATH", "result_cache"), ("FEEDBACK_QUEUE_PATH", "feedback_queue"),
+                     ("FEEDBACK_STORE_PATH", "feedback_store"), ("METRICS_PATH", "metrics"),
+                     ("BATCH_JOBS_PATH", "batch_jobs"), ("NEAR_DUPLICATE_PATH", "near_duplicates")):
+    os.environ[_name] = os.path.join(_data_dir.name, f"{_file}.sqlite3")
+
+from app.main import app  # noqa: E402
+from benchmarks.fake_llm import SAMPLE_DOCUMENT, fake_openai  # noqa: E402
 
 client = TestClient(app)
+# Always run the chain, even if the local result cache has an entry for this text
+HEADERS = {"X-Cache-Bypass": "1"}
+
 
+@pytest.fixture(autouse=True)
+def fake_llm():
+    with fake_openai() as backend:
+        yield backend
 
-def test_metadata_chain():
-    response = client.post("/v1/chain_MetadataSchemaCIOOS",
-                           json={"text": "test data"})
+
+def test_metadata_chain(fake_llm):
+    response = client.post("/chain_MetadataSchemaCIOOS/invoke",
+                           json={"input": {"text": SAMPLE_DOCUMENT}}, headers=HEADERS)
     assert response.status_code == 200
+    assert response.json()["output"]["langue"] == "fr"
+    assert fake_llm.calls == 1
 
 
 def test_eov_chain():
-    response = client.post("/v1/chain_eov", json={"text": "test data"})
+    response = client.post("/chain_eov/invoke", json={"input": {"text": SAMPLE_DOCUMENT}}, headers=HEADERS)
+    assert response.status_code == 200
+    citations = [c for eov in response.json()["output"]["liste_eov"] for c in eov["citation"]]
+    assert citations and all(c["verified"] for c in citations)
+
+
+def test_ingest_document(fake_llm):
+    pages = [f"Station {n} : profils de température et de salinité." for n in range(1, 4)]
+    body = "".join(f"Rapport 2021 - Observatoire global du Saint-Laurent\n{page}\n{n}\n" for n, page in enumerate(pages, 1))
+    response = client.post("/ingest", content=body.encode("utf-8"), headers=HEADERS)
+    assert response.status_code == 200
+    ingestion = response.json()["ingestion"]
+    assert ingestion["repeated_lines"] == len(pages) - 1 and ingestion["page_numbers"] == len(pages)
+    assert ingestion["tokens_after"] < ingestion["tokens_before"]
+    assert response.json()["metadata"]["langue"] == "fr"
+
+
+def test_feedback_analytics():
+    feedback = {"file_name": "analytics.pdf", "revision_date": "2024-01-01", "user_context": "test",
+                "feedback": [{"eov": "Oxygène", "accept": "yes"}], "missing_eovs": []}
+    assert client.post("/submit_feedback_eov", json=feedback).status_code == 202
+    response = client.get("/feedback/analytics/files/analytics.pdf", params={"revision_date": "2024-01-01"})
+    assert response.status_code == 200
+    [submission] = response.json()
+    assert (submission["file_name"], submission["revision_date"]) == ("analytics.pdf", "2024-01-01")
+    assert submission["eovs"] == [{"eov": "Oxygène", "outcome": "tp"}]
+    trend = client.get("/feedback/analytics/eov", params={"eov": "Oxygène", "bucket": "quarter"}).json()
+    assert trend["eov"] == "Oxygène" and trend["totals"]["tp"] == 1
+    assert client.get("/feedback/analytics/eov", params={"bucket": "decade"}).status_code == 422
+
+
+def test_eov_revision():
+    revision = SAMPLE_DOCUMENT + "\n\nDes échantillons de zooplancton ont aussi été prélevés."
+    previous_eov = client.post("/chain_eov/invoke", json={"input": {"text": SAMPLE_DOCUMENT}}, headers=HEADERS).json()
+    response = client.post("/extract/eov/revision", headers=HEADERS, json={
+        "text": revision, "previous_text": SAMPLE_DOCUMENT, "previous_eov": previous_eov["output"]})
     assert response.status_code == 200
+    assert response.json()["revision"]["changed_sections"] == 1
+    assert response.json()["revision"]["estimated_tokens_sent"] < 20
@@ -0,0 +1,109 @@
+import time
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from app.schemas.eov import EOVWithCitations
+from app.schemas.metadata import MetadataSchemaCIOOS
+from app.services.batch_jobs import BatchJobStore, BatchWorkerPool, extraction_processor
+
+
+def _metadata(inputs):
+    if "erreur" in inputs["text"]:
+        raise RuntimeError("model unavailable")
+    return MetadataSchemaCIOOS(
+        title=inputs["text"], resource_type="Rapport", theme="Oceanographic", title_translated="Title",
+        auteurs=[], summary="Résumé", summary_translated={"en": "Summary"},
+        mots_cles={"en": [], "fr": []}, langue="fr",
+        date_debut="Non disponible", date_fin="Non disponible", spatial="Non disponible",
+    )
+
+
+# Local stand-in for both LLM chains
+processor = extraction_processor(RunnableLambda(_metadata), RunnableLambda(lambda _: EOVWithCitations(liste_eov=[])))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BatchJobStore(path=str(tmp_path / "jobs.sqlite3"), max_attempts=2, lease_seconds=60)
+
+
+def test_job_is_processed_and_exported_in_order(store):
+    job_id = store.create_job([{"id": "a.pdf", "text": "Rapport A"}, {"id": None, "text": "Rapport B"}])
+    assert store.status(job_id)["status"] == "pending"
+
+    pool = BatchWorkerPool(store, processor, workers=2, poll_seconds=0.05)
+    pool.start()
+    try:
+        deadline = time.time() + 5
+        while store.status(job_id)["status"] != "done" and time.time() < deadline:
+            time.sleep(0.02)
+    finally:
+        pool.stop()
+
+    status = store.status(job_id)
+    assert status["done"] == 2 and status["progress"] == 1.0 and status["finished_at"]
+    results = list(store.iter_results(job_id))
+    assert [r["id"] for r in results] == ["a.pdf", None]
+    assert results[1]["result"]["metadata"]["title"] == "Rapport B"
+    assert results[1]["result"]["full_metadata"]["title"]["fr"] == "Rapport B"
+
+
+def test_failed_documents_are_retried_then_reported(store):
+    job_id = store.create_job([{"text": "erreur"}])
+    pool = BatchWorkerPool(store, processor)
+    assert pool.run_once()
+    store._connect().execute("UPDATE batch_items SET available_at = 0")
+    assert pool.run_once()
+
+    [result] = store.iter_results(job_id)
+    assert result["status"] == "failed" and result["attempts"] == 2 and result["error"] == "model unavailable"
+    assert store.status(job_id)["status"] == "done"
+
+
+def test_interrupted_work_resumes_after_restart(store, tmp_path):
+    job_id = store.create_job([{"text": "Rapport"}])
+    assert store.claim() is not None  # the process stops here
+
+    restarted = BatchJobStore(path=str(tmp_path / "jobs.sqlite3"), lease_seconds=60)
+    assert restarted.claim() is None  # still leased
+    restarted._connect().execute("UPDATE batch_items SET available_at = 0")  # lease expired
+    assert BatchWorkerPool(restarted, processor).run_once()
+    assert restarted.status(job_id)["done"] == 1
+
+
+def test_cancellation(store):
+    job_id = store.create_job([{"text": "Rapport A"}, {"text": "Rapport B"}])
+    running = store.claim()
+    assert store.cancel(job_id)
+    assert not store.cancel("unknown")
+
+    store.complete(running["job_id"], running["index"], {"late": True})
+    status = store.status(job_id)
+    assert status["status"] == "cancelled" and status["cancelled"] == 2
+    assert store.claim() is None
+
+
+def test_processor_does_not_use_the_async_clients():
+    async def _no_event_loop(inputs):
+        raise AssertionError("batch workers must not start an event loop")
+
+    sync_only = extraction_processor(RunnableLambda(_metadata, afunc=_no_event_loop),
+                                     RunnableLambda(lambda _: EOVWithCitations(liste_eov=[]), afunc=_no_event_loop))
+    result = sync_only("Rapport C")
+    assert result["metadata"]["title"] == "Rapport C" and result["eov"] == {"liste_eov": []}
+
+
+def test_lease_is_renewed_while_a_document_is_processed(store):
+    store.lease_seconds = 0.3
+    claimed = []
+
+    def _slow(text):
+        time.sleep(1.0)
+        claimed.append(store.claim())
+        return processor(text)
+
+    job_id = store.create_job([{"text": "Rapport lent"}])
+    assert BatchWorkerPool(store, _slow).run_once()
+    assert claimed == [None]
+    assert store.status(job_id)["done"] == 1
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from app.schemas.feedback import POSSIBLE_EOVS, UserFeedback_EOV, MetadataFeedback
+from app.services.bulk_feedback import bulk_eov_metrics, bulk_metadata_acceptance, eov_feedback_matrices
+from app.services.eov_evaluator import EOV_INDEX
+
+
+def _eov_feedback(accepted=(), rejected=(), missing=()):
+    return UserFeedback_EOV(
+        file_name="doc.pdf", revision_date="2024-01-01", user_context="test",
+        feedback=[{"eov": e, "accept": "yes"} for e in accepted] + [{"eov": e, "accept": "No"} for e in rejected],
+        missing_eovs=[{"eov": e} for e in missing],
+    )
+
+
+def _single_feedback_metrics(feedback):
+    # Reference implementation copied from the single-feedback endpoint
+    tp = [i.eov for i in feedback.feedback if i.eov in POSSIBLE_EOVS and i.accept.lower() == "yes"]
+    fn = [i.eov for i in feedback.missing_eovs if i.eov in POSSIBLE_EOVS]
+    fp = [i.eov for i in feedback.feedback if i.eov in POSSIBLE_EOVS and i.accept.lower() == "no"]
+    precision = len(tp) / (len(tp) + len(fp)) if (len(tp) + len(fp)) > 0 else 0
+    recall = len(tp) / (len(tp) + len(fn)) if (len(tp) + len(fn)) > 0 else 0
+    f1 = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
+    return precision, recall, f1
+
+
+def test_per_document_metrics_match_the_single_feedback_endpoint():
+    feedbacks = [
+        _eov_feedback(accepted=["Oxygène", "Nutriments"], rejected=["Glace de mer"], missing=["Niveau marin"]),
+        _eov_feedback(rejected=["Oxygène", "Inconnue"]),
+        _eov_feedback(),
+    ]
+    matrices = eov_feedback_matrices(feedbacks)
+    assert matrices["tp"].shape == (3, len(POSSIBLE_EOVS))
+    assert matrices["tp"][0, EOV_INDEX["Oxygène"]]
+
+    metrics = bulk_eov_metrics(**matrices)
+    for row, feedback in enumerate(feedbacks):
+        expected = _single_feedback_metrics(feedback)
+        actual = tuple(metrics["per_document"][name][row] for name in ("precision", "recall", "f1_score"))
+        assert actual == pytest.approx(expected)
+
+
+def test_micro_and_macro_averages():
+    feedbacks = [
+        _eov_feedback(accepted=["Oxygène"], rejected=["Nutriments"]),
+        _eov_feedback(accepted=["Oxygène"], missing=["Nutriments"]),
+    ]
+    metrics = bulk_eov_metrics(**eov_feedback_matrices(feedbacks))
+    assert metrics["micro"] == pytest.approx({"precision": 2 / 3, "recall": 2 / 3, "f1_score": 2 / 3})
+    # Oxygène is perfect, Nutriments scores 0: macro averages the two EOVs only
+    assert metrics["macro"] == pytest.approx({"precision": 0.5, "recall": 0.5, "f1_score": 0.5})
+    assert np.array_equal(metrics["per_eov"]["true_positives"][EOV_INDEX["Oxygène"]], 2)
+
+
+def test_metadata_acceptance():
+    feedbacks = [
+        MetadataFeedback(file_name="a", revision_date="r", user_context="c", keywords_feedback={},
+                         metadata_feedback=[{"metadata_field": "title", "accept": "Accept"},
+                                            {"metadata_field": "theme", "accept": "reject"}]),
+        MetadataFeedback(file_name="b", revision_date="r", user_context="c", keywords_feedback={},
+                         metadata_feedback=[]),
+    ]
+    acceptance = bulk_metadata_acceptance(feedbacks)
+    assert acceptance["acceptance_rate_per_document"].tolist() == [0.5, 0.0]
+    assert acceptance["acceptance_rate"] == 0.5
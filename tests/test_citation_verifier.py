@@ -0,0 +1,71 @@
+import random
+import time
+
+from langchain_core.runnables import RunnableLambda
+
+from app.schemas.eov import EOVWithCitations
+from app.services.citation_verifier import SourceIndex, verify_citations, with_citation_verification
+
+TEXT = (
+    "Rapport   annuel.\n\nLes concentrations d’oxygène dissous ont diminué\n"
+    "dans l'estuaire du Saint-Laurent. La température de surface — mesurée par les bouées — a augmenté."
+)
+
+
+def _result(*citations):
+    return EOVWithCitations(liste_eov=[
+        {"eov": "Oxygène", "raison": "test", "citation": [{"citation_texte": c} for c in citations]},
+    ])
+
+
+def test_exact_match_maps_offsets_to_the_original_text():
+    quote = "les concentrations d'oxygène dissous ont diminué dans l'estuaire"
+    match = SourceIndex(TEXT).locate_citation(quote)
+    assert match.score == 1.0
+    assert TEXT[match.start:match.end] == "Les concentrations d’oxygène dissous ont diminué\ndans l'estuaire"
+
+
+def test_fuzzy_and_elided_citations():
+    index = SourceIndex(TEXT)
+    fuzzy = index.locate_citation("La temperature de surface, mesuree par les bouees, a augmente")
+    assert 0.8 <= fuzzy.score < 1.0
+    assert TEXT[fuzzy.start:fuzzy.end].startswith("La température")
+
+    elided = index.locate_citation("« Les concentrations d'oxygène [...] du Saint-Laurent »")
+    assert TEXT[elided.start:elided.end].startswith("Les concentrations")
+    assert TEXT[elided.start:elided.end].endswith("Saint-Laurent")
+
+
+def test_unfound_citations_are_flagged_or_dropped():
+    result = _result("Les concentrations d'oxygène dissous", "Le phytoplancton a fleuri au printemps")
+    flagged = verify_citations(TEXT, result).liste_eov[0].citation
+    assert [c.verified for c in flagged] == [True, False]
+    assert flagged[1].start is None
+
+    dropped = verify_citations(TEXT, result, mode="drop").liste_eov[0].citation
+    assert [c.citation_texte for c in dropped] == ["Les concentrations d'oxygène dissous"]
+
+
+def test_chain_wrapper_verifies_against_the_input_text():
+    chain = with_citation_verification(RunnableLambda(lambda inputs: _result("oxygène dissous", "absent du texte")))
+    output = chain.invoke({"text": TEXT})
+    assert [c.verified for c in output.liste_eov[0].citation] == [True, False]
+
+
+def test_dozens_of_citations_in_a_long_document_take_milliseconds():
+    rng = random.Random(0)
+    words = [f"mot{i}" for i in range(5000)]
+    text = " ".join(rng.choice(words) for _ in range(20000))
+    assert len(text) > 100_000
+    source_words = text.split()
+    citations = []
+    for _ in range(40):
+        start = rng.randrange(len(source_words) - 20)
+        quote = source_words[start:start + 15]
+        quote[7] = "changé"
+        citations.append(" ".join(quote))
+
+    start = time.perf_counter()
+    output = verify_citations(text, _result(*citations))
+    assert time.perf_counter() - start < 0.5
+    assert all(c.verified for c in output.liste_eov[0].citation)
@@ -0,0 +1,80 @@
+import asyncio
+
+from langchain_core.runnables import RunnableLambda
+
+from app.core.chain_setup_eov import prompt_eov_v1
+from app.schemas.eov import EOVWithCitations
+from app.services.eov_cascade import CASCADE_REPORT, EOVCascade
+from benchmarks.fake_llm import SAMPLE_DOCUMENT, SAMPLE_EOV
+
+GOOD = EOVWithCitations(liste_eov=[
+    {"eov": "Température sous la surface", "raison": "Profils de température.",
+     "citation": [{"citation_texte": "Des profils de température et de salinité ont été mesurés"}]},
+    {"eov": "Salinité sous la surface", "raison": "Profils de salinité.",
+     "citation": [{"citation_texte": "profils de température et de salinité ont été mesurés chaque mois"}]},
+    {"eov": "Oxygène", "raison": "Oxygène dissous.",
+     "citation": [{"citation_texte": "L'oxygène dissous a été mesuré au fond"}]},
+    {"eov": "Biomasse et diversité phytoplanctonique", "raison": "Échantillons de phytoplancton.",
+     "citation": [{"citation_texte": "Des échantillons de phytoplancton ont été prélevés"}]},
+])
+LARGE = EOVWithCitations(liste_eov=GOOD.liste_eov[:1])
+
+
+def _cascade(small_answer, calls):
+    def _small(inputs):
+        calls.append("small")
+        if isinstance(small_answer, Exception):
+            raise small_answer
+        return small_answer
+
+    def _large(inputs):
+        calls.append("large")
+        return LARGE
+
+    return EOVCascade(RunnableLambda(_small), RunnableLambda(_large), prompt=prompt_eov_v1,
+                      min_cited_ratio=1.0, min_lexicon_agreement=0.5)
+
+
+def test_check_reasons():
+    cascade = _cascade(GOOD, [])
+    assert cascade.check(SAMPLE_DOCUMENT, GOOD).accepted
+
+    invented = GOOD.model_copy(deep=True)
+    invented.liste_eov[0].eov = "Température de la mer"
+    invented.liste_eov[1].citation[0].citation_texte = "La salinité a été mesurée par satellite au large."
+    check = cascade.check(SAMPLE_DOCUMENT, invented)
+    assert check.reasons == ["unknown_eov", "uncited_eov", "citations"]
+    assert check.cited_ratio == 0.75
+
+    # Temperature, salinity, oxygen and phytoplankton are named in the text; one of four returned
+    check = cascade.check(SAMPLE_DOCUMENT, LARGE)
+    assert check.reasons == ["lexicon"] and check.lexicon_agreement == 0.25
+
+
+def test_small_answer_is_kept_when_it_passes_the_checks():
+    calls = []
+    cascade = _cascade(GOOD, calls)
+    report = {}
+    result = asyncio.run(cascade.as_runnable().ainvoke({"text": SAMPLE_DOCUMENT},
+                                                       {"metadata": {CASCADE_REPORT: report}}))
+    assert result == GOOD and calls == ["small"]
+    assert report == {"calls": 1, "escalated": 0, "reasons": [], "tier": "small"}
+    assert cascade.counters() == {("small", "accepted"): 1}
+
+
+def test_failing_answers_escalate_to_the_large_model():
+    calls = []
+    cascade = _cascade(EOVWithCitations(liste_eov=[]), calls)
+    report = {}
+    result = cascade.as_runnable().invoke({"text": SAMPLE_DOCUMENT}, {"metadata": {CASCADE_REPORT: report}})
+    assert result == LARGE and calls == ["small", "large"]
+    assert report["tier"] == "large" and report["reasons"] == ["lexicon"]
+
+    calls.clear()
+    cascade = _cascade(RuntimeError("rate limited"), calls)
+    assert asyncio.run(cascade.as_runnable().ainvoke({"text": SAMPLE_DOCUMENT})) == LARGE
+    assert calls == ["small", "large"] and cascade.counters() == {("large", "error"): 1}
+
+
+def test_benchmark_fake_answer_is_valid():
+    assert _cascade(SAMPLE_EOV, []).check(SAMPLE_DOCUMENT, SAMPLE_EOV).accepted
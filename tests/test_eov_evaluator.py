@@ -0,0 +1,27 @@
+import random
+
+import pytest
+
+from app.services.eov_evaluator import evaluate_eov_feedback
+from benchmarks.bench_eov_evaluator import legacy_evaluation, random_feedback
+
+
+def test_matches_the_previous_endpoint_code():
+    rng = random.Random(1)
+    for _ in range(50):
+        feedback = random_feedback(rng)
+        expected = legacy_evaluation(feedback)
+        actual = evaluate_eov_feedback(feedback)
+        assert actual["table"] == expected["table"]
+        for metric in ("precision", "recall", "f1_score"):
+            assert actual[metric] == pytest.approx(expected[metric])
+        assert len(actual["true_negatives"]) == sum(row["True Negative"] for row in expected["table"])
+
+
+def test_unknown_eovs_and_other_answers_are_ignored():
+    feedback = random_feedback(random.Random(2))
+    feedback.feedback[0].eov = "Inconnue"
+    feedback.feedback[1].accept = "maybe"
+    evaluation = evaluate_eov_feedback(feedback)
+    assert "Inconnue" not in evaluation["true_positives"] + evaluation["false_positives"]
+    assert feedback.feedback[1].eov in evaluation["true_negatives"]
@@ -0,0 +1,71 @@
+from langchain_core.runnables import RunnableLambda
+
+from app.core.chain_setup_eov import prompt_eov_v1
+from app.schemas.feedback import POSSIBLE_EOVS
+from app.services.eov_prefilter import (
+    EOVPrefilter, eov_prompt_with_prefilter, evaluate_prefilter, parse_eov_prompt, prefilter_settings,
+)
+from app.services.result_cache import chain_fingerprint
+
+TEXT = (
+    "Ce jeu de données contient des profils CTD de température et de salinité ainsi que "
+    "des mesures d'oxygène dissous dans l'estuaire du Saint-Laurent."
+)
+
+prefilter = EOVPrefilter(prompt_eov_v1, top_k=6)
+
+
+def test_prompt_is_parsed_without_loss():
+    _, definitions, _ = parse_eov_prompt(prompt_eov_v1)
+    assert len(definitions) == 29
+    assert prefilter.build_prompt(d.name for d in definitions) == prompt_eov_v1
+
+
+def test_candidates_cover_every_possible_eov():
+    assert set(prefilter.names) | {"Autre"} == set(POSSIBLE_EOVS)
+    assert len(prefilter.names) == len(POSSIBLE_EOVS) - 1
+    # EOVs the system prompt does not define are offered in reduced prompts, in their category
+    selection = prefilter.select("Relevés de chalut: abondance de morue et de sébaste dans le golfe.")
+    assert "Abondance et diversité de poissons" in selection.candidates
+    biology = selection.prompt.index("'Biology and Ecosystems'")
+    assert selection.prompt.index("- 'Abondance et diversité de poissons' :") > biology
+
+
+def test_reduced_prompt_keeps_named_eovs_and_other():
+    selection = prefilter.select(TEXT)
+    assert not selection.fallback
+    assert {"Oxygène", "Salinité sous la surface", "Température sous la surface"} <= set(selection.candidates)
+    assert len(selection.candidates) == 6
+    assert "'Autre' :" in selection.prompt
+    assert "'Débris marins' :" not in selection.prompt
+    assert prefilter.report(selection)["tokens_saved"] > 0
+
+
+def test_falls_back_to_the_full_prompt_without_signal():
+    selection = prefilter.select("Rapport annuel du conseil d'administration.")
+    assert selection.fallback
+    assert selection.prompt == prompt_eov_v1
+
+
+def test_evaluation_reports_recall():
+    samples = [(TEXT, ["Oxygène", "Salinité sous la surface"]), (TEXT, ["Débris marins", "Autre"])]
+    result = evaluate_prefilter(prefilter, samples)
+    assert result["recall"] == 2 / 3
+    assert result["documents_with_full_recall"] == 0.5
+
+
+def test_prompt_stage_feeds_the_reduced_prompt_to_the_model():
+    chain = eov_prompt_with_prefilter(prompt_eov_v1, top_k=3) | RunnableLambda(lambda prompt: prompt.to_messages())
+    system, user = chain.invoke({"text": TEXT})
+    assert "'Oxygène' :" in system.content and "'Nutriments' :" not in system.content
+    assert user.content == TEXT
+
+
+def test_prefilter_settings_change_the_fingerprint():
+    model = RunnableLambda(lambda _: None)
+    fingerprints = {
+        chain_fingerprint(prompt_eov_v1 + prefilter_settings(enabled=enabled, top_k=top_k), model)
+        for enabled, top_k in ((False, 10), (True, 10), (True, 15))
+    }
+    assert len(fingerprints) == 3
+    assert prefilter_settings(enabled=False) == ""
@@ -0,0 +1,68 @@
+import asyncio
+
+from langchain_core.runnables import RunnableLambda
+
+from app.schemas.eov import EOVWithCitations
+from app.services.eov_revision import diff_sections, reextract_eov
+
+PARAGRAPHS = [f"Paragraphe {i} : description générale de la campagne {i} dans l'estuaire." for i in range(10)]
+PARAGRAPHS[2] = "L'oxygène dissous a été mesuré au fond avec une sonde optique."
+PARAGRAPHS[5] = "La salinité de surface a été mesurée à chaque station."
+PREVIOUS_TEXT = "\n\n".join(PARAGRAPHS)
+PREVIOUS_EOV = EOVWithCitations(liste_eov=[
+    {"eov": "Oxygène", "raison": "Mesures d'oxygène.",
+     "citation": [{"citation_texte": "L'oxygène dissous a été mesuré au fond"}]},
+    {"eov": "Salinité de surface", "raison": "Mesures de salinité.",
+     "citation": [{"citation_texte": "La salinité de surface a été mesurée"}]},
+])
+PHYTOPLANKTON = "Des échantillons de phytoplancton ont été prélevés pour estimer la biomasse."
+PHYTOPLANKTON_EOV = EOVWithCitations(liste_eov=[
+    {"eov": "Biomasse et diversité phytoplanctonique", "raison": "Échantillons de phytoplancton.",
+     "citation": [{"citation_texte": "Des échantillons de phytoplancton ont été prélevés"}]},
+])
+
+
+def _revision(paragraphs):
+    return "\n\n".join(paragraphs)
+
+
+def _fake_chain(calls):
+    def _chain(inputs):
+        calls.append(inputs["text"])
+        return PHYTOPLANKTON_EOV
+    return RunnableLambda(_chain)
+
+
+def test_diff_ignores_reflowed_paragraphs():
+    reflowed = PREVIOUS_TEXT.replace(" dans l'estuaire", "\ndans   l'estuaire")
+    assert diff_sections(PREVIOUS_TEXT, reflowed).changed == []
+
+    paragraphs = PARAGRAPHS[:5] + PARAGRAPHS[6:] + ["Nouveau paragraphe."]
+    paragraphs[1] = "Paragraphe 1 révisé."
+    diff = diff_sections(PREVIOUS_TEXT, _revision(paragraphs))
+    assert diff.changed == ["Paragraphe 1 révisé.", "Nouveau paragraphe."]
+    assert diff.removed == 2
+
+
+def test_only_changed_sections_are_sent_and_deleted_citations_dropped():
+    paragraphs = list(PARAGRAPHS)
+    del paragraphs[5]
+    paragraphs[7] = PHYTOPLANKTON
+    calls = []
+    result, report = asyncio.run(reextract_eov(_revision(paragraphs), PREVIOUS_TEXT, PREVIOUS_EOV, _fake_chain(calls)))
+
+    assert calls == [PHYTOPLANKTON]
+    assert [item.eov for item in result.liste_eov] == ["Oxygène", "Biomasse et diversité phytoplanctonique"]
+    assert report["citations_dropped"] == 1 and not report["full_run"]
+    assert report["estimated_tokens_sent"] * 5 < report["estimated_tokens_document"]
+
+
+def test_unchanged_and_rewritten_revisions():
+    calls = []
+    result, report = asyncio.run(reextract_eov(PREVIOUS_TEXT, PREVIOUS_TEXT, PREVIOUS_EOV, _fake_chain(calls)))
+    assert calls == [] and result == PREVIOUS_EOV and report["estimated_tokens_sent"] == 0
+
+    rewritten = _revision([PHYTOPLANKTON] + [f"Autre texte {i}." for i in range(9)])
+    result, report = asyncio.run(reextract_eov(rewritten, PREVIOUS_TEXT, PREVIOUS_EOV, _fake_chain(calls)))
+    assert calls == [rewritten] and report["full_run"]
+    assert result == PHYTOPLANKTON_EOV
@@ -0,0 +1,70 @@
+import asyncio
+
+from langchain_core.runnables import RunnableLambda
+
+from app.schemas.eov import EOVWithCitations
+from app.schemas.metadata import MetadataSchemaCIOOS
+from app.services.extraction import extract_document, stream_extraction
+
+METADATA = MetadataSchemaCIOOS(
+    title="Titre", resource_type="Rapport", theme="Oceanographic", title_translated="Title",
+    auteurs=["A. Auteur"], summary="Résumé", summary_translated={"en": "Summary"},
+    mots_cles={"en": ["wind"], "fr": ["vents"]}, langue="fr",
+    date_debut="01-01-2020", date_fin="31-12-2020", spatial="Non disponible",
+)
+EOV = EOVWithCitations(liste_eov=[])
+
+
+def _slow(result, seconds):
+    async def _run(_inputs):
+        await asyncio.sleep(seconds)
+        if isinstance(result, Exception):
+            raise result
+        return result
+    return RunnableLambda(lambda _inputs: result, afunc=_run)
+
+
+def test_chains_run_concurrently():
+    result = asyncio.run(extract_document("texte", _slow(METADATA, 0.2), _slow(EOV, 0.2)))
+    assert result["metadata"] == METADATA
+    assert result["full_metadata"].title.fr == "Titre"
+    assert result["timings"]["total"] < 0.35
+
+
+def test_failed_chain_cancels_the_other():
+    finished = []
+
+    async def _eov(_inputs):
+        await asyncio.sleep(0.3)
+        finished.append("eov")
+        return EOV
+
+    async def _run():
+        try:
+            await extract_document("texte", _slow(RuntimeError("model unavailable"), 0.01),
+                                   RunnableLambda(lambda _inputs: EOV, afunc=_eov))
+        except RuntimeError:
+            await asyncio.sleep(0.4)
+            return True
+        return False
+
+    assert asyncio.run(_run())
+    assert finished == []
+
+
+def test_stream_yields_fastest_half_first():
+    async def _collect():
+        return [event async for event in stream_extraction("texte", _slow(METADATA, 0.2), _slow(EOV, 0.01))]
+
+    events = asyncio.run(_collect())
+    assert [name for name, _ in events] == ["eov", "metadata", "end"]
+    assert events[1][1]["full_metadata"]["language"] == "fr"
+
+
+def test_stream_reports_failed_half_and_keeps_the_other():
+    async def _collect():
+        return [event async for event in stream_extraction("texte", _slow(ValueError("boom"), 0.01), _slow(EOV, 0.01))]
+
+    events = dict(asyncio.run(_collect()))
+    assert events["error"] == {"part": "metadata", "detail": "boom"}
+    assert "eov" in events and "end" in events
@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+from app.services.feedback_queue import FeedbackQueue, FeedbackWorkerPool, QueueFullError, current_item_key
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return FeedbackQueue(path=str(tmp_path / "queue.sqlite3"), max_depth=3, max_attempts=2, lease_seconds=60)
+
+
+def test_items_are_processed_in_order_and_persisted(queue, tmp_path):
+    first = queue.enqueue("eov", {"file_name": "a.pdf"})
+    queue.enqueue("metadata", {"file_name": "b.pdf"})
+
+    reopened = FeedbackQueue(path=str(tmp_path / "queue.sqlite3"))
+    item = reopened.claim()
+    assert item["id"] == first and item["payload"] == {"file_name": "a.pdf"}
+    reopened.complete(item["id"])
+
+    status = queue.status()
+    assert status["done"] == 1 and status["depth"] == 1 and status["lag_seconds"] >= 0
+
+
+def test_backpressure_when_queue_is_full(queue):
+    for _ in range(3):
+        queue.enqueue("eov", {})
+    with pytest.raises(QueueFullError):
+        queue.enqueue("eov", {})
+
+
+def test_failures_are_retried_then_parked(queue):
+    calls = []
+
+    def _flaky(payload):
+        calls.append(payload)
+        raise RuntimeError("tracking server down")
+
+    pool = FeedbackWorkerPool(queue, {"eov": _flaky})
+    item_id = queue.enqueue("eov", {"n": 1})
+
+    assert pool.run_once()
+    assert queue.get(item_id)["status"] == "pending"
+    assert not pool.run_once()  # waiting for its backoff
+
+    queue._connect().execute("UPDATE feedback_queue SET available_at = 0")
+    assert pool.run_once()
+    item = queue.get(item_id)
+    assert item["status"] == "failed" and item["last_error"] == "tracking server down"
+    assert len(calls) == 2
+
+    assert queue.retry_failed() == 1
+    assert queue.get(item_id)["status"] == "pending"
+
+
+def test_expired_lease_is_reclaimed(queue):
+    queue.lease_seconds = -1
+    item_id = queue.enqueue("eov", {})
+    assert queue.claim()["id"] == item_id
+    assert queue.claim()["id"] == item_id
+
+
+def test_lease_is_renewed_while_the_handler_runs(queue):
+    queue.lease_seconds = 0.3
+    keys, claimed = [], []
+
+    def _slow(payload):
+        keys.append(current_item_key.get())
+        time.sleep(1.0)
+        claimed.append(queue.claim())
+
+    item_id = queue.enqueue("eov", {})
+    assert FeedbackWorkerPool(queue, {"eov": _slow}).run_once()
+    assert claimed == [None]
+    assert queue.get(item_id)["status"] == "done"
+    assert keys[0].startswith(f"{item_id}-") and current_item_key.get() is None
+
+
+def test_worker_threads_drain_the_queue(queue):
+    done = []
+    pool = FeedbackWorkerPool(queue, {"eov": done.append}, workers=2, poll_seconds=0.05)
+    pool.start()
+    try:
+        for i in range(3):
+            queue.enqueue("eov", {"n": i})
+        deadline = time.time() + 5
+        while queue.status()["done"] < 3 and time.time() < deadline:
+            time.sleep(0.02)
+    finally:
+        pool.stop()
+    assert sorted(item["n"] for item in done) == [0, 1, 2]
@@ -0,0 +1,73 @@
+import calendar
+import time
+
+import pytest
+
+from app.schemas.feedback import MetadataFeedback, UserFeedback_EOV
+from app.services.feedback_store import FeedbackStore
+
+
+def _timestamp(day: str) -> float:
+    return calendar.timegm(time.strptime(day, "%Y-%m-%d"))
+
+
+def _eov_feedback(file_name, accepted, rejected=(), missing=()):
+    return UserFeedback_EOV(
+        file_name=file_name, revision_date="2024-01-01", user_context="test",
+        feedback=[{"eov": eov, "accept": "yes"} for eov in accepted] + [{"eov": eov, "accept": "no"} for eov in rejected],
+        missing_eovs=[{"eov": eov} for eov in missing],
+    )
+
+
+@pytest.fixture
+def store(tmp_path):
+    return FeedbackStore(str(tmp_path / "feedback_store.sqlite3"))
+
+
+def test_eov_counters_give_precision_and_recall_per_period(store):
+    store.add_eov_feedback(_eov_feedback("a.pdf", ["Oxygène", "Nutriments"], rejected=["Glace de mer"]),
+                           submitted_at=_timestamp("2024-01-15"))
+    store.add_eov_feedback(_eov_feedback("b.pdf", ["Oxygène"], missing=["Nutriments"]),
+                           submitted_at=_timestamp("2024-02-03"))
+    store.add_eov_feedback(_eov_feedback("c.pdf", [], rejected=["Oxygène"]), submitted_at=_timestamp("2024-04-20"))
+
+    oxygen = store.eov_trend("Oxygène", bucket="quarter")
+    assert [point["period"] for point in oxygen["trend"]] == ["2024-Q1", "2024-Q2"]
+    assert oxygen["trend"][0]["precision"] == 1.0 and oxygen["trend"][1]["precision"] == 0
+    assert oxygen["totals"]["tp"] == 2 and oxygen["totals"]["fp"] == 1
+
+    nutrients = store.eov_trend("Nutriments", since="2024-02-01", until="2024-03-31")
+    assert nutrients["totals"]["recall"] == 0 and nutrients["totals"]["fn"] == 1
+    assert store.eov_trend("Oxygène", since="2025-01-01")["totals"]["precision"] == 0
+
+    summary = store.eov_summary()
+    assert summary[0]["eov"] == "Oxygène"
+    assert {row["eov"] for row in summary} == {"Oxygène", "Nutriments", "Glace de mer"}
+
+    files = store.file_feedback("b.pdf", revision_date="2024-01-01")
+    assert files[0]["eovs"] == [{"eov": "Oxygène", "outcome": "tp"}, {"eov": "Nutriments", "outcome": "fn"}]
+    assert files[0]["recall"] == 0.5
+
+    # Rejected and also listed as missing: both outcomes are kept, as in the counters
+    store.add_eov_feedback(_eov_feedback("d.pdf", [], rejected=["Oxygène"], missing=["Oxygène"]))
+    files = store.file_feedback("d.pdf")
+    assert files[0]["eovs"] == [{"eov": "Oxygène", "outcome": "fp"}, {"eov": "Oxygène", "outcome": "fn"}]
+    assert (files[0]["fp"], files[0]["fn"]) == (1, 1)
+
+
+def test_keywords_are_counted_across_spellings(store):
+    for accept, justification in (("accept", None), ("accept", "Selected from dropdown"), ("reject", None)):
+        store.add_metadata_feedback(MetadataFeedback(
+            file_name="a.pdf", revision_date="2024-01-01", user_context="test",
+            metadata_feedback=[{"metadata_field": "title", "accept": accept}],
+            keywords_feedback={"fr": [{"keyword": "Mammifères marins", "accept": accept,
+                                       "justification": justification},
+                                      {"keyword": "Salinité", "accept": "accept"}]},
+        ), submitted_at=_timestamp("2024-03-01"))
+
+    trend = store.keyword_trend("mammifère-marin", language="fr")
+    assert trend["totals"] == {"api_accepted": 1, "manual_added": 1, "rejected": 1,
+                               "acceptance_rate": 0.5, "accuracy_rate": 0.5}
+    assert [row["keyword"] for row in store.keyword_summary(language="fr")] == ["Mammifères marins", "Salinité"]
+    assert store.metadata_trend("title", bucket="year")["trend"] == [
+        {"period": "2024", "accepted": 2, "rejected": 1, "acceptance_rate": 0.6667}]
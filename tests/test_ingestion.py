@@ -0,0 +1,82 @@
+import asyncio
+import gzip
+import os
+
+import pytest
+
+from app.services.ingestion import (IngestionError, UploadTooLargeError, normalize_document_text, normalize_file,
+                                    spool_upload)
+
+PAGE = """Rapport technique 2021 - Pêches et Océans Canada
+{number}
+
+1.{number} {station}
+La température de l'eau à {station} a été mesu-
+rée   chaque   semaine.
+
+Page {number} de 3
+"""
+REPORT = "".join(PAGE.format(number=n, station=s) for n, s in enumerate(["Rimouski", "Tadoussac", "Gaspé"], 1)) + """
+Références
+Galbraith, P. S. 2021. Conditions océanographiques physiques.
+Smith, J. 2019. Salinité du golfe.
+
+2. Conclusion
+La salinité est stable.
+"""
+
+
+def _chunks(data, size=7):
+    async def gen():
+        for i in range(0, len(data), size):
+            yield data[i:i + size]
+    return gen()
+
+
+def test_headers_page_numbers_and_hyphens_are_removed():
+    document = normalize_document_text(REPORT)
+    assert document.text.count("Rapport technique 2021") == 1
+    assert "Page 2 de 3" not in document.text
+    assert "\n2\n" not in document.text
+    assert "Gaspé a été mesurée chaque semaine." in document.text
+    assert "1.3 Gaspé" in document.text
+    assert document.stats["repeated_lines"] == 2
+    assert document.stats["page_numbers"] == 6
+    assert document.stats["hyphens_repaired"] == 3
+    assert document.stats["tokens_after"] < document.stats["tokens_before"]
+
+
+def test_sections_are_dropped_until_the_next_heading():
+    assert "Galbraith" in normalize_document_text(REPORT).text
+    document = normalize_document_text(REPORT, drop_sections=["references"])
+    assert "Galbraith" not in document.text and "Smith" not in document.text
+    assert "La salinité est stable." in document.text
+    assert document.stats["section_lines"] == 3
+    with pytest.raises(IngestionError):
+        normalize_document_text(REPORT, drop_sections=["methods"])
+
+
+def test_gzip_upload_is_spooled_and_normalized(tmp_path):
+    data = gzip.compress(REPORT.encode("utf-8"))
+    path = asyncio.run(spool_upload(_chunks(data), directory=str(tmp_path)))
+    try:
+        assert normalize_file(path).text == normalize_document_text(REPORT).text
+    finally:
+        os.unlink(path)
+
+    with pytest.raises(UploadTooLargeError):
+        asyncio.run(spool_upload(_chunks(data), max_bytes=len(data) - 1, directory=str(tmp_path)))
+    assert os.listdir(tmp_path) == []
+
+
+def test_gzip_bomb_is_rejected_while_decompressing(tmp_path):
+    # ~5 MB of text compressed to a few kB
+    data = gzip.compress(("a" * 99 + "\n").encode("utf-8") * 50000)
+    assert len(data) < 50000
+    path = asyncio.run(spool_upload(_chunks(data, size=4096), max_bytes=len(data), directory=str(tmp_path)))
+    try:
+        with pytest.raises(UploadTooLargeError):
+            normalize_file(path, max_text_bytes=1024 * 1024)
+        assert normalize_file(path, max_text_bytes=10 * 1024 * 1024).stats["lines_before"] == 50000
+    finally:
+        os.unlink(path)
@@ -0,0 +1,40 @@
+from app.utils.helpers import evaluate_keyword_feedback
+from app.utils.keyword_vocabulary import KEYWORD_VOCABULARY, normalize_keyword
+
+
+def test_vocabulary_is_indexed_in_both_languages():
+    assert len(KEYWORD_VOCABULARY.entries) == 25
+    assert KEYWORD_VOCABULARY.lookup("Zone Cotiere").en == "coastal zone"
+    assert KEYWORD_VOCABULARY.lookup("Marine mammals").fr == "mammifères marins"
+    assert normalize_keyword("Land-use planning") == normalize_keyword("land use plannings")
+    assert KEYWORD_VOCABULARY.lookup("phoques") is None
+
+
+def test_free_text_keywords_are_matched_to_the_closest_entry():
+    match = KEYWORD_VOCABULARY.match("temperature de leau")
+    assert match.entry.en == "water temperature" and not match.exact and match.score >= 0.85
+    assert KEYWORD_VOCABULARY.translate("Bassin-versant", "en") == "watershed"
+    assert KEYWORD_VOCABULARY.match("salinité") is None
+
+
+def test_prompt_lists_every_pair():
+    lines = KEYWORD_VOCABULARY.prompt_list().splitlines()
+    assert len(lines) == 25
+    assert lines[0] == '        "en": "abundance and biomass", "fr": "abondance et biomasse"'
+
+
+def test_keyword_feedback_evaluation():
+    feedback = [
+        {"keyword": "Changement climatique", "accept": "accept", "justification": None},
+        {"keyword": "phoques", "accept": "Accept", "justification": " Added manually by user "},
+        {"keyword": "vent", "accept": "accept", "justification": "selected from dropdown"},
+        {"keyword": "bar rayé", "accept": "reject", "justification": "absent du texte"},
+    ]
+    evaluation = evaluate_keyword_feedback(feedback)
+
+    assert [item["keyword"] for item in evaluation["api_accepted_keywords"]] == ["Changement climatique"]
+    assert [item["keyword"] for item in evaluation["manual_added_keywords"]] == ["phoques", "vent"]
+    assert evaluation["count_rejected"] == 1 and evaluation["final_true_count"] == 3
+    assert evaluation["accuracy_rate"] == 0.33
+    assert evaluation["vocabulary_accepted_count"] == 2
+    assert [item["en"] for item in evaluation["vocabulary_keywords"]] == ["climate change", "wind"]
@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+import pytest
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+from app.schemas.eov import EOVWithCitations
+from app.services.llm_cassette import CassetteChatOpenAI, CassetteMissError, cassette_store
+from benchmarks.fake_llm import SAMPLE_DOCUMENT, SAMPLE_EOV, fake_openai
+
+PROMPT = ChatPromptTemplate.from_messages([("system", "Identifiez les EOV."), ("user", "{text}")])
+
+
+def _chain(path, mode, latency_scale=0.0, **kwargs):
+    model = CassetteChatOpenAI(model="gpt-4o-2024-08-06", temperature=0.1, seed=42, api_key="sk-fake",
+                               cassette_mode=mode, cassette_path=path, latency_scale=latency_scale, **kwargs)
+    return PROMPT | model.with_structured_output(EOVWithCitations, method="json_schema")
+
+
+def test_recorded_responses_are_replayed_without_calling_openai(tmp_path):
+    path = str(tmp_path / "cassette.sqlite3")
+    with fake_openai(latency=0.05) as backend:
+        recorded = _chain(path, "record").invoke({"text": SAMPLE_DOCUMENT})
+        assert backend.calls == 1
+
+    # Outside the fake backend, any real call would fail without network access
+    replayed = _chain(path, "replay").invoke({"text": SAMPLE_DOCUMENT})
+    assert replayed == recorded == SAMPLE_EOV
+
+    start = time.monotonic()
+    asyncio.run(_chain(path, "replay", latency_scale=1.0).ainvoke({"text": SAMPLE_DOCUMENT}))
+    assert time.monotonic() - start >= 0.05
+
+    with pytest.raises(CassetteMissError):
+        _chain(path, "replay").invoke({"text": "Un autre document"})
+
+
+def test_identical_responses_are_stored_once(tmp_path):
+    path = str(tmp_path / "cassette.sqlite3")
+    with fake_openai():
+        for text in ("Document A", "Document B"):
+            _chain(path, "record").invoke({"text": text})
+    assert cassette_store(path).stats()["requests"] == 2
+    assert cassette_store(path).stats()["bodies"] == 1
+
+
+def test_streamed_responses_are_replayed_as_streams(tmp_path):
+    path = str(tmp_path / "cassette.sqlite3")
+    response_format = {"type": "json_schema", "json_schema": {
+        "name": "EOVWithCitations", "schema": EOVWithCitations.model_json_schema(), "strict": False}}
+
+    def _stream(mode):
+        model = CassetteChatOpenAI(model="gpt-4o-2024-08-06", api_key="sk-fake", cassette_mode=mode,
+                                   cassette_path=path, latency_scale=0.0)
+        chain = PROMPT | model.bind(response_format=response_format) | JsonOutputParser()
+        return list(chain.stream({"text": SAMPLE_DOCUMENT}))
+
+    with fake_openai():
+        recorded = _stream("record")
+    replayed = _stream("replay")
+    assert len(replayed) > 1
+    assert replayed[-1] == recorded[-1] == SAMPLE_EOV.model_dump()
@@ -0,0 +1,70 @@
+import asyncio
+import time
+
+from langchain_core.runnables import RunnableLambda
+
+from app.schemas.eov import EOVWithCitations
+from app.services.long_document import (
+    CHUNK_REPORT_EVENT, merge_eov_results, split_document, with_long_document_mode,
+)
+
+
+def _eovs(*items):
+    return EOVWithCitations(liste_eov=[
+        {"eov": eov, "raison": raison, "citation": [{"citation_texte": c} for c in citations]}
+        for eov, raison, citations in items
+    ])
+
+
+def test_split_document_overlaps_chunks():
+    text = "\n\n".join(f"Paragraphe {i} " + "mot " * 40 for i in range(40))
+    chunks = split_document(text, chunk_tokens=200, overlap_tokens=50)
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 800 for chunk in chunks)
+    assert chunks[0][-100:].split()[-1] in chunks[1]
+
+
+def test_merge_dedupes_eovs_and_citations_and_keeps_best_reason():
+    merged = merge_eov_results([
+        _eovs(("Oxygène", "court", ["O2 dissous"]), ("Nutriments", "n", ["nitrates"])),
+        _eovs(("oxygène ", "explication plus riche", ["O2  dissous", "saturation en oxygène"])),
+    ])
+    assert [item.eov for item in merged.liste_eov] == ["Oxygène", "Nutriments"]
+    oxygen = merged.liste_eov[0]
+    assert oxygen.raison == "explication plus riche"
+    assert [c.citation_texte for c in oxygen.citation] == ["O2 dissous", "saturation en oxygène"]
+
+
+def test_long_documents_are_mapped_in_parallel_and_reported():
+    calls = []
+
+    async def _answer(inputs):
+        calls.append(inputs["text"])
+        await asyncio.sleep(0.1)
+        return _eovs(("Oxygène", "r", [inputs["text"][:10]]))
+
+    chain = RunnableLambda(lambda inputs: None, afunc=_answer)
+    wrapped = with_long_document_mode(chain, threshold_tokens=100, chunk_tokens=100,
+                                      overlap_tokens=10, max_concurrency=8)
+
+    assert asyncio.run(wrapped.ainvoke({"text": "court"})).liste_eov[0].citation[0].citation_texte == "court"
+
+    calls.clear()
+    text = " ".join(f"phrase{i}" for i in range(300))
+
+    async def _run():
+        events = []
+        async for event in wrapped.astream_events({"text": text}, version="v2"):
+            if event["event"] == "on_custom_event" and event["name"] == CHUNK_REPORT_EVENT:
+                events.append(event["data"])
+            if event["event"] == "on_chain_end" and event["name"] == "long_document_eov":
+                events.append(event["data"]["output"])
+        return events
+
+    start = time.perf_counter()
+    report, result = asyncio.run(_run())
+    assert len(calls) > 3
+    assert time.perf_counter() - start < 0.1 * len(calls)
+    assert len(report["chunks"]) == len(calls)
+    assert len(result.liste_eov) == 1
+    assert len(result.liste_eov[0].citation) == len(calls)
@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+from langchain_core.language_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+from app.core.chain_setup_metadata import STREAMING_FIELD_ORDER, metadata_response_format
+from app.services.metadata_stream import stream_metadata
+from app.services.result_cache import ResultCache
+
+METADATA = {
+    "title": "Relevés CTD dans l'estuaire",
+    "resource_type": "Jeu de données",
+    "langue": "fr",
+    "theme": "Océanographie",
+    "title_translated": "CTD surveys in the estuary",
+    "date_debut": "2020-01-01",
+    "date_fin": "2020-12-31",
+    "spatial": "Estuaire du Saint-Laurent",
+    "auteurs": ["A. Tremblay"],
+    "mots_cles": {"en": ["temperature"], "fr": ["température"]},
+    "summary": "Des profils de température et de salinité ont été mesurés chaque mois.",
+    "summary_translated": {"en": "Temperature and salinity profiles were measured monthly."},
+}
+
+
+def _chain(content=json.dumps(METADATA, ensure_ascii=False)):
+    model = GenericFakeChatModel(messages=iter([AIMessage(content=content)]))
+    return ChatPromptTemplate.from_messages([("user", "{text}")]) | model | JsonOutputParser()
+
+
+def _collect(chain, **kwargs):
+    async def _run():
+        return [event async for event in stream_metadata("document", chain, **kwargs)]
+    return asyncio.run(_run())
+
+
+def test_streaming_schema_puts_short_fields_first():
+    schema = metadata_response_format["json_schema"]["schema"]
+    assert list(schema["properties"]) == STREAMING_FIELD_ORDER == list(METADATA)
+    assert schema["required"] == STREAMING_FIELD_ORDER
+
+
+def test_fields_arrive_in_order_and_summary_streams():
+    events = _collect(_chain())
+    fields = [data["field"] for name, data in events if name == "field"]
+    assert fields == STREAMING_FIELD_ORDER
+
+    deltas = [data for name, data in events if name == "delta"]
+    assert len([d for d in deltas if d["field"] == "summary"]) > 1
+    assert "".join(d["text"] for d in deltas if d["field"] == "summary") == METADATA["summary"]
+    assert "".join(d["text"] for d in deltas if d["field"] == "summary_translated.en") == METADATA["summary_translated"]["en"]
+
+    names = [name for name, _ in events]
+    assert names.index("field") < names.index("metadata") < names.index("end") == len(names) - 1
+    final = dict(events)["metadata"]
+    assert final["metadata"]["title"] == METADATA["title"] and "full_metadata" in final
+
+
+def test_results_are_cached_and_replayed(tmp_path):
+    cache = ResultCache(path=str(tmp_path / "cache.sqlite3"))
+    _collect(_chain(), cache=cache, key="k")
+    replay = _collect(_chain(), cache=cache, key="k")
+    assert dict(replay)["metadata"]["cached"] is True
+    assert [data["field"] for name, data in replay if name == "field"][:3] == ["title", "resource_type", "theme"]
+
+
+def test_invalid_output_ends_with_an_error():
+    events = _collect(_chain('{"title": "Incomplet"}'))
+    assert [name for name, _ in events][-2:] == ["error", "end"]
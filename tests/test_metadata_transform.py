@@ -0,0 +1,49 @@
+import asyncio
+import json
+
+from app.schemas.metadata import FullMetadataSchema, MetadataSchemaCIOOS
+from app.services.metadata_transform import FULL_METADATA_TEMPLATE, full_metadata_dict, transform_metadata_to_full, transform_ndjson
+
+METADATA = {
+    "title": "Relevés CTD dans l'estuaire",
+    "resource_type": "Jeu de données",
+    "theme": "Oceanographic",
+    "title_translated": "CTD surveys in the estuary",
+    "auteurs": ["A. Tremblay"],
+    "summary": "Des profils de température ont été mesurés.",
+    "summary_translated": {"en": "Temperature profiles were measured."},
+    "mots_cles": {"en": ["water temperature"], "fr": ["température de l'eau"]},
+    "langue": "fr",
+    "date_debut": "01-01-2020",
+    "date_fin": "31-12-2020",
+    "spatial": "Non disponible",
+}
+
+
+def test_template_copy_matches_a_fully_validated_record():
+    metadata = MetadataSchemaCIOOS(**METADATA)
+    full = transform_metadata_to_full(metadata)
+    validated = FullMetadataSchema.model_validate(full.model_dump())
+
+    assert full.model_dump() == validated.model_dump() == full_metadata_dict(metadata)
+    assert full.title.translations["fr"].message == METADATA["title"] and full.resourceType == ["Jeu de données"]
+    assert full.limitations.translations["fr"].verified is True
+    # The template itself is left untouched
+    assert FULL_METADATA_TEMPLATE.title.fr == "" and FULL_METADATA_TEMPLATE.resourceType == []
+
+
+def test_ndjson_stream_is_transformed_in_order():
+    lines = [json.dumps({**METADATA, "title": f"Titre {i}"}).encode() for i in range(3)]
+    body = b"\n".join([lines[0], b"", b'{"title": "incomplet"}', lines[1], lines[2]])
+
+    async def chunks():
+        # Chunk boundaries fall inside records
+        for start in range(0, len(body), 50):
+            yield body[start:start + 50]
+
+    async def _run():
+        return b"".join([chunk async for chunk in transform_ndjson(chunks())])
+
+    records = [json.loads(line) for line in asyncio.run(_run()).splitlines()]
+    assert [record.get("title", {}).get("fr") for record in records] == ["Titre 0", None, "Titre 1", "Titre 2"]
+    assert records[1]["line"] == 3 and records[1]["error"][0]["type"] == "missing"
@@ -0,0 +1,111 @@
+import sqlite3
+from typing import Any, List, Optional
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from app.services.metrics import (
+    RETIRED_WORKERS, LLMMetricsHandler, MetricsMiddleware, MetricsRegistry, token_cost,
+)
+
+
+class UsageChatModel(BaseChatModel):
+    model_name: str = "gpt-4o-2024-08-06"
+    fail: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "usage-fake"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None,
+                  **kwargs: Any) -> ChatResult:
+        if self.fail:
+            raise TimeoutError("upstream timeout")
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content="ok"))],
+            llm_output={"token_usage": {"prompt_tokens": 1000, "completion_tokens": 100}, "model_name": self.model_name},
+        )
+
+
+def test_callback_records_tokens_cost_latency_and_errors():
+    registry = MetricsRegistry(path=None)
+    handler = LLMMetricsHandler(registry, "chain_eov")
+    UsageChatModel().with_config(callbacks=[handler]).invoke("hello")
+    with pytest.raises(TimeoutError):
+        UsageChatModel(fail=True).with_config(callbacks=[handler]).invoke("hello")
+
+    text = registry.render()
+    labels = 'chain="chain_eov",model="gpt-4o-2024-08-06",route="none"'
+    assert f'llm_tokens_total{{{labels},type="prompt"}} 1000.0' in text
+    assert f'llm_tokens_total{{{labels},type="completion"}} 100.0' in text
+    assert f"llm_cost_usd_total{{{labels}}} {token_cost('gpt-4o-2024-08-06', 1000, 100)!r}" in text
+    assert f"llm_request_duration_seconds_count{{{labels}}} 2.0" in text
+    assert ('llm_errors_total{chain="chain_eov",error="TimeoutError",model="gpt-4o-2024-08-06",route="none"} 1.0'
+            in text)
+
+
+def test_workers_sharing_the_file_are_summed(tmp_path):
+    path = str(tmp_path / "metrics.sqlite3")
+    worker_a, worker_b = MetricsRegistry(path), MetricsRegistry(path)
+    worker_a.inc("llm_requests_total", {"chain": "c"}, 2)
+    worker_b.inc("llm_requests_total", {"chain": "c"}, 3)
+    worker_b.observe("llm_request_duration_seconds", {"chain": "c"}, 0.3)
+    worker_a.flush()
+
+    text = worker_b.render()
+    assert 'llm_requests_total{chain="c"} 5.0' in text
+    assert 'llm_request_duration_seconds_bucket{chain="c",le="0.25"} 0.0' in text
+    assert 'llm_request_duration_seconds_bucket{chain="c",le="0.5"} 1.0' in text
+    assert 'llm_request_duration_seconds_bucket{chain="c",le="+Inf"} 1.0' in text
+
+
+def test_stopped_workers_are_merged_at_startup(tmp_path):
+    path = str(tmp_path / "metrics.sqlite3")
+    worker_a, worker_b, worker_c = MetricsRegistry(path), MetricsRegistry(path), MetricsRegistry(path)
+    for worker, value in ((worker_a, 2), (worker_b, 3), (worker_c, 4)):
+        worker.inc("llm_requests_total", {"chain": "c"}, value)
+        worker.observe("llm_request_duration_seconds", {"chain": "c"}, 0.3)
+        worker.flush()
+    with sqlite3.connect(path) as conn:
+        # worker_a's process is gone, worker_b stopped publishing an hour ago
+        conn.execute("UPDATE metrics_snapshot SET worker = ? WHERE worker = ?",
+                     (worker_a._worker_id.rsplit("-", 1)[0] + "-999999999", worker_a._worker_id))
+        conn.execute("UPDATE metrics_snapshot SET updated_at = updated_at - 7200 WHERE worker = ?",
+                     (worker_b._worker_id,))
+
+    restarted = MetricsRegistry(path, stale_seconds=3600)
+    with sqlite3.connect(path) as conn:
+        workers = {row[0] for row in conn.execute("SELECT worker FROM metrics_snapshot")}
+    assert workers == {RETIRED_WORKERS, worker_c._worker_id}
+    assert restarted.retire_stale_workers() == 0
+    text = restarted.render()
+    assert 'llm_requests_total{chain="c"} 9.0' in text
+    assert 'llm_request_duration_seconds_count{chain="c"} 3.0' in text
+
+
+def test_middleware_labels_requests_by_route_template():
+    registry = MetricsRegistry(path=None)
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, registry=registry)
+
+    chain = UsageChatModel().with_config(callbacks=[LLMMetricsHandler(registry, "c")])
+
+    @app.get("/items/{item_id}")
+    def get_item(item_id: int):
+        chain.invoke("hello")
+        return {"id": item_id}
+
+    client = TestClient(app)
+    client.get("/items/1")
+    client.get("/items/2")
+    client.get("/missing")
+
+    text = registry.render()
+    assert 'http_requests_total{method="GET",route="/items/{item_id}",status="200"} 2.0' in text
+    # LLM calls carry the same route label as the request, not the raw path
+    assert 'llm_requests_total{chain="c",model="gpt-4o-2024-08-06",route="/items/{item_id}"} 2.0' in text
+    assert 'http_requests_total{method="GET",route="unmatched",status="404"} 1.0' in text
@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+import mlflow
+import pytest
+
+from app.services.model_registry import ChainModelRegistry, chain_version
+from app.services.tracking import experiment_cache
+
+MODEL = SimpleNamespace(model_name="gpt-4o-2024-08-06", temperature=0.1, seed=42)
+
+
+def test_chain_version_changes_with_source_prompt_and_model(tmp_path):
+    chain_path = tmp_path / "chain.py"
+    chain_path.write_text("chain = 1\n")
+    version = chain_version(str(chain_path), "prompt", MODEL)
+
+    assert chain_version(str(chain_path), "prompt", MODEL) == version
+    assert chain_version(str(chain_path), "other prompt", MODEL) != version
+    assert chain_version(str(chain_path), "prompt", SimpleNamespace(**{**vars(MODEL), "seed": 1})) != version
+    chain_path.write_text("chain = 2\n")
+    assert chain_version(str(chain_path), "prompt", MODEL) != version
+
+
+@pytest.fixture
+def tracking_uri(tmp_path):
+    # The tracking URI and the experiment cache are process-wide: restore them for later tests
+    previous = mlflow.get_tracking_uri()
+    uri = f"file://{tmp_path / 'mlruns'}"
+    mlflow.set_tracking_uri(uri)
+    experiment_cache.clear()
+    yield uri
+    mlflow.set_tracking_uri(previous)
+    experiment_cache.clear()
+
+
+def test_registry_reuses_a_version_logged_by_another_process(tracking_uri, monkeypatch):
+    experiment_id = mlflow.create_experiment("LangChain Models")
+    with mlflow.start_run(experiment_id=experiment_id, tags={"chain_name": "chain_eov", "chain_version": "abc"}) as run:
+        pass
+
+    def _fail(**kwargs):
+        raise AssertionError("model should not be logged again")
+    monkeypatch.setattr(mlflow.langchain, "log_model", _fail)
+
+    registry = ChainModelRegistry()
+    assert registry.model_uri("chain_eov", "unused.py", "abc") == f"runs:/{run.info.run_id}/langchain_model"
+    assert registry.model_uri("chain_eov", "unused.py", "abc") == f"runs:/{run.info.run_id}/langchain_model"
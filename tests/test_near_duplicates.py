@@ -0,0 +1,71 @@
+import asyncio
+
+from langchain_core.runnables import RunnableLambda
+
+from app.schemas.eov import EOVWithCitations
+from app.services.near_duplicates import (NEAR_DUPLICATE_REPORT, NearDuplicateIndex, minhash_signature, similarity,
+                                          with_near_duplicate_reuse)
+from benchmarks.fake_llm import SAMPLE_EOV
+
+REPORT = " ".join(f"La station {i} a mesuré la température et la salinité de l'eau en {2000 + i % 20}." for i in range(200))
+REVISION = REPORT.replace("La station 42 a", "La station 42 (révisée) a").replace("en 2011.", "en 2011, puis en 2012.", 1)
+OTHER = " ".join(f"Le relevé {i} décrit l'abondance des poissons et des oiseaux marins au large." for i in range(200))
+
+
+def test_signatures_estimate_similarity():
+    report = minhash_signature(REPORT)
+    assert similarity(report, minhash_signature(REPORT.upper().replace(" ", "  "))) == 1.0
+    assert similarity(report, minhash_signature(REVISION)) > 0.9
+    assert similarity(report, minhash_signature(OTHER)) < 0.1
+    assert minhash_signature("  ") is None
+
+
+def test_index_returns_the_closest_document_in_scope(tmp_path):
+    path = str(tmp_path / "near_duplicates.sqlite3")
+    index = NearDuplicateIndex(path, threshold=0.9)
+    report_id = index.add("chain_eov:v1", minhash_signature(REPORT), b"report")
+    index.add("chain_eov:v1", minhash_signature(OTHER), b"other")
+
+    # Persisted: a new worker finds the documents indexed by another one
+    document_id, score, result = NearDuplicateIndex(path, threshold=0.9).lookup("chain_eov:v1", minhash_signature(REVISION))
+    assert (document_id, result) == (report_id, b"report") and 0.9 < score < 1
+    assert index.lookup("chain_eov:v2", minhash_signature(REVISION)) is None
+    assert NearDuplicateIndex(path, threshold=0.999).lookup("chain_eov:v1", minhash_signature(REVISION)) is None
+
+
+def test_chain_reuses_the_result_of_a_revision(tmp_path):
+    calls = []
+
+    def _chain(inputs):
+        calls.append(inputs["text"])
+        return SAMPLE_EOV
+
+    chain = with_near_duplicate_reuse(RunnableLambda(_chain), index=NearDuplicateIndex(str(tmp_path / "index.sqlite3")),
+                                      namespace="chain_eov", fingerprint="v1", output_schema=EOVWithCitations)
+    assert chain.invoke({"text": REPORT}) == SAMPLE_EOV
+
+    report = {}
+    result = asyncio.run(chain.ainvoke({"text": REVISION}, {"metadata": {NEAR_DUPLICATE_REPORT: report}}))
+    assert result == SAMPLE_EOV and len(calls) == 1
+    assert report["chain_eov"]["similarity"] > 0.9
+
+    chain.invoke({"text": REVISION}, {"metadata": {"cache_bypass": True}})
+    chain.invoke({"text": OTHER})
+    assert len(calls) == 3
+
+
+def test_expired_and_oldest_documents_are_purged(tmp_path):
+    path = str(tmp_path / "near_duplicates.sqlite3")
+    index = NearDuplicateIndex(path, threshold=0.9, max_documents=2, purge_seconds=3600)
+    index.add("chain_eov:v1", minhash_signature(REPORT), b"report")
+    index.add("chain_eov:v1", minhash_signature(OTHER), b"other")
+    index.add("chain_eov:v2", minhash_signature(REPORT), b"report v2")
+    assert index.purge_expired() == 1
+    assert index.lookup("chain_eov:v1", minhash_signature(REVISION)) is None
+    assert index.lookup("chain_eov:v2", minhash_signature(REVISION))[2] == b"report v2"
+
+    expired = NearDuplicateIndex(path, threshold=0.9, ttl_seconds=-1)
+    assert expired.lookup("chain_eov:v2", minhash_signature(REVISION)) is None
+    assert expired.purge_expired() == 2
+    assert expired.stats()["documents"] == 0 and expired.stats()["purged"] == 2
+    assert index._connect().execute("SELECT COUNT(*) FROM near_duplicate_bands").fetchone()[0] == 0
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.services.rate_limit import AdaptiveRateController, TokenBucket, retry_after_seconds
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeAPIError(Exception):
+    def __init__(self, status_code, headers=None, code=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = FakeResponse(status_code, headers)
+        self.code = code
+
+
+def test_token_bucket_waits_for_refill_and_settles_usage():
+    bucket = TokenBucket(per_minute=600)
+    now = time.monotonic()
+    assert bucket.wait_time(600, now) == 0
+    bucket.take(600)
+    assert bucket.wait_time(100, now) == pytest.approx(10, rel=0.01)
+    bucket.adjust(-100)  # the call used 100 tokens less than estimated
+    assert bucket.wait_time(100, now) == pytest.approx(0, abs=0.01)
+
+
+def test_retry_after_headers():
+    assert retry_after_seconds(FakeAPIError(429, {"retry-after-ms": "1500"})) == 1.5
+    assert retry_after_seconds(FakeAPIError(429, {"retry-after": "2"})) == 2.0
+    assert retry_after_seconds(FakeAPIError(429)) is None
+
+
+def test_rate_limited_calls_are_retried_after_a_shared_pause():
+    controller = AdaptiveRateController(tpm=0, rpm=0, max_concurrency=8, initial_concurrency=8)
+    outcomes = [FakeAPIError(429, {"retry-after-ms": "200"}), "ok"]
+
+    def fn():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    start = time.monotonic()
+    assert controller.call(fn, cost=10) == "ok"
+    assert time.monotonic() - start >= 0.2
+    stats = controller.stats()
+    assert stats["throttled"] == 1 and stats["retries"] == 1 and stats["limit"] == 4.25  # halved, then +1/4
+
+
+def test_non_retryable_errors_are_raised_immediately():
+    controller = AdaptiveRateController(tpm=0, rpm=0)
+    calls = []
+
+    def fn():
+        calls.append(1)
+        raise FakeAPIError(429, code="insufficient_quota")
+
+    with pytest.raises(FakeAPIError):
+        controller.call(fn, cost=10)
+    assert len(calls) == 1
+
+
+def test_concurrency_limit_is_enforced_and_grows_on_success():
+    controller = AdaptiveRateController(tpm=0, rpm=0, min_concurrency=1, max_concurrency=4, initial_concurrency=2)
+    active, peak, lock = [0], [0], threading.Lock()
+
+    def fn():
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.01)
+        with lock:
+            active[0] -= 1
+
+    threads = [threading.Thread(target=controller.call, args=(fn, 1)) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] <= 4
+    assert controller.stats()["limit"] > 2 and controller.stats()["in_flight"] == 0
+
+
+def test_token_budget_paces_async_callers():
+    # 60 tokens per second: the second call of 30 tokens waits for the bucket to refill
+    controller = AdaptiveRateController(tpm=3600, rpm=0)
+    controller.tokens.tokens = 30
+
+    async def fn():
+        return time.monotonic()
+
+    async def _run():
+        return await asyncio.gather(*(controller.acall(fn, cost=30) for _ in range(2)))
+
+    first, second = sorted(asyncio.run(_run()))
+    assert second - first >= 0.4
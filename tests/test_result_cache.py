@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
+
+from app.schemas.eov import EOVWithCitations
+from app.services.result_cache import MemoryTier, ResultCache, cache_key, with_result_cache
+
+
+def _counting_chain(calls):
+    def _answer(_prompt):
+        calls.append(1)
+        return EOVWithCitations(liste_eov=[{"eov": "Oxygène", "raison": "r", "citation": [{"citation_texte": "O2"}]}])
+
+    prompt = ChatPromptTemplate.from_messages([("system", "s"), ("user", "{text}")])
+    return prompt | RunnableLambda(_answer)
+
+
+def test_cache_key_ignores_whitespace_differences():
+    assert cache_key("ns", "fp", "Température  de\n l'eau ") == cache_key("ns", "fp", "Température de l'eau")
+    assert cache_key("ns", "fp", "a") != cache_key("ns", "other", "a")
+
+
+def test_memory_tier_evicts_least_recently_used_by_size():
+    tier = MemoryTier(max_bytes=10)
+    expires = time.time() + 60
+    tier.set("a", b"12345", expires)
+    tier.set("b", b"12345", expires)
+    tier.get("a")
+    tier.set("c", b"12345", expires)
+    assert tier.get("b") is None
+    assert tier.get("a") == b"12345"
+    assert tier.current_bytes == 10
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = ResultCache(path=str(tmp_path / "cache.sqlite3"), ttl_seconds=-1)
+    cache.set("k", b"v")
+    assert cache.get("k") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_expired_rows_are_deleted_from_the_file(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = ResultCache(path=path, ttl_seconds=-1, purge_seconds=3600)
+    assert cache.purge_expired() == 0
+    cache.set("a", b"1")
+    cache.set("b", b"2")
+    assert len(cache.disk) == 2
+    assert cache.purge_expired() == 2
+    assert len(cache.disk) == 0 and cache.stats()["purged"] == 2
+
+    # Writes purge opportunistically once the interval has passed
+    cache = ResultCache(path=path, ttl_seconds=-1, purge_seconds=0)
+    cache.set("c", b"3")
+    assert len(cache.disk) == 0
+
+
+def test_disk_tier_is_shared_between_cache_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    ResultCache(path=path).set("k", b"v")
+    other = ResultCache(path=path)
+    assert other.get("k") == b"v"
+    assert other.get("k") == b"v"
+    stats = other.stats()
+    assert stats["disk_hits"] == 1 and stats["memory_hits"] == 1
+
+
+def test_wrapped_chain_calls_llm_once_per_document(tmp_path):
+    calls = []
+    cache = ResultCache(path=str(tmp_path / "cache.sqlite3"))
+    chain = with_result_cache(_counting_chain(calls), cache=cache, namespace="chain_eov",
+                              fingerprint="fp", output_schema=EOVWithCitations)
+
+    first = chain.invoke({"text": "Mesures d'oxygène dissous"})
+    second = asyncio.run(chain.ainvoke({"text": "Mesures  d'oxygène dissous"}))
+    assert first == second
+    assert len(calls) == 1
+
+    chain.invoke({"text": "Mesures d'oxygène dissous"}, {"metadata": {"cache_bypass": True}})
+    assert len(calls) == 2
+    assert cache.stats()["bypasses"] == 1
@@ -0,0 +1,35 @@
+import os
+
+import pytest
+
+from app.utils.startup import profile_imports
+
+# Budgets for importing the API in a fresh interpreter (generous for slow CI machines)
+IMPORT_BUDGET_SECONDS = float(os.getenv("STARTUP_IMPORT_BUDGET_SECONDS", 6.0))
+RSS_BUDGET_MB = float(os.getenv("STARTUP_RSS_BUDGET_MB", 250))
+
+# Only needed by the feedback workers, never on the request path
+LAZY_MODULES = ["mlflow", "pandas", "sklearn", "scipy", "langchain_community", "sqlalchemy"]
+
+
+@pytest.fixture(scope="module")
+def cold_start(tmp_path_factory):
+    cache_path = tmp_path_factory.mktemp("cache") / "result_cache.sqlite3"
+    data_dir = tmp_path_factory.mktemp("data")
+    return profile_imports(env={
+        "RESULT_CACHE_PATH": str(cache_path),
+        "FEEDBACK_QUEUE_PATH": str(data_dir / "feedback_queue.sqlite3"),
+        "FEEDBACK_STORE_PATH": str(data_dir / "feedback_store.sqlite3"),
+        "METRICS_PATH": str(data_dir / "metrics.sqlite3"),
+        "BATCH_JOBS_PATH": str(data_dir / "batch_jobs.sqlite3"),
+    })
+
+
+def test_heavy_modules_are_not_imported_at_startup(cold_start):
+    loaded = [name for name in LAZY_MODULES if name in cold_start["loaded"]]
+    assert loaded == []
+
+
+def test_cold_import_stays_within_budget(cold_start):
+    assert cold_start["total_seconds"] < IMPORT_BUDGET_SECONDS, cold_start["packages"][:10]
+    assert cold_start["rss_mb"] < RSS_BUDGET_MB
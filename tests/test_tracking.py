@@ -0,0 +1,91 @@
+import pandas as pd
+import pytest
+from mlflow.tracking import MlflowClient
+
+from app.services.tracking import ExperimentCache, batched_run
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ExperimentCache(MlflowClient(tracking_uri=f"file://{tmp_path / 'mlruns'}"))
+
+
+def test_params_metrics_and_tags_are_sent_in_one_batch(cache, monkeypatch):
+    calls = []
+    log_batch = cache.client.log_batch
+    monkeypatch.setattr(cache.client, "log_batch", lambda *a, **kw: (calls.append(kw), log_batch(*a, **kw)))
+
+    with batched_run("User Feedback - EOVs", "EOVs test", tags={"chain_name": "chain_eov"}, cache=cache) as run:
+        run.log_param("file_name", "a.pdf")
+        for i in range(16):
+            run.log_metric(f"{i:02d}-metric", i)
+        run.set_tag("reviewed", True)
+
+    assert len(calls) == 1
+    data = cache.client.get_run(run.run_id).data
+    assert data.params == {"file_name": "a.pdf"}
+    assert len(data.metrics) == 16
+    assert data.tags["chain_name"] == "chain_eov" and data.tags["reviewed"] == "True"
+    assert cache.client.get_run(run.run_id).info.status == "FINISHED"
+
+
+def test_experiment_is_resolved_once_and_restored(cache, monkeypatch):
+    experiment_id = cache.resolve("User Feedback - Metadata")
+    lookups = []
+    monkeypatch.setattr(cache.client, "get_experiment_by_name",
+                        lambda name, _get=cache.client.get_experiment_by_name: (lookups.append(name), _get(name))[1])
+    assert cache.resolve("User Feedback - Metadata") == experiment_id
+    assert lookups == []
+
+    cache.client.delete_experiment(experiment_id)
+    cache.invalidate("User Feedback - Metadata")
+    assert cache.resolve("User Feedback - Metadata") == experiment_id
+    assert cache.client.get_experiment(experiment_id).lifecycle_stage == "active"
+
+
+def test_failed_run_is_marked_failed(cache):
+    with pytest.raises(ValueError):
+        with batched_run("User Feedback - EOVs", "EOVs test", cache=cache) as run:
+            raise ValueError("boom")
+    assert cache.client.get_run(run.run_id).info.status == "FAILED"
+
+
+def test_artifacts_are_serialized_in_memory_and_uploaded_once(cache, monkeypatch, tmp_path):
+    uploads = []
+    log_artifacts = cache.client.log_artifacts
+    monkeypatch.setattr(cache.client, "log_artifacts", lambda *a, **kw: (uploads.append(a), log_artifacts(*a, **kw)))
+    workdir = tmp_path / "workdir"
+    workdir.mkdir()
+    monkeypatch.chdir(workdir)
+
+    with batched_run("User Feedback - EOVs", "EOVs test", cache=cache) as run:
+        run.log_dict({"true_positives": ["Oxygène"]}, "evaluation/confusion_matrix_components.json")
+        run.log_csv([{"EOV Name": "Oxygène", "Accepted": 1}, {"EOV Name": "Autre", "Comment": "a, b"}],
+                    "evaluation/evaluation_table.csv")
+        run.log_table({"file_name": ["a.pdf", "b.pdf"], "f1_score": [0.5, 1.0]}, "evaluation/per_document.json")
+
+    assert len(uploads) == 1
+    assert list(workdir.iterdir()) == []
+    directory = cache.client.download_artifacts(run.run_id, "evaluation", str(tmp_path))
+    with open(f"{directory}/evaluation_table.csv", encoding="utf-8") as f:
+        assert f.read().splitlines() == ["EOV Name,Accepted,Comment", "Oxygène,1,", 'Autre,,"a, b"']
+    # Same layout and tag as MlflowClient.log_table, so mlflow.load_table reads it
+    table = pd.read_json(f"{directory}/per_document.json", orient="split")
+    assert table["f1_score"].tolist() == [0.5, 1.0]
+    assert '"path": "evaluation/per_document.json", "type": "table"' in \
+        cache.client.get_run(run.run_id).data.tags["mlflow.loggedArtifacts"]
+
+
+def test_retried_log_resumes_the_run_with_the_same_key(cache):
+    with pytest.raises(RuntimeError):
+        with batched_run("User Feedback - EOVs", "EOVs test", cache=cache, idempotency_key="7-1700000000") as run:
+            run.log_param("file_name", "a.pdf")
+            raise RuntimeError("tracking server down")
+    first = run.run_id
+
+    with batched_run("User Feedback - EOVs", "EOVs test", cache=cache, idempotency_key="7-1700000000") as run:
+        run.log_param("file_name", "a.pdf")
+    assert run.run_id == first
+    assert cache.client.get_run(first).info.status == "FINISHED"
+    experiment_id = cache.resolve("User Feedback - EOVs")
+    assert len(cache.client.search_runs([experiment_id])) == 1